@@ -12,9 +12,15 @@
         'hr_contract',
         'resource',
         'payroll',
+        'hr_work_schedule_cache',
+        'hr_payslip_prefetch',
+        'hr_employee',
     ],
     'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/hr_attendance_overtime_views.xml',
+        'wizard/hr_attendance_overtime_recompute_views.xml',
         # 'wizard/attendance_report_wizard.xml',
     ],
     'demo': [],
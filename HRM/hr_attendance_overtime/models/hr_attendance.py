@@ -1,8 +1,22 @@
 from odoo import models, fields, api
+from odoo.tools import split_every
 from datetime import datetime, timedelta, time
 from pytz import UTC
 import pytz
 
+DEFAULT_TZ = 'Asia/Ho_Chi_Minh'
+
+OVERTIME_FIELDS = ['overtime_hours', 'overtime_early', 'overtime_regular', 'overtime_evening',
+                   'overtime_night', 'overtime_holiday']
+LATE_EARLY_FIELDS = ['late_minutes', 'early_minutes', 'scheduled_check_in', 'scheduled_check_out',
+                     'is_late', 'is_early']
+
+# Số bản ghi chấm công được tính lại trong một lô
+RECOMPUTE_BATCH_SIZE = 1000
+
+# Số ngày gần nhất được cron tính lại mỗi lần chạy
+DEFAULT_RECOMPUTE_DAYS = 2
+
 
 class HrAttendance(models.Model):
     _inherit = 'hr.attendance'
@@ -90,9 +104,10 @@ class HrAttendance(models.Model):
         help='Có về sớm hay không'
     )
 
-    @api.depends('employee_id', 'check_in', 'check_out')
+    @api.depends('employee_id', 'employee_id.contract_id.resource_calendar_id', 'check_in', 'check_out')
     def _compute_late_early(self):
         """Tính toán đi trễ/về sớm dựa trên lịch làm việc"""
+        to_compute = []
         for attendance in self:
             # Reset values
             attendance.late_minutes = 0
@@ -111,35 +126,59 @@ class HrAttendance(models.Model):
             if not contract or not contract.resource_calendar_id:
                 continue
 
-            work_calendar = contract.resource_calendar_id
-
-            # Tính toán late/early cho ngày này
-            result = attendance._calculate_late_early_for_day(work_calendar)
-
-            # Cập nhật các field
-            attendance.late_minutes = result['late_minutes']
-            attendance.early_minutes = result['early_minutes']
-            attendance.scheduled_check_in = result['scheduled_check_in']
-            attendance.scheduled_check_out = result['scheduled_check_out']
-            attendance.is_late = result['late_minutes'] > 0
-            attendance.is_early = result['early_minutes'] > 0
+            to_compute.append(attendance.id)
+
+        # Mỗi lịch làm việc chỉ tính khoảng thời gian làm việc một lần cho cả nhóm
+        for work_calendar, attendances, intervals_by_date in self.browse(to_compute)._group_by_work_calendar():
+            for attendance in attendances:
+                # Tính toán late/early cho ngày này
+                result = attendance._calculate_late_early_for_day(
+                    work_calendar, intervals_by_date[attendance._get_attendance_date(work_calendar)])
+
+                # Cập nhật các field
+                attendance.late_minutes = result['late_minutes']
+                attendance.early_minutes = result['early_minutes']
+                attendance.scheduled_check_in = result['scheduled_check_in']
+                attendance.scheduled_check_out = result['scheduled_check_out']
+                attendance.is_late = result['late_minutes'] > 0
+                attendance.is_early = result['early_minutes'] > 0
+
+    def _get_attendance_date(self, work_calendar):
+        """Ngày chấm công theo múi giờ của lịch làm việc"""
+        check_in = self.check_in if self.check_in.tzinfo else self.check_in.replace(tzinfo=UTC)
+        return check_in.astimezone(pytz.timezone(work_calendar.tz or DEFAULT_TZ)).date()
 
-    def _calculate_late_early_for_day(self, work_calendar):
-        """Tính toán đi trễ/về sớm cho bản ghi attendance này"""
+    def _group_by_work_calendar(self):
+        """Nhóm chấm công theo lịch làm việc của hợp đồng
 
-        def _convert_datetime_to_target_timezone(dt, target_tz_name='Asia/Ho_Chi_Minh'):
-            """Chuyển đổi datetime từ UTC sang múi giờ đích"""
-            if not dt:
-                return dt
+        Trả về (lịch làm việc, các bản ghi chấm công, {ngày: khoảng thời gian làm việc}).
+        Mỗi lịch chỉ được tính một lần cho tất cả các ngày của nhóm thay vì
+        tính lại cho từng bản ghi.
+        """
+        attendance_ids_by_calendar = {}
+        for attendance in self:
+            work_calendar = attendance.employee_id.contract_id.resource_calendar_id
+            attendance_ids_by_calendar.setdefault(work_calendar, []).append(attendance.id)
+        for work_calendar, attendance_ids in attendance_ids_by_calendar.items():
+            attendances = self.browse(attendance_ids)
+            dates = {attendance._get_attendance_date(work_calendar) for attendance in attendances}
+            yield work_calendar, attendances, self._get_work_intervals_by_date(work_calendar, dates)
+
+    @api.model
+    def _get_work_intervals_by_date(self, work_calendar, dates):
+        """Trả về {ngày: ((bắt đầu, kết thúc), ...)} các khoảng thời gian làm việc theo lịch
+
+        Một ngày tính từ 00:00 đến 24:00 UTC. Kết quả lấy từ bộ nhớ đệm lịch
+        làm việc dùng chung (hr_work_schedule_cache).
+        """
+        return work_calendar._get_work_intervals_by_day(dates, 'UTC')
 
-            if not dt.tzinfo:
-                dt = dt.replace(tzinfo=pytz.UTC)
-            elif dt.tzinfo != pytz.UTC:
-                dt = dt.astimezone(pytz.UTC)
+    def _calculate_late_early_for_day(self, work_calendar, work_intervals=None):
+        """Tính toán đi trễ/về sớm cho bản ghi attendance này
 
-            target_tz = pytz.timezone(target_tz_name)
-            target_dt = dt.astimezone(target_tz)
-            return target_dt
+        ``work_intervals`` là các khoảng thời gian làm việc của ngày chấm công,
+        tính từ lịch làm việc nếu không truyền vào.
+        """
 
         def _convert_to_naive_utc(dt):
             """Convert datetime to naive UTC (for Odoo datetime fields)"""
@@ -160,19 +199,10 @@ class HrAttendance(models.Model):
             'early_minutes': 0
         }
 
-        # Lấy ngày chấm công
-        attendance_date = _convert_datetime_to_target_timezone(
-            self.check_in,
-            work_calendar.tz or 'Asia/Ho_Chi_Minh'
-        ).date()
-
-        # Tạo datetime cho ngày làm việc
-        day_start = datetime.combine(attendance_date, datetime.min.time()).replace(tzinfo=UTC)
-        day_end = datetime.combine(attendance_date, datetime.max.time()).replace(tzinfo=UTC)
-
         # Lấy khoảng thời gian làm việc theo lịch cho ngày này
-        intervals = work_calendar._work_intervals_batch(day_start, day_end)[False]
-        work_intervals = [(start, stop) for start, stop, meta in intervals]
+        if work_intervals is None:
+            attendance_date = self._get_attendance_date(work_calendar)
+            work_intervals = self._get_work_intervals_by_date(work_calendar, [attendance_date])[attendance_date]
 
         # Nếu không có lịch làm việc cho ngày này, không tính đi trễ/về sớm
         if not work_intervals:
@@ -228,13 +258,72 @@ class HrAttendance(models.Model):
 
         return result
 
+    def _recompute_overtime_late_early(self, fnames):
+        """Đánh dấu các field cần tính lại và tính lại theo lô
+
+        Dùng khi dữ liệu ngoài các phụ thuộc thay đổi, ví dụ lịch làm việc
+        hoặc ngày nghỉ lễ.
+        """
+        for fname in fnames:
+            self.env.add_to_compute(self._fields[fname], self)
+        self.flush_recordset(fnames)
+
+    @api.model
+    def _get_period_domain(self, date_from, date_to, employees=None):
+        """Domain các bản ghi chấm công có giờ vào trong khoảng ngày (theo giờ Việt Nam)
+
+        ``employees`` là None thì lấy tất cả nhân viên.
+        """
+        tz = pytz.timezone(DEFAULT_TZ)
+        start = tz.localize(datetime.combine(date_from, time.min)).astimezone(UTC)
+        end = tz.localize(datetime.combine(date_to + timedelta(days=1), time.min)).astimezone(UTC)
+        domain = [
+            ('check_in', '>=', start.replace(tzinfo=None)),
+            ('check_in', '<', end.replace(tzinfo=None)),
+        ]
+        if employees is not None:
+            domain.append(('employee_id', 'in', employees.ids))
+        return domain
+
+    @api.model
+    def _recompute_overtime_for_period(self, date_from, date_to, employees=None, fnames=None):
+        """Tính lại tăng ca và đi trễ/về sớm của một khoảng ngày theo lô
+
+        Các bản ghi được xử lý theo lô RECOMPUTE_BATCH_SIZE: nhân viên, hợp đồng,
+        phòng ban và lịch làm việc của cả lô được đọc trước trong vài truy vấn,
+        mỗi lịch chỉ khai triển một lần mỗi tháng (ngày nghỉ lễ đã được trừ) và
+        kết quả được ghi xuống khi flush, các bản ghi có cùng giá trị được cập
+        nhật chung một câu lệnh. Trả về số bản ghi đã tính lại.
+        """
+        fnames = fnames or OVERTIME_FIELDS + LATE_EARLY_FIELDS
+        attendance_ids = self.search(self._get_period_domain(date_from, date_to, employees), order='id').ids
+        for batch_ids in split_every(RECOMPUTE_BATCH_SIZE, attendance_ids):
+            attendances = self.browse(batch_ids)
+            # Đọc trước dữ liệu liên quan của cả lô
+            batch_employees = attendances.mapped('employee_id')
+            batch_employees.mapped('department_id.parent_id.name')
+            batch_employees.mapped('contract_id.resource_calendar_id.tz')
+            attendances._recompute_overtime_late_early(fnames)
+            # Giải phóng bộ nhớ đệm trước lô tiếp theo
+            self.env.invalidate_all()
+        return len(attendance_ids)
+
+    @api.model
+    def _cron_recompute_overtime(self):
+        """Tính lại tăng ca và đi trễ/về sớm của những ngày gần nhất
+
+        Số ngày lấy từ tham số ``hr_attendance_overtime.recompute_days``.
+        """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'hr_attendance_overtime.recompute_days', DEFAULT_RECOMPUTE_DAYS))
+        date_to = fields.Date.context_today(self)
+        return self._recompute_overtime_for_period(date_to - timedelta(days=max(days - 1, 0)), date_to)
+
     def action_recompute_overtime(self):
         """
         Action để tính lại overtime hours và late/early cho các record được chọn
         """
-        for record in self:
-            record._compute_overtime_hours()
-            record._compute_late_early()
+        self._recompute_overtime_late_early(OVERTIME_FIELDS + LATE_EARLY_FIELDS)
 
         # Hiển thị thông báo thành công
         return {
@@ -253,8 +342,7 @@ class HrAttendance(models.Model):
         Action để tính lại overtime hours và late/early cho 1 record (dùng trong form view)
         """
         self.ensure_one()
-        self._compute_overtime_hours()
-        self._compute_late_early()
+        self._recompute_overtime_late_early(OVERTIME_FIELDS + LATE_EARLY_FIELDS)
 
         return {
             'type': 'ir.actions.client',
@@ -271,8 +359,7 @@ class HrAttendance(models.Model):
         """
         Action để chỉ tính lại late/early cho các record được chọn
         """
-        for record in self:
-            record._compute_late_early()
+        self._recompute_overtime_late_early(LATE_EARLY_FIELDS)
 
         return {
             'type': 'ir.actions.client',
@@ -285,8 +372,11 @@ class HrAttendance(models.Model):
             }
         }
 
-    @api.depends('employee_id', 'check_in', 'check_out')
+    @api.depends('employee_id', 'employee_id.contract_id.resource_calendar_id', 'check_in', 'check_out',
+                 'employee_id.department_id.name', 'employee_id.department_id.parent_id.name',
+                 'employee_id.employee_code')
     def _compute_overtime_hours(self):
+        to_compute = []
         for attendance in self:
             # Reset all overtime fields
             attendance.overtime_hours = 0.0
@@ -310,61 +400,51 @@ class HrAttendance(models.Model):
             if not contract or not contract.resource_calendar_id:
                 continue
 
-            work_calendar = contract.resource_calendar_id
-
-            # Tính toán giờ tăng ca
-            overtime_details = attendance._calculate_attendance_overtime(work_calendar)
-
-            # Cập nhật các field
-            attendance.overtime_early = overtime_details['early']
-            # Chỉ tính tăng ca sớm cho nhân viên Kim Hậu và Nguyễn Trương Thanh
-            if attendance.employee_id.employee_code != '240064' and attendance.employee_id.employee_code != '190124':
-                overtime_details['total'] = overtime_details['total'] - attendance.overtime_early
-                attendance.overtime_early = 0
-
-            attendance.overtime_regular = overtime_details['regular']
-            attendance.overtime_evening = overtime_details['evening']
-            attendance.overtime_night = overtime_details['night']
-            attendance.overtime_holiday = overtime_details['holiday']
-            attendance.overtime_hours = overtime_details['total']
-            if attendance.overtime_evening > 0:
-                attendance.overtime_hours -= attendance.overtime_regular
-                attendance.overtime_regular = 0
-
-            if attendance.overtime_regular <= 0.5:
-                attendance.overtime_regular = 0
-                if attendance.overtime_hours == 0.5 and attendance.overtime_evening == 0 and attendance.overtime_night == 0:
-                    attendance.overtime_hours -= 0.5
-
-    def _calculate_attendance_overtime(self, work_calendar):
-        """Tính toán số giờ tăng ca cho bản ghi attendance này"""
-
-        def _convert_datetime_to_target_timezone(dt, target_tz_name='Asia/Ho_Chi_Minh'):
-            """Chuyển đổi datetime từ UTC sang múi giờ đích"""
-            if not dt:
-                return dt
-
-            if not dt.tzinfo:
-                dt = dt.replace(tzinfo=pytz.UTC)
-            elif dt.tzinfo != pytz.UTC:
-                dt = dt.astimezone(pytz.UTC)
-
-            target_tz = pytz.timezone(target_tz_name)
-            target_dt = dt.astimezone(target_tz)
-            return target_dt
-
+            to_compute.append(attendance.id)
+
+        # Mỗi lịch làm việc chỉ tính khoảng thời gian làm việc một lần cho cả nhóm
+        for work_calendar, attendances, intervals_by_date in self.browse(to_compute)._group_by_work_calendar():
+            for attendance in attendances:
+                # Tính toán giờ tăng ca
+                overtime_details = attendance._calculate_attendance_overtime(
+                    work_calendar, intervals_by_date[attendance._get_attendance_date(work_calendar)])
+
+                # Cập nhật các field
+                attendance.overtime_early = overtime_details['early']
+                # Chỉ tính tăng ca sớm cho nhân viên Kim Hậu và Nguyễn Trương Thanh
+                if attendance.employee_id.employee_code != '240064' and attendance.employee_id.employee_code != '190124':
+                    overtime_details['total'] = overtime_details['total'] - attendance.overtime_early
+                    attendance.overtime_early = 0
+
+                attendance.overtime_regular = overtime_details['regular']
+                attendance.overtime_evening = overtime_details['evening']
+                attendance.overtime_night = overtime_details['night']
+                attendance.overtime_holiday = overtime_details['holiday']
+                attendance.overtime_hours = overtime_details['total']
+                if attendance.overtime_evening > 0:
+                    attendance.overtime_hours -= attendance.overtime_regular
+                    attendance.overtime_regular = 0
+
+                if attendance.overtime_regular <= 0.5:
+                    attendance.overtime_regular = 0
+                    if attendance.overtime_hours == 0.5 and attendance.overtime_evening == 0 and attendance.overtime_night == 0:
+                        attendance.overtime_hours -= 0.5
+
+    def _calculate_attendance_overtime(self, work_calendar, work_intervals=None):
+        """Tính toán số giờ tăng ca cho bản ghi attendance này
+
+        ``work_intervals`` là các khoảng thời gian làm việc của ngày chấm công,
+        tính từ lịch làm việc nếu không truyền vào.
+        """
         # Lấy ngày chấm công
-        attendance_date = _convert_datetime_to_target_timezone(
-            self.check_in,
-            work_calendar.tz or 'Asia/Ho_Chi_Minh'
-        ).date()
+        attendance_date = self._get_attendance_date(work_calendar)
 
         # Tạo datetime cho ngày làm việc
         day_start = datetime.combine(attendance_date, datetime.min.time()).replace(tzinfo=UTC)
         day_end = datetime.combine(attendance_date, datetime.max.time()).replace(tzinfo=UTC)
 
-        # Lấy múi giờ
-        user_tz = pytz.timezone(self.env.user.tz or work_calendar.tz or 'Asia/Ho_Chi_Minh')
+        # Lấy múi giờ của lịch làm việc, giá trị lưu trữ không phụ thuộc người dùng
+        user_tz = pytz.timezone(work_calendar.tz or self.env.user.tz or DEFAULT_TZ)
 
         # Tạo thời điểm 18:00 và 21:00 ở múi giờ địa phương
         local_evening = datetime.combine(attendance_date, time(18, 0))
@@ -384,15 +464,12 @@ class HrAttendance(models.Model):
             'total': 0.0
         }
 
-        # Lấy giờ làm việc theo lịch
-        scheduled_hours = work_calendar.get_work_hours_count(
-            day_start, day_end,
-            compute_leaves=True
-        )
-
         # Lấy các khoảng thời gian làm việc
-        intervals = work_calendar._work_intervals_batch(day_start, day_end)[False]
-        work_intervals = [(start, stop) for start, stop, meta in intervals]
+        if work_intervals is None:
+            work_intervals = self._get_work_intervals_by_date(work_calendar, [attendance_date])[attendance_date]
+
+        # Lấy giờ làm việc theo lịch
+        scheduled_hours = sum((stop - start).total_seconds() / 3600 for start, stop in work_intervals)
 
         # Kiểm tra ngày nghỉ
         is_rest_day = scheduled_hours <= 0 or not work_intervals
@@ -503,21 +580,3 @@ class HrAttendance(models.Model):
             return whole_hours + 0.5
         else:
             return whole_hours + 1.0
-
-    @api.model_create_multi
-    def create(self, vals_list):
-        """Override create để tự động tính toán overtime và late/early khi tạo mới"""
-        records = super(HrAttendance, self).create(vals_list)
-        # Trigger compute for overtime and late/early fields
-        records._compute_overtime_hours()
-        records._compute_late_early()
-        return records
-
-    def write(self, vals):
-        """Override write để tự động tính toán lại overtime và late/early khi cập nhật"""
-        result = super(HrAttendance, self).write(vals)
-        # Nếu thay đổi thông tin liên quan đến overtime hoặc late/early, tính toán lại
-        if any(field in vals for field in ['check_in', 'check_out', 'employee_id']):
-            self._compute_overtime_hours()
-            self._compute_late_early()
-        return result
\ No newline at end of file
@@ -107,12 +107,9 @@ class HrPayslip(models.Model):
         ).astimezone(pytz.UTC).replace(tzinfo=None)
 
         # Lấy tất cả attendance có đánh dấu xả ca trong khoảng thời gian bảng lương
-        discharge_attendances = self.env['hr.attendance'].search([
-            ('employee_id', '=', self.employee_id.id),
-            ('is_discharge_shift', '=', True),
-            ('check_in', '>=', date_from_start),
-            ('check_in', '<=', date_to_end),
-        ])
+        # từ dữ liệu prefetch của cả lô phiếu lương
+        discharge_attendances = self._get_prefetched_attendances(
+            self.employee_id, date_from_start, date_to_end).filtered('is_discharge_shift')
 
         return len(discharge_attendances)
 
@@ -122,12 +119,8 @@ class HrPayslip(models.Model):
             return {'full_days': 0, 'half_days': 0}
 
         # Lấy tất cả nghỉ phép được duyệt trong khoảng thời gian bảng lương
-        leaves = self.env['hr.leave'].search([
-            ('employee_id', '=', self.employee_id.id),
-            ('state', '=', 'validate'),
-            ('request_date_from', '>=', self.date_from),
-            ('request_date_to', '<=', self.date_to),
-        ])
+        leaves = self._get_prefetched_leaves(self.employee_id, self.date_from, self.date_to).filtered(
+            lambda leave: leave.request_date_from >= self.date_from and leave.request_date_to <= self.date_to)
 
         # Lấy hours_per_day từ calendar resource của nhân viên
         hours_per_day = self._get_hours_per_day()
@@ -0,0 +1,70 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+from ..models.hr_attendance import OVERTIME_FIELDS, LATE_EARLY_FIELDS
+
+
+class HrAttendanceOvertimeRecompute(models.TransientModel):
+    _name = 'hr.attendance.overtime.recompute'
+    _description = 'Tính lại tăng ca và đi trễ/về sớm theo khoảng ngày'
+
+    date_from = fields.Date(
+        string='Từ ngày',
+        required=True,
+        default=lambda self: fields.Date.context_today(self).replace(day=1)
+    )
+    date_to = fields.Date(
+        string='Đến ngày',
+        required=True,
+        default=fields.Date.context_today
+    )
+    employee_ids = fields.Many2many(
+        'hr.employee',
+        string='Nhân viên',
+        help='Để trống để tính lại cho tất cả nhân viên'
+    )
+    department_ids = fields.Many2many(
+        'hr.department',
+        string='Phòng ban',
+        help='Để trống để tính lại cho tất cả phòng ban'
+    )
+    recompute_type = fields.Selection([
+        ('all', 'Tăng ca và đi trễ/về sớm'),
+        ('late_early', 'Chỉ đi trễ/về sớm'),
+    ], string='Tính lại', default='all', required=True)
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for wizard in self:
+            if wizard.date_from > wizard.date_to:
+                raise ValidationError(_('Từ ngày phải nhỏ hơn đến ngày!'))
+
+    def _get_employees(self):
+        """Nhân viên được chọn, None nghĩa là tất cả nhân viên"""
+        if not self.employee_ids and not self.department_ids:
+            return None
+        domain = []
+        if self.employee_ids:
+            domain.append(('id', 'in', self.employee_ids.ids))
+        if self.department_ids:
+            domain.append(('department_id', 'child_of', self.department_ids.ids))
+        return self.env['hr.employee'].with_context(active_test=False).search(domain)
+
+    def action_recompute(self):
+        self.ensure_one()
+        fnames = LATE_EARLY_FIELDS if self.recompute_type == 'late_early' else OVERTIME_FIELDS + LATE_EARLY_FIELDS
+        count = self.env['hr.attendance']._recompute_overtime_for_period(
+            self.date_from, self.date_to, self._get_employees(), fnames)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Thành công!',
+                'message': f'Đã tính lại {count} bản ghi chấm công từ {self.date_from.strftime("%d/%m/%Y")} '
+                           f'đến {self.date_to.strftime("%d/%m/%Y")}.',
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
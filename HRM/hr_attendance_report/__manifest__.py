@@ -11,7 +11,7 @@
         - Xuất Excel với format chuẩn
     """,
     'author': 'Wokwy (quochuy.software@gmail.com) +  Support by Claude.ai',
-    'depends': ['hr', 'hr_attendance'],
+    'depends': ['hr', 'hr_attendance', 'hr_work_schedule_cache', 'hr_xlsx_export'],
     'data': [
         'security/ir.model.access.csv',
         'wizard/hr_attendance_monthly_report_views.xml',
@@ -2,7 +2,6 @@ from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 from datetime import datetime, date, timedelta
 import io
-import base64
 from collections import defaultdict
 import pytz
 
@@ -13,6 +12,29 @@ try:
 except ImportError:
     pass
 
+# Số bản ghi chấm công tối đa đọc vào bộ nhớ cùng lúc khi xuất streaming
+STREAMING_CHUNK_SIZE = 2000
+
+# Số bản ghi từ đó chế độ tự động chuyển sang xuất streaming
+STREAMING_THRESHOLD = 20000
+
+# Các field đọc từ hr.attendance khi xuất streaming
+STREAMING_FIELDS = [
+    'employee_id', 'check_in', 'check_out', 'scheduled_check_in', 'scheduled_check_out',
+    'worked_hours', 'overtime_hours', 'overtime_early', 'overtime_regular', 'overtime_evening',
+    'overtime_night', 'overtime_holiday', 'late_minutes', 'early_minutes', 'is_late', 'is_early',
+    'is_discharge_shift',
+]
+
+# Màu nền các ô cảnh báo theo kiểu ô
+REPORT_FILL_COLORS = {
+    'late': 'FFCCCC',
+    'early': 'FFFFCC',
+    'late_early': 'FFE6CC',
+    'discharge': 'CCCCCC',
+    'leave': 'E6F3FF',
+}
+
 
 class AttendanceReportWizard(models.TransientModel):
     _name = 'attendance.report.wizard'
@@ -71,6 +93,14 @@ class AttendanceReportWizard(models.TransientModel):
         help='Include leave data in report'
     )
 
+    export_mode = fields.Selection([
+        ('auto', 'Automatic'),
+        ('standard', 'Standard'),
+        ('streaming', 'Streaming (large exports)'),
+    ], string='Export Mode', default='auto', required=True,
+        help='Streaming writes the file row by row with a flat memory usage, '
+             'automatic switches to it for large exports')
+
     @api.onchange('filter_type')
     def _onchange_filter_type(self):
         """Thay đổi required fields theo loại lọc"""
@@ -96,9 +126,9 @@ class AttendanceReportWizard(models.TransientModel):
 
         # Lấy dữ liệu attendance
         domain = self._get_attendance_domain()
-        attendances = self.env['hr.attendance'].search(domain, order='employee_id, check_in')
+        attendance_count = self.env['hr.attendance'].search_count(domain)
 
-        if not attendances:
+        if not attendance_count:
             raise ValidationError(_('No attendance data found in selected period!'))
 
         # Lấy dữ liệu nghỉ phép nếu cần
@@ -107,6 +137,26 @@ class AttendanceReportWizard(models.TransientModel):
         if self.include_leave_data:
             leave_data, leave_types = self._get_leave_data()
 
+        if self.export_mode == 'streaming' or (
+                self.export_mode == 'auto' and attendance_count > STREAMING_THRESHOLD):
+            attachment = self._generate_report_streaming(domain, leave_data, leave_types)
+        else:
+            # Tạo attachment
+            attachment = self.env['ir.attachment'].create({
+                'name': self._get_filename(),
+                'type': 'binary',
+                'raw': self._generate_report_workbook(domain, leave_data, leave_types),
+                'res_model': self._name,
+                'res_id': self.id,
+                'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            })
+
+        return self.env['hr.xlsx.export']._action_download(attachment)
+
+    def _generate_report_workbook(self, domain, leave_data, leave_types):
+        """Tạo file Excel trong bộ nhớ với openpyxl và trả về nội dung file"""
+        attendances = self.env['hr.attendance'].search(domain, order='employee_id, check_in')
+
         # Tạo file Excel
         output = io.BytesIO()
         workbook = Workbook()
@@ -122,24 +172,7 @@ class AttendanceReportWizard(models.TransientModel):
             workbook.remove(workbook.active)
 
         workbook.save(output)
-        output.seek(0)
-
-        # Tạo attachment
-        filename = self._get_filename()
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'type': 'binary',
-            'datas': base64.b64encode(output.read()),
-            'res_model': self._name,
-            'res_id': self.id,
-            'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        })
-
-        return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content/{attachment.id}?download=true',
-            'target': 'self',
-        }
+        return output.getvalue()
 
     def _get_attendance_domain(self):
         """Tạo domain để lọc attendance - Fixed timezone conversion"""
@@ -219,6 +252,111 @@ class AttendanceReportWizard(models.TransientModel):
 
         return leave_data, list(leave_type_dict.values())
 
+    def _get_detailed_headers(self, leave_types=None):
+        """Tiêu đề cột và độ rộng cột của báo cáo chi tiết"""
+        headers = [
+            'STT', 'Mã NV', 'Tên nhân viên', 'Phòng ban', 'Ngày',
+            'Giờ vào\n(Thực tế)', 'Giờ ra\n(Thực tế)', 'Giờ vào\n(Quy định)', 'Giờ ra\n(Quy định)',
+            'Thời gian\nlàm việc', 'Tổng\nTăng ca', 'TC Sớm\n(Trước giờ làm việc)', 'TC Thường\n(Trước 18h)',
+            'TC Tối\n(18h-21h)', 'TC Đêm\n(Sau 21h)', 'Trễ\n(phút)', 'Sớm\n(phút)', 'Xả ca'
+        ]
+        column_widths = [5, 12, 20, 15, 12, 12, 12, 12, 12, 10, 10, 8, 10, 8, 8, 8, 8,
+                         8]  # Bỏ 1 width do xóa cột TC Nghỉ
+
+        # Thêm cột nghỉ phép
+        if leave_types:
+            for leave_type in sorted(leave_types):
+                headers.append(f'NP {leave_type}\n(ngày)')
+            column_widths.extend([10] * len(leave_types))
+
+        return headers, column_widths
+
+    def _prepare_detailed_row(self, idx, attendance, employee, leave_data=None, leave_types=None):
+        """Giá trị một dòng của báo cáo chi tiết
+
+        ``attendance`` là bản ghi hr.attendance hoặc dict đọc từ search_read,
+        ``employee`` là dict gồm name, employee_code và department.
+        """
+        vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+
+        # Convert times to Vietnam timezone for display
+        check_in_vn = attendance['check_in'].replace(tzinfo=pytz.UTC).astimezone(vietnam_tz)
+        check_out_vn = attendance['check_out'].replace(tzinfo=pytz.UTC).astimezone(vietnam_tz)
+
+        scheduled_in_vn = scheduled_out_vn = ''
+        if attendance['scheduled_check_in']:
+            scheduled_in_vn = attendance['scheduled_check_in'].replace(tzinfo=pytz.UTC).astimezone(
+                vietnam_tz).strftime('%H:%M')
+        if attendance['scheduled_check_out']:
+            scheduled_out_vn = attendance['scheduled_check_out'].replace(tzinfo=pytz.UTC).astimezone(
+                vietnam_tz).strftime('%H:%M')
+
+        data = [
+            idx,  # STT
+            employee['employee_code'],  # Mã NV
+            employee['name'],  # Tên NV
+            employee['department'],  # Phòng ban
+            check_in_vn.strftime('%d/%m/%Y'),  # Ngày
+            check_in_vn.strftime('%H:%M'),  # Giờ vào thực tế
+            check_out_vn.strftime('%H:%M'),  # Giờ ra thực tế
+            scheduled_in_vn,  # Giờ vào quy định
+            scheduled_out_vn,  # Giờ ra quy định
+            f"{attendance['worked_hours']:.1f}",  # Thời gian làm việc
+            f"{attendance['overtime_hours']:.1f}",  # Tổng tăng ca
+            f"{attendance['overtime_early']:.1f}",  # TC sớm
+            f"{attendance['overtime_regular']:.1f}",  # TC thường
+            f"{attendance['overtime_evening']:.1f}",  # TC tối
+            f"{attendance['overtime_night']:.1f}",  # TC đêm
+            attendance['late_minutes'],  # Đi trễ
+            attendance['early_minutes'],  # Về sớm
+            'Có' if attendance['is_discharge_shift'] else ''  # Xả ca
+        ]
+
+        # Thêm dữ liệu nghỉ phép
+        if leave_types and leave_data:
+            work_date = check_in_vn.date()
+            for leave_type in sorted(leave_types):
+                leave_days = leave_data.get(employee['id'], {}).get(work_date, {}).get(leave_type, 0)
+                if leave_days > 0:
+                    if leave_days == 1.0:
+                        data.append('1')
+                    elif leave_days == 0.5:
+                        data.append('0.5')
+                    else:
+                        data.append(f'{leave_days:.1f}')
+                else:
+                    data.append('')
+
+        return data
+
+    def _get_detailed_cell_style(self, col, value, attendance, leave_types=None):
+        """Kiểu ô của báo cáo chi tiết: 'left', 'center' hoặc một màu cảnh báo (căn giữa)"""
+        # Color coding
+        leave_start_col = 19  # Giảm từ 20 xuống 19
+        if col == 16 and attendance['late_minutes'] > 0:  # Late (điều chỉnh từ 17 xuống 16)
+            return 'late'
+        elif col == 17 and attendance['early_minutes'] > 0:  # Early (điều chỉnh từ 18 xuống 17)
+            return 'early'
+        elif col == 18 and attendance['is_discharge_shift']:  # Discharge (điều chỉnh từ 19 xuống 18)
+            return 'discharge'
+        elif leave_types and col >= leave_start_col and value and value != '':  # Leave
+            return 'leave'
+
+        # Alignment based on column type
+        base_center_cols = [1, 5, 6, 7, 8, 16, 17, 18]  # Điều chỉnh từ [1, 5, 6, 7, 8, 17, 18, 19]
+        if col in base_center_cols or (leave_types and col >= leave_start_col):
+            return 'center'
+        return 'left'
+
+    def _get_employee_report_info(self, employee):
+        """Thông tin nhân viên hiển thị trên báo cáo"""
+        return {
+            'id': employee.id,
+            'name': employee.name,
+            'employee_code': employee.employee_code or '',
+            'department': employee.department_id.name or '',
+        }
+
     def _create_detailed_report(self, workbook, attendances, leave_data=None, leave_types=None):
         """Tạo báo cáo chi tiết"""
         if 'Sheet' in workbook.sheetnames:
@@ -247,17 +385,7 @@ class AttendanceReportWizard(models.TransientModel):
         ws['A1'].alignment = Alignment(horizontal='center')
 
         # Headers
-        headers = [
-            'STT', 'Mã NV', 'Tên nhân viên', 'Phòng ban', 'Ngày',
-            'Giờ vào\n(Thực tế)', 'Giờ ra\n(Thực tế)', 'Giờ vào\n(Quy định)', 'Giờ ra\n(Quy định)',
-            'Thời gian\nlàm việc', 'Tổng\nTăng ca', 'TC Sớm\n(Trước giờ làm việc)', 'TC Thường\n(Trước 18h)',
-            'TC Tối\n(18h-21h)', 'TC Đêm\n(Sau 21h)', 'Trễ\n(phút)', 'Sớm\n(phút)', 'Xả ca'
-        ]
-
-        # Thêm cột nghỉ phép
-        if leave_types:
-            for leave_type in sorted(leave_types):
-                headers.append(f'NP {leave_type}\n(ngày)')
+        headers, column_widths = self._get_detailed_headers(leave_types)
 
         # Set headers
         for col, header in enumerate(headers, 1):
@@ -268,90 +396,25 @@ class AttendanceReportWizard(models.TransientModel):
             cell.border = border
 
         # Adjust column widths
-        column_widths = [5, 12, 20, 15, 12, 12, 12, 12, 12, 10, 10, 8, 10, 8, 8, 8, 8,
-                         8]  # Bỏ 1 width do xóa cột TC Nghỉ
-        # Thêm width cho cột nghỉ phép
-        if leave_types:
-            column_widths.extend([10] * len(leave_types))
-
         for col, width in enumerate(column_widths, 1):
             ws.column_dimensions[get_column_letter(col)].width = width
 
         # Data rows
-        vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
         row = 4
 
         for idx, attendance in enumerate(attendances, 1):
-            # Convert times to Vietnam timezone for display
-            check_in_vn = attendance.check_in.replace(tzinfo=pytz.UTC).astimezone(vietnam_tz)
-            check_out_vn = attendance.check_out.replace(tzinfo=pytz.UTC).astimezone(vietnam_tz)
-
-            scheduled_in_vn = scheduled_out_vn = ''
-            if attendance.scheduled_check_in:
-                scheduled_in_vn = attendance.scheduled_check_in.replace(tzinfo=pytz.UTC).astimezone(
-                    vietnam_tz).strftime('%H:%M')
-            if attendance.scheduled_check_out:
-                scheduled_out_vn = attendance.scheduled_check_out.replace(tzinfo=pytz.UTC).astimezone(
-                    vietnam_tz).strftime('%H:%M')
-
-            data = [
-                idx,  # STT
-                attendance.employee_id.employee_code or '',  # Mã NV
-                attendance.employee_id.name,  # Tên NV
-                attendance.employee_id.department_id.name or '',  # Phòng ban
-                check_in_vn.strftime('%d/%m/%Y'),  # Ngày
-                check_in_vn.strftime('%H:%M'),  # Giờ vào thực tế
-                check_out_vn.strftime('%H:%M'),  # Giờ ra thực tế
-                scheduled_in_vn,  # Giờ vào quy định
-                scheduled_out_vn,  # Giờ ra quy định
-                f"{attendance.worked_hours:.1f}",  # Thời gian làm việc
-                f"{attendance.overtime_hours:.1f}",  # Tổng tăng ca
-                f"{attendance.overtime_early:.1f}",  # TC sớm
-                f"{attendance.overtime_regular:.1f}",  # TC thường
-                f"{attendance.overtime_evening:.1f}",  # TC tối
-                f"{attendance.overtime_night:.1f}",  # TC đêm
-                attendance.late_minutes,  # Đi trễ
-                attendance.early_minutes,  # Về sớm
-                'Có' if attendance.is_discharge_shift else ''  # Xả ca
-            ]
-
-            # Thêm dữ liệu nghỉ phép
-            if leave_types and leave_data:
-                emp_id = attendance.employee_id.id
-                work_date = check_in_vn.date()
-                for leave_type in sorted(leave_types):
-                    leave_days = leave_data.get(emp_id, {}).get(work_date, {}).get(leave_type, 0)
-                    if leave_days > 0:
-                        if leave_days == 1.0:
-                            data.append('1')
-                        elif leave_days == 0.5:
-                            data.append('0.5')
-                        else:
-                            data.append(f'{leave_days:.1f}')
-                    else:
-                        data.append('')
+            employee = self._get_employee_report_info(attendance.employee_id)
+            data = self._prepare_detailed_row(idx, attendance, employee, leave_data, leave_types)
 
             for col, value in enumerate(data, 1):
                 cell = ws.cell(row=row, column=col, value=value)
                 cell.border = border
 
-                # Alignment based on column type
-                base_center_cols = [1, 5, 6, 7, 8, 16, 17, 18]  # Điều chỉnh từ [1, 5, 6, 7, 8, 17, 18, 19]
-                leave_start_col = 19  # Giảm từ 20 xuống 19
-                if col in base_center_cols or (leave_types and col >= leave_start_col):
-                    cell.alignment = Alignment(horizontal='center')
-                else:
-                    cell.alignment = Alignment(horizontal='left')
-
-                # Color coding
-                if col == 16 and attendance.late_minutes > 0:  # Late (điều chỉnh từ 17 xuống 16)
-                    cell.fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-                elif col == 17 and attendance.early_minutes > 0:  # Early (điều chỉnh từ 18 xuống 17)
-                    cell.fill = PatternFill(start_color='FFFFCC', end_color='FFFFCC', fill_type='solid')
-                elif col == 18 and attendance.is_discharge_shift:  # Discharge (điều chỉnh từ 19 xuống 18)
-                    cell.fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
-                elif leave_types and col >= leave_start_col and value and value != '':  # Leave
-                    cell.fill = PatternFill(start_color='E6F3FF', end_color='E6F3FF', fill_type='solid')
+                style = self._get_detailed_cell_style(col, value, attendance, leave_types)
+                cell.alignment = Alignment(horizontal='left' if style == 'left' else 'center')
+                if style in REPORT_FILL_COLORS:
+                    color = REPORT_FILL_COLORS[style]
+                    cell.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
 
             row += 1
 
@@ -404,47 +467,30 @@ class AttendanceReportWizard(models.TransientModel):
             # Fallback to standard calculation if no calendar
             return self._calculate_work_days_standard(attendance.worked_hours)
 
-        # QUAN TRỌNG: Lấy scheduled_hours cho NGUYÊN NGÀY (00:00 - 23:59)
-        # Tạo datetime cho nguyên ngày ở múi giờ UTC
-        day_start_utc = datetime.combine(attendance_date, datetime.min.time()).replace(tzinfo=pytz.UTC)
-        day_end_utc = datetime.combine(attendance_date, datetime.max.time()).replace(tzinfo=pytz.UTC)
-
-        # Sử dụng get_work_hours_count để lấy tổng giờ làm việc theo lịch cho nguyên ngày
+        # QUAN TRỌNG: Lấy scheduled_hours cho NGUYÊN NGÀY (00:00 - 23:59 UTC)
+        # Lịch được khai triển một lần mỗi tháng và dùng chung qua cache
         try:
-            scheduled_hours = work_calendar.get_work_hours_count(
-                day_start_utc,
-                day_end_utc,
-                compute_leaves=True
-            )
-        except:
-            # Fallback nếu method get_work_hours_count fail
-            # Thử cách manual tính từ intervals
-            day_start_local = employee_tz.localize(datetime.combine(attendance_date, datetime.min.time()))
-            day_end_local = employee_tz.localize(datetime.combine(attendance_date, datetime.max.time()))
-
-            try:
-                intervals = work_calendar._work_intervals_batch(
-                    day_start_local,
-                    day_end_local,
-                    employee.resource_id
-                )[employee.resource_id.id]
-
-                scheduled_hours = 0.0
-                work_intervals = [(start, stop) for start, stop, meta in intervals]
+            scheduled_hours = work_calendar._get_scheduled_hours_by_day([attendance_date], 'UTC')[attendance_date]
+        except Exception:
+            # Fallback cuối cùng
+            return self._calculate_work_days_standard(attendance.worked_hours)
 
-                for start, stop in work_intervals:
-                    scheduled_hours += (stop - start).total_seconds() / 3600.0
+        return self._calculate_work_days_scheduled(
+            attendance.worked_hours, attendance.overtime_hours, scheduled_hours)
 
-            except:
-                # Fallback cuối cùng
-                return self._calculate_work_days_standard(attendance.worked_hours)
+    def _calculate_work_days_scheduled(self, worked_hours, overtime_hours, scheduled_hours):
+        """
+        Tính số ngày công từ số giờ làm việc và số giờ theo lịch của ngày
 
+        Returns:
+            float: Số ngày công (0.0, 0.5, hoặc 1.0)
+        """
         # Nếu không có giờ làm việc theo lịch thì đây là ngày nghỉ
         if scheduled_hours <= 0:
             return 0.0  # Non-working day
 
         # Determine if it's full day or half day based on worked hours vs scheduled hours
-        worked_day_ratio = min((attendance.worked_hours - attendance.overtime_hours)/ scheduled_hours, 1.0)
+        worked_day_ratio = min((worked_hours - overtime_hours) / scheduled_hours, 1.0)
 
         # Apply threshold logic to determine full/half day (same as payslip)
         if worked_day_ratio >= 0.70:  # 70% threshold for full day
@@ -481,15 +527,32 @@ class AttendanceReportWizard(models.TransientModel):
         else:
             return 0.0
 
-    def _create_summary_report(self, workbook, attendances, leave_data=None, leave_types=None):
-        """Tạo báo cáo tổng hợp - Fixed work days calculation using payslip logic"""
-        ws = workbook.create_sheet('Báo cáo Tổng hợp')
+    def _get_summary_headers(self, leave_types=None):
+        """Tiêu đề cột và độ rộng cột của báo cáo tổng hợp"""
+        headers = [
+            'STT', 'Mã NV', 'Tên nhân viên', 'Phòng ban',
+            'Tổng\nNgày công', 'Tổng giờ\nlàm việc', 'Tổng\nTăng ca',
+            'TC Sớm\n(Trước giờ làm việc)', 'TC Thường\n(Trước 18h)', 'TC Tối\n(18h-21h)', 'TC Đêm\n(Sau 21h)',
+            'Tổng phút\nđi trễ', 'Ngày\nđi trễ', 'Tổng phút\nvề sớm', 'Ngày\nvề sớm',
+            'Tổng phút\nđi trễ-về sớm',  # Cột mới thêm
+            'Số ca xả'
+        ]
+        column_widths = [5, 12, 20, 15, 10, 12, 10, 8, 10, 8, 8, 10, 8, 10, 8, 12, 8]  # Bỏ 1 width do xóa cột TC Nghỉ
 
-        # Gom dữ liệu theo nhân viên
-        employee_data = defaultdict(lambda: {
-            'name': '',
-            'employee_id': '',
-            'department': '',
+        # Thêm cột nghỉ phép
+        if leave_types:
+            for leave_type in sorted(leave_types):
+                headers.append(f'Tổng NP\n{leave_type}\n(ngày)')
+            column_widths.extend([12] * len(leave_types))
+
+        return headers, column_widths
+
+    def _new_summary_data(self, employee):
+        """Dữ liệu tổng hợp rỗng của một nhân viên"""
+        return {
+            'name': employee['name'],
+            'employee_id': employee['employee_code'],
+            'department': employee['department'],
             'work_days': 0.0,  # Changed to float to handle half days
             'total_worked_hours': 0.0,
             'total_overtime': 0.0,
@@ -504,41 +567,31 @@ class AttendanceReportWizard(models.TransientModel):
             'late_days': 0,
             'early_days': 0,
             'leave_days': defaultdict(float),
-        })
-        count = 1
-        for attendance in attendances:
-            emp_id = attendance.employee_id.id
-            data = employee_data[emp_id]
-
-            # Basic info
-            data['name'] = attendance.employee_id.name
-            data['employee_id'] = attendance.employee_id.employee_code or ''
-            data['department'] = attendance.employee_id.department_id.name or ''
-
-            # Calculate work days using payslip logic
-            work_days_for_this_attendance = self._calculate_work_days_for_attendance(attendance, leave_data)
-            count += 1
-
-            # Accumulate data
-            data['work_days'] += work_days_for_this_attendance  # Use payslip logic
-            data['total_worked_hours'] += attendance.worked_hours
-            data['total_overtime'] += attendance.overtime_hours
-            data['overtime_early'] += attendance.overtime_early
-            data['overtime_regular'] += attendance.overtime_regular
-            data['overtime_evening'] += attendance.overtime_evening
-            data['overtime_night'] += attendance.overtime_night
-            data['overtime_holiday'] += attendance.overtime_holiday
-            data['total_late_minutes'] += attendance.late_minutes
-            data['total_early_minutes'] += attendance.early_minutes
-
-            if attendance.is_discharge_shift:
-                data['discharge_days'] += 1
-            if attendance.is_late:
-                data['late_days'] += 1
-            if attendance.is_early:
-                data['early_days'] += 1
+        }
 
-        # Gom dữ liệu nghỉ phép
+    def _add_to_summary_data(self, data, attendance, work_days):
+        """Cộng một bản ghi chấm công (bản ghi hoặc dict) vào dữ liệu tổng hợp"""
+        # Accumulate data
+        data['work_days'] += work_days  # Use payslip logic
+        data['total_worked_hours'] += attendance['worked_hours']
+        data['total_overtime'] += attendance['overtime_hours']
+        data['overtime_early'] += attendance['overtime_early']
+        data['overtime_regular'] += attendance['overtime_regular']
+        data['overtime_evening'] += attendance['overtime_evening']
+        data['overtime_night'] += attendance['overtime_night']
+        data['overtime_holiday'] += attendance['overtime_holiday']
+        data['total_late_minutes'] += attendance['late_minutes']
+        data['total_early_minutes'] += attendance['early_minutes']
+
+        if attendance['is_discharge_shift']:
+            data['discharge_days'] += 1
+        if attendance['is_late']:
+            data['late_days'] += 1
+        if attendance['is_early']:
+            data['early_days'] += 1
+
+    def _add_leave_to_summary_data(self, employee_data, leave_data=None, leave_types=None):
+        """Gom dữ liệu nghỉ phép vào dữ liệu tổng hợp"""
         if leave_data and leave_types:
             for emp_id, emp_leaves in leave_data.items():
                 if emp_id in employee_data:
@@ -546,6 +599,92 @@ class AttendanceReportWizard(models.TransientModel):
                         for leave_type, days in date_leaves.items():
                             employee_data[emp_id]['leave_days'][leave_type] += days
 
+    def _prepare_summary_row(self, idx, data, leave_types=None):
+        """Giá trị một dòng của báo cáo tổng hợp"""
+        # Tính tổng phút đi trễ + về sớm
+        total_late_early_minutes = data['total_late_minutes'] + data['total_early_minutes']
+
+        # Format work days display - using payslip logic formatting
+        work_days_display = data['work_days']
+        if work_days_display == int(work_days_display):
+            work_days_display = int(work_days_display)
+        else:
+            work_days_display = f"{work_days_display:.1f}"
+
+        summary_data = [
+            idx,  # STT
+            data['employee_id'],  # Mã NV
+            data['name'],  # Tên NV
+            data['department'],  # Phòng ban
+            work_days_display,  # Tổng ngày công - Using payslip logic
+            f"{data['total_worked_hours']:.1f}",  # Tổng giờ làm việc
+            f"{data['total_overtime']:.1f}",  # Tổng tăng ca
+            f"{data['overtime_early']:.1f}",  # TC sớm
+            f"{data['overtime_regular']:.1f}",  # TC thường
+            f"{data['overtime_evening']:.1f}",  # TC tối
+            f"{data['overtime_night']:.1f}",  # TC đêm
+            data['total_late_minutes'],  # Tổng phút đi trễ
+            data['late_days'],  # Số ngày đi trễ
+            data['total_early_minutes'],  # Tổng phút về sớm
+            data['early_days'],  # Số ngày về sớm
+            total_late_early_minutes,  # Tổng phút đi trễ-về sớm (cột mới)
+            data['discharge_days'],  # Số ca xả
+        ]
+
+        # Thêm dữ liệu nghỉ phép
+        if leave_types:
+            for leave_type in sorted(leave_types):
+                leave_days = data['leave_days'].get(leave_type, 0)
+                if leave_days > 0:
+                    if leave_days == int(leave_days):  # Số nguyên
+                        summary_data.append(f'{int(leave_days)}')
+                    else:  # Số thập phân
+                        summary_data.append(f'{leave_days:.1f}')
+                else:
+                    summary_data.append('')
+
+        return summary_data
+
+    def _get_summary_cell_style(self, col, value, data, leave_types=None):
+        """Kiểu ô của báo cáo tổng hợp: 'left', 'center' hoặc một màu cảnh báo (căn giữa)"""
+        # Color coding for issues
+        leave_start_col = 18  # Giảm từ 19 xuống 18 do bỏ 1 cột
+        if col == 12 and data['total_late_minutes'] > 0:  # Late minutes (điều chỉnh từ 13 xuống 12)
+            return 'late'
+        elif col == 14 and data['total_early_minutes'] > 0:  # Early minutes (điều chỉnh từ 15 xuống 14)
+            return 'early'
+        elif col == 16 and data['total_late_minutes'] + data['total_early_minutes'] > 0:  # Tổng phút đi trễ-về sớm
+            return 'late_early'
+        elif col == 17 and data['discharge_days'] > 0:  # Discharge days (điều chỉnh từ 18 xuống 17)
+            return 'discharge'
+        elif leave_types and col >= leave_start_col and value and value != '':  # Leave
+            return 'leave'
+
+        # Alignment
+        base_center_cols = [1, 5, 12, 13, 14, 15, 16, 17]  # Điều chỉnh lại số cột do bỏ cột TC Nghỉ
+        if col in base_center_cols or (leave_types and col >= leave_start_col):
+            return 'center'
+        return 'left'
+
+    def _create_summary_report(self, workbook, attendances, leave_data=None, leave_types=None):
+        """Tạo báo cáo tổng hợp - Fixed work days calculation using payslip logic"""
+        ws = workbook.create_sheet('Báo cáo Tổng hợp')
+
+        # Gom dữ liệu theo nhân viên
+        employee_data = {}
+        for attendance in attendances:
+            emp_id = attendance.employee_id.id
+            if emp_id not in employee_data:
+                employee_data[emp_id] = self._new_summary_data(
+                    self._get_employee_report_info(attendance.employee_id))
+
+            # Calculate work days using payslip logic
+            work_days_for_this_attendance = self._calculate_work_days_for_attendance(attendance, leave_data)
+            self._add_to_summary_data(employee_data[emp_id], attendance, work_days_for_this_attendance)
+
+        # Gom dữ liệu nghỉ phép
+        self._add_leave_to_summary_data(employee_data, leave_data, leave_types)
+
         # Header styles
         header_font = Font(bold=True, color='FFFFFF')
         header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
@@ -566,19 +705,7 @@ class AttendanceReportWizard(models.TransientModel):
         ws['A1'].alignment = Alignment(horizontal='center')
 
         # Headers
-        headers = [
-            'STT', 'Mã NV', 'Tên nhân viên', 'Phòng ban',
-            'Tổng\nNgày công', 'Tổng giờ\nlàm việc', 'Tổng\nTăng ca',
-            'TC Sớm\n(Trước giờ làm việc)', 'TC Thường\n(Trước 18h)', 'TC Tối\n(18h-21h)', 'TC Đêm\n(Sau 21h)',
-            'Tổng phút\nđi trễ', 'Ngày\nđi trễ', 'Tổng phút\nvề sớm', 'Ngày\nvề sớm',
-            'Tổng phút\nđi trễ-về sớm',  # Cột mới thêm
-            'Số ca xả'
-        ]
-
-        # Thêm cột nghỉ phép
-        if leave_types:
-            for leave_type in sorted(leave_types):
-                headers.append(f'Tổng NP\n{leave_type}\n(ngày)')
+        headers, column_widths = self._get_summary_headers(leave_types)
 
         # Set headers
         for col, header in enumerate(headers, 1):
@@ -589,85 +716,182 @@ class AttendanceReportWizard(models.TransientModel):
             cell.border = border
 
         # Adjust column widths
-        column_widths = [5, 12, 20, 15, 10, 12, 10, 8, 10, 8, 8, 10, 8, 10, 8, 12, 8]  # Bỏ 1 width do xóa cột TC Nghỉ
-        # Thêm width cho cột nghỉ phép
-        if leave_types:
-            column_widths.extend([12] * len(leave_types))
-
         for col, width in enumerate(column_widths, 1):
             ws.column_dimensions[get_column_letter(col)].width = width
 
         # Data rows
         row = 4
         for idx, (emp_id, data) in enumerate(sorted(employee_data.items(), key=lambda x: x[1]['name']), 1):
-            # Tính tổng phút đi trễ + về sớm
-            total_late_early_minutes = data['total_late_minutes'] + data['total_early_minutes']
-
-            # Format work days display - using payslip logic formatting
-            work_days_display = data['work_days']
-            if work_days_display == int(work_days_display):
-                work_days_display = int(work_days_display)
-            else:
-                work_days_display = f"{work_days_display:.1f}"
-
-            summary_data = [
-                idx,  # STT
-                data['employee_id'],  # Mã NV
-                data['name'],  # Tên NV
-                data['department'],  # Phòng ban
-                work_days_display,  # Tổng ngày công - Using payslip logic
-                f"{data['total_worked_hours']:.1f}",  # Tổng giờ làm việc
-                f"{data['total_overtime']:.1f}",  # Tổng tăng ca
-                f"{data['overtime_early']:.1f}",  # TC sớm
-                f"{data['overtime_regular']:.1f}",  # TC thường
-                f"{data['overtime_evening']:.1f}",  # TC tối
-                f"{data['overtime_night']:.1f}",  # TC đêm
-                data['total_late_minutes'],  # Tổng phút đi trễ
-                data['late_days'],  # Số ngày đi trễ
-                data['total_early_minutes'],  # Tổng phút về sớm
-                data['early_days'],  # Số ngày về sớm
-                total_late_early_minutes,  # Tổng phút đi trễ-về sớm (cột mới)
-                data['discharge_days'],  # Số ca xả
-            ]
-
-            # Thêm dữ liệu nghỉ phép
-            if leave_types:
-                for leave_type in sorted(leave_types):
-                    leave_days = data['leave_days'].get(leave_type, 0)
-                    if leave_days > 0:
-                        if leave_days == int(leave_days):  # Số nguyên
-                            summary_data.append(f'{int(leave_days)}')
-                        else:  # Số thập phân
-                            summary_data.append(f'{leave_days:.1f}')
-                    else:
-                        summary_data.append('')
+            summary_data = self._prepare_summary_row(idx, data, leave_types)
 
             for col, value in enumerate(summary_data, 1):
                 cell = ws.cell(row=row, column=col, value=value)
                 cell.border = border
 
-                # Alignment
-                base_center_cols = [1, 5, 12, 13, 14, 15, 16, 17]  # Điều chỉnh lại số cột do bỏ cột TC Nghỉ
-                leave_start_col = 18  # Giảm từ 19 xuống 18 do bỏ 1 cột
-                if col in base_center_cols or (leave_types and col >= leave_start_col):
-                    cell.alignment = Alignment(horizontal='center')
-                else:
-                    cell.alignment = Alignment(horizontal='left')
-
-                # Color coding for issues
-                if col == 12 and data['total_late_minutes'] > 0:  # Late minutes (điều chỉnh từ 13 xuống 12)
-                    cell.fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-                elif col == 14 and data['total_early_minutes'] > 0:  # Early minutes (điều chỉnh từ 15 xuống 14)
-                    cell.fill = PatternFill(start_color='FFFFCC', end_color='FFFFCC', fill_type='solid')
-                elif col == 16 and total_late_early_minutes > 0:  # Tổng phút đi trễ-về sớm (điều chỉnh từ 17 xuống 16)
-                    cell.fill = PatternFill(start_color='FFE6CC', end_color='FFE6CC', fill_type='solid')  # Màu cam nhạt
-                elif col == 17 and data['discharge_days'] > 0:  # Discharge days (điều chỉnh từ 18 xuống 17)
-                    cell.fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
-                elif leave_types and col >= leave_start_col and value and value != '':  # Leave
-                    cell.fill = PatternFill(start_color='E6F3FF', end_color='E6F3FF', fill_type='solid')
+                style = self._get_summary_cell_style(col, value, data, leave_types)
+                cell.alignment = Alignment(horizontal='left' if style == 'left' else 'center')
+                if style in REPORT_FILL_COLORS:
+                    color = REPORT_FILL_COLORS[style]
+                    cell.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
 
             row += 1
 
+    def _generate_report_streaming(self, domain, leave_data, leave_types):
+        """Tạo file Excel theo từng dòng với xlsxwriter và trả về attachment của file
+
+        Chấm công được đọc bằng search_read theo lô khoảng STREAMING_CHUNK_SIZE
+        bản ghi và xlsxwriter ở chế độ constant_memory ghi từng dòng ra file
+        tạm, file tạm được chép thẳng vào filestore (hr.xlsx.export), nên bộ
+        nhớ dùng không tăng theo số dòng. Chỉ dữ liệu tổng hợp theo nhân viên
+        được giữ lại cho sheet tổng hợp.
+        """
+        detailed = self.report_type in ['detailed', 'both']
+        summary = self.report_type in ['summary', 'both']
+        period = f'{self.date_from.strftime("%d/%m/%Y")} đến {self.date_to.strftime("%d/%m/%Y")}'
+
+        XlsxExport = self.env['hr.xlsx.export']
+        with XlsxExport._open_workbook() as (workbook, output):
+            formats = self._get_streaming_formats(workbook)
+
+            if detailed:
+                ws = workbook.add_worksheet('Báo cáo Chi tiết')
+                headers, column_widths = self._get_detailed_headers(leave_types)
+                self._write_streaming_header(ws, formats, f'BÁO CÁO CHẤM CÔNG CHI TIẾT - {period}',
+                                             headers, column_widths)
+
+            row = 3
+            employee_data = {}
+            for attendances, employees in self._iter_attendance_batches(domain, with_work_days=summary):
+                for attendance in attendances:
+                    employee = employees[attendance['employee_id']]
+                    if detailed:
+                        data = self._prepare_detailed_row(row - 2, attendance, employee, leave_data, leave_types)
+                        for col, value in enumerate(data):
+                            style = self._get_detailed_cell_style(col + 1, value, attendance, leave_types)
+                            ws.write(row, col, value, formats[style])
+                        row += 1
+                    if summary:
+                        if employee['id'] not in employee_data:
+                            employee_data[employee['id']] = self._new_summary_data(employee)
+                        self._add_to_summary_data(employee_data[employee['id']], attendance, attendance['work_days'])
+
+            if summary:
+                self._add_leave_to_summary_data(employee_data, leave_data, leave_types)
+                ws = workbook.add_worksheet('Báo cáo Tổng hợp')
+                headers, column_widths = self._get_summary_headers(leave_types)
+                self._write_streaming_header(ws, formats, f'BÁO CÁO CHẤM CÔNG TỔNG HỢP - {period}',
+                                             headers, column_widths)
+                row = 3
+                for idx, data in enumerate(sorted(employee_data.values(), key=lambda x: x['name']), 1):
+                    for col, value in enumerate(self._prepare_summary_row(idx, data, leave_types)):
+                        ws.write(row, col, value, formats[self._get_summary_cell_style(col + 1, value, data, leave_types)])
+                    row += 1
+
+            return XlsxExport._save_attachment(workbook, output, {
+                'name': self._get_filename(),
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+
+    def _iter_attendance_batches(self, domain, with_work_days=False):
+        """Đọc chấm công theo lô bằng search_read, mỗi lô gồm trọn các nhân viên
+
+        Trả về từng cặp (danh sách dict chấm công, {employee_id: thông tin nhân viên})
+        theo thứ tự nhân viên, giờ vào. Khi ``with_work_days`` mỗi dict có thêm
+        'work_days'. Bộ nhớ đệm của ORM được giải phóng sau mỗi lô.
+        """
+        Attendance = self.env['hr.attendance']
+
+        # Chia nhân viên thành các lô khoảng STREAMING_CHUNK_SIZE bản ghi chấm công
+        batches = []
+        batch_employee_ids, batch_count = [], 0
+        for employee, count in Attendance._read_group(domain, ['employee_id'], ['__count'], order='employee_id'):
+            if batch_employee_ids and batch_count + count > STREAMING_CHUNK_SIZE:
+                batches.append(batch_employee_ids)
+                batch_employee_ids, batch_count = [], 0
+            batch_employee_ids.append(employee.id)
+            batch_count += count
+        if batch_employee_ids:
+            batches.append(batch_employee_ids)
+
+        for employee_ids in batches:
+            employees = {}
+            for employee in self.env['hr.employee'].browse(employee_ids):
+                employees[employee.id] = dict(
+                    self._get_employee_report_info(employee),
+                    calendar=employee.resource_calendar_id,
+                    tz=self._get_employee_timezone(employee),
+                )
+            attendances = Attendance.search_read(
+                domain + [('employee_id', 'in', employee_ids)], STREAMING_FIELDS,
+                order='employee_id, check_in', load=None)
+            if with_work_days:
+                self._set_streaming_work_days(attendances, employees)
+            yield attendances, employees
+            self.env.invalidate_all()
+
+    def _set_streaming_work_days(self, attendances, employees):
+        """Tính 'work_days' cho các dict chấm công của một lô
+
+        Giờ làm việc theo lịch được lấy một lần cho mỗi lịch làm việc và tất cả
+        các ngày của lô, cùng logic với _calculate_work_days_for_attendance.
+        """
+        dates_by_calendar = defaultdict(set)
+        for attendance in attendances:
+            employee = employees[attendance['employee_id']]
+            attendance['work_date'] = attendance['check_in'].replace(tzinfo=pytz.UTC).astimezone(
+                employee['tz']).date()
+            if employee['calendar']:
+                dates_by_calendar[employee['calendar']].add(attendance['work_date'])
+
+        scheduled_hours_by_calendar = {}
+        for work_calendar, dates in dates_by_calendar.items():
+            try:
+                scheduled_hours_by_calendar[work_calendar] = work_calendar._get_scheduled_hours_by_day(dates, 'UTC')
+            except Exception:
+                # Fallback về cách tính tiêu chuẩn
+                scheduled_hours_by_calendar[work_calendar] = None
+
+        for attendance in attendances:
+            work_calendar = employees[attendance['employee_id']]['calendar']
+            scheduled_hours = scheduled_hours_by_calendar.get(work_calendar)
+            if attendance['worked_hours'] <= 0:
+                attendance['work_days'] = 0.0
+            elif scheduled_hours is None:
+                attendance['work_days'] = self._calculate_work_days_standard(attendance['worked_hours'])
+            else:
+                attendance['work_days'] = self._calculate_work_days_scheduled(
+                    attendance['worked_hours'], attendance['overtime_hours'],
+                    scheduled_hours[attendance['work_date']])
+
+    def _get_streaming_formats(self, workbook):
+        """Các format xlsxwriter tương ứng với kiểu ô của báo cáo"""
+        formats = {
+            'title': workbook.add_format({'bold': True, 'font_size': 14, 'align': 'center'}),
+            'header': workbook.add_format({
+                'bold': True,
+                'font_color': 'white',
+                'bg_color': '#366092',
+                'align': 'center',
+                'valign': 'vcenter',
+                'text_wrap': True,
+                'border': 1,
+            }),
+            'left': workbook.add_format({'border': 1, 'align': 'left'}),
+            'center': workbook.add_format({'border': 1, 'align': 'center'}),
+        }
+        for style, color in REPORT_FILL_COLORS.items():
+            formats[style] = workbook.add_format({'border': 1, 'align': 'center', 'bg_color': f'#{color}'})
+        return formats
+
+    def _write_streaming_header(self, ws, formats, title, headers, column_widths):
+        """Ghi tiêu đề và dòng tiêu đề cột của một sheet xuất streaming"""
+        for col, width in enumerate(column_widths):
+            ws.set_column(col, col, width)
+        ws.merge_range(0, 0, 0, len(headers) - 1, title, formats['title'])
+        for col, header in enumerate(headers):
+            ws.write(2, col, header, formats['header'])
+
     def _get_filename(self):
         """Generate filename"""
         date_str = f"{self.date_from.strftime('%d%m%Y')}-{self.date_to.strftime('%d%m%Y')}"
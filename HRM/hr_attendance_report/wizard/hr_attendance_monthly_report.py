@@ -285,7 +285,12 @@ class HrAttendanceMonthlyReport(models.TransientModel):
             return pytz.timezone('UTC')
 
     def _get_attendance_data(self, employees):
-        """Lấy dữ liệu chấm công theo tháng - Xử lý timezone chính xác"""
+        """Lấy dữ liệu chấm công theo tháng - Xử lý timezone chính xác
+
+        Một câu truy vấn gom nhóm theo (nhân viên, ngày local) trả về giờ vào
+        đầu tiên, giờ ra cuối cùng và số giờ làm việc của mỗi ngày, thay vì
+        duyệt từng nhân viên và từng ngày.
+        """
 
         # Lấy timezone của user hoặc company
         user_tz = self._get_user_timezone()
@@ -294,181 +299,132 @@ class HrAttendanceMonthlyReport(models.TransientModel):
         days_in_month = calendar.monthrange(self.year, int(self.month))[1]
 
         # Convert local time range sang UTC để query
-        try:
-            local_start = user_tz.localize(datetime(self.year, int(self.month), 1, 0, 0, 0))
-            local_end = user_tz.localize(datetime(self.year, int(self.month), days_in_month, 23, 59, 59))
-
-            utc_start = local_start.astimezone(pytz.UTC).replace(tzinfo=None)
-            utc_end = local_end.astimezone(pytz.UTC).replace(tzinfo=None)
-        except Exception as e:
-            _logger.error(f"Timezone conversion error: {e}")
-            # Fallback to UTC
-            utc_start = datetime(self.year, int(self.month), 1, 0, 0, 0)
-            utc_end = datetime(self.year, int(self.month), days_in_month, 23, 59, 59)
-
-        attendance_data = {}
-
-        for emp in employees:
-            employee_id = emp['id']
-            attendance_data[employee_id] = {}
-
-            # Lấy tất cả bản ghi chấm công trong tháng (query với UTC time)
-            attendances = self.env['hr.attendance'].search([
-                ('employee_id', '=', employee_id),
-                ('check_in', '>=', utc_start),
-                ('check_in', '<=', utc_end),
-            ], order='check_in')
-
-            # Xử lý dữ liệu theo ngày (convert về local timezone)
-            for day in range(1, days_in_month + 1):
-                current_date = date(self.year, int(self.month), day)
-
-                # Filter attendances cho ngày hiện tại theo local timezone
-                day_attendances = []
-                for att in attendances:
-                    try:
-                        # Convert UTC check_in sang local timezone
-                        utc_checkin = pytz.UTC.localize(att.check_in)
-                        local_checkin = utc_checkin.astimezone(user_tz)
-
-                        if local_checkin.date() == current_date:
-                            day_attendances.append(att)
-                    except Exception as e:
-                        _logger.warning(f"Error converting attendance time: {e}")
-                        continue
-
-                if day_attendances:
-                    try:
-                        # Lấy checkin đầu tiên và checkout cuối cùng (convert sang local time)
-                        first_checkin_utc = min(att.check_in for att in day_attendances)
-                        first_checkin_local = pytz.UTC.localize(first_checkin_utc).astimezone(user_tz)
-
-                        # Xử lý checkout
-                        checkout_records = [att.check_out for att in day_attendances if att.check_out]
-                        if checkout_records:
-                            last_checkout_utc = max(checkout_records)
-                            last_checkout_local = pytz.UTC.localize(last_checkout_utc).astimezone(user_tz)
-                            checkout_time = last_checkout_local.strftime('%H:%M')
-                        else:
-                            checkout_time = ''
-
-                        # Tính working hours
-                        working_hours = 0
-                        if checkout_records:
-                            total_seconds = (last_checkout_local - first_checkin_local).total_seconds()
-                            working_hours = round(total_seconds / 3600, 2)
-
-                        attendance_data[employee_id][day] = {
-                            'check_in': first_checkin_local.strftime('%H:%M'),
-                            'check_out': checkout_time,
-                            'working_hours': working_hours,
-                            'has_data': True,
-                            'attendance_count': len(day_attendances)
-                        }
-                    except Exception as e:
-                        _logger.error(f"Error processing attendance for employee {employee_id}, day {day}: {e}")
-                        attendance_data[employee_id][day] = {
-                            'check_in': 'ERROR',
-                            'check_out': 'ERROR',
-                            'working_hours': 0,
-                            'has_data': False,
-                            'attendance_count': 0
-                        }
-                else:
-                    attendance_data[employee_id][day] = {
-                        'check_in': '',
-                        'check_out': '',
-                        'working_hours': 0,
-                        'has_data': False,
-                        'attendance_count': 0
-                    }
+        local_start = user_tz.localize(datetime(self.year, int(self.month), 1, 0, 0, 0))
+        local_end = user_tz.localize(datetime(self.year, int(self.month), days_in_month, 23, 59, 59))
+        utc_start = local_start.astimezone(pytz.UTC).replace(tzinfo=None)
+        utc_end = local_end.astimezone(pytz.UTC).replace(tzinfo=None)
+
+        employee_ids = [emp['id'] for emp in employees]
+        attendance_data = {
+            employee_id: {
+                day: {
+                    'check_in': '',
+                    'check_out': '',
+                    'working_hours': 0,
+                    'has_data': False,
+                    'attendance_count': 0
+                } for day in range(1, days_in_month + 1)
+            } for employee_id in employee_ids
+        }
+        if not employee_ids:
+            return attendance_data
+
+        self.env['hr.attendance'].flush_model(['employee_id', 'check_in', 'check_out'])
+        self.env.cr.execute("""
+            SELECT employee_id,
+                   EXTRACT(DAY FROM check_in AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::int AS day,
+                   to_char(MIN(check_in) AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s, 'HH24:MI') AS first_check_in,
+                   to_char(MAX(check_out) AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s, 'HH24:MI') AS last_check_out,
+                   EXTRACT(EPOCH FROM MAX(check_out) - MIN(check_in)) / 3600 AS working_hours,
+                   COUNT(*) AS attendance_count
+              FROM hr_attendance
+             WHERE employee_id = ANY(%(employee_ids)s)
+               AND check_in >= %(utc_start)s
+               AND check_in <= %(utc_end)s
+             GROUP BY 1, 2
+        """, {
+            'tz': user_tz.zone,
+            'employee_ids': employee_ids,
+            'utc_start': utc_start,
+            'utc_end': utc_end,
+        })
+        for employee_id, day, first_check_in, last_check_out, working_hours, attendance_count in self.env.cr.fetchall():
+            attendance_data[employee_id][day] = {
+                'check_in': first_check_in,
+                'check_out': last_check_out or '',
+                'working_hours': round(float(working_hours), 2) if working_hours else 0,
+                'has_data': True,
+                'attendance_count': attendance_count
+            }
 
         return attendance_data
 
     def _get_leave_data(self, employees):
-        """Lấy dữ liệu nghỉ phép theo tháng - Xử lý timezone chính xác"""
+        """Lấy dữ liệu nghỉ phép theo tháng - Xử lý timezone chính xác
 
-        # Lấy timezone của user hoặc company
-        user_tz = self._get_user_timezone()
+        Các ngày của mỗi đơn nghỉ được trải ra trong SQL (generate_series) và
+        các đơn nghỉ được đọc một lần cho cả báo cáo.
+        """
 
-        # Tạo range ngày trong tháng theo timezone local
+        # Tạo range ngày trong tháng
         days_in_month = calendar.monthrange(self.year, int(self.month))[1]
+        month_start = date(self.year, int(self.month), 1)
+        month_end = date(self.year, int(self.month), days_in_month)
+
+        employee_ids = [emp['id'] for emp in employees]
+        leave_data = {
+            employee_id: {
+                day: {
+                    'has_leave': False,
+                    'leave_type': None,
+                    'leave_name': '',
+                    'leave_id': None,
+                    'leave_hours': 0,
+                    'leave_state': None,
+                } for day in range(1, days_in_month + 1)
+            } for employee_id in employee_ids
+        }
+        if not employee_ids:
+            return leave_data
+
+        # Các ngày nghỉ đã approved trong tháng, đơn có ngày bắt đầu sớm hơn được ưu tiên
+        self.env['hr.leave'].flush_model(['employee_id', 'state', 'request_date_from', 'request_date_to'])
+        self.env.cr.execute("""
+            SELECT hl.employee_id,
+                   EXTRACT(DAY FROM leave_day)::int AS day,
+                   hl.id
+              FROM hr_leave hl
+              CROSS JOIN LATERAL generate_series(
+                    GREATEST(hl.request_date_from, %(month_start)s)::timestamp,
+                    LEAST(hl.request_date_to, %(month_end)s)::timestamp,
+                    interval '1 day') AS leave_day
+             WHERE hl.employee_id = ANY(%(employee_ids)s)
+               AND hl.state = 'validate'
+               AND hl.request_date_from <= %(month_end)s
+               AND hl.request_date_to >= %(month_start)s
+             ORDER BY hl.date_from DESC
+        """, {
+            'employee_ids': employee_ids,
+            'month_start': month_start,
+            'month_end': month_end,
+        })
+        rows = self.env.cr.fetchall()
+
+        # Đọc các đơn nghỉ phép một lần cho tất cả các ngày
+        leaves = self.env['hr.leave'].browse({leave_id for _employee_id, _day, leave_id in rows})
+        leave_values = {}
+        for leave in leaves:
+            # Xác định loại nghỉ (full day hay half day)
+            leave_type = 'full'
+            if leave.request_unit_half:
+                leave_type = 'half'
+            elif leave.request_unit_hours:
+                # Nếu nghỉ theo giờ, coi là half day nếu < 4 giờ
+                if leave.number_of_hours_display < 4:
+                    leave_type = 'half'
+
+            leave_values[leave.id] = {
+                'has_leave': True,
+                'leave_type': leave_type,
+                'leave_name': leave.holiday_status_id.name or 'Nghỉ phép',
+                'leave_id': leave.id,
+                'leave_hours': leave.number_of_hours_display if leave.request_unit_hours else (
+                    4 if leave_type == 'half' else 8),
+                'leave_state': leave.state,
+            }
 
-        try:
-            # Tạo date range cho tháng hiện tại
-            month_start = date(self.year, int(self.month), 1)
-            month_end = date(self.year, int(self.month), days_in_month)
-        except Exception as e:
-            _logger.error(f"Error creating date range: {e}")
-            return {}
-
-        leave_data = {}
-
-        for emp in employees:
-            employee_id = emp['id']
-            leave_data[employee_id] = {}
-
-            # Lấy tất cả đơn nghỉ phép đã approved trong tháng
-            leaves = self.env['hr.leave'].search([
-                ('employee_id', '=', employee_id),
-                ('state', '=', 'validate'),
-                ('request_date_from', '<=', month_end),
-                ('request_date_to', '>=', month_start),
-            ])
-
-            # Xử lý từng đơn nghỉ phép
-            for leave in leaves:
-                try:
-                    # Lấy range ngày nghỉ
-                    leave_start = leave.request_date_from
-                    leave_end = leave.request_date_to
-
-                    # Xử lý từng ngày trong range nghỉ phép
-                    current_date = leave_start
-                    while current_date <= leave_end:
-                        # Chỉ xử lý ngày trong tháng báo cáo
-                        if current_date.month == int(self.month) and current_date.year == self.year:
-                            day = current_date.day
-
-                            # Xác định loại nghỉ (full day hay half day)
-                            leave_type = 'full'
-                            if leave.request_unit_half:
-                                leave_type = 'half'
-                            elif leave.request_unit_hours:
-                                # Nếu nghỉ theo giờ, coi là half day nếu < 4 giờ
-                                if leave.number_of_hours_display < 4:
-                                    leave_type = 'half'
-
-                            # Lưu thông tin nghỉ phép
-                            leave_data[employee_id][day] = {
-                                'has_leave': True,
-                                'leave_type': leave_type,
-                                'leave_name': leave.holiday_status_id.name or 'Nghỉ phép',
-                                'leave_id': leave.id,
-                                'leave_hours': leave.number_of_hours_display if leave.request_unit_hours else (
-                                    4 if leave_type == 'half' else 8),
-                                'leave_state': leave.state,
-                            }
-
-                        # Chuyển sang ngày tiếp theo
-                        from datetime import timedelta
-                        current_date += timedelta(days=1)
-
-                except Exception as e:
-                    _logger.error(f"Error processing leave for employee {employee_id}: {e}")
-                    continue
-
-            # Đảm bảo tất cả các ngày đều có entry (ngay cả khi không nghỉ)
-            for day in range(1, days_in_month + 1):
-                if day not in leave_data[employee_id]:
-                    leave_data[employee_id][day] = {
-                        'has_leave': False,
-                        'leave_type': None,
-                        'leave_name': '',
-                        'leave_id': None,
-                        'leave_hours': 0,
-                        'leave_state': None,
-                    }
+        for employee_id, day, leave_id in rows:
+            leave_data[employee_id][day] = dict(leave_values[leave_id])
 
         return leave_data
 
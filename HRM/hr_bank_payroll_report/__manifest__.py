@@ -13,6 +13,7 @@
         'hr',
         'payroll',
         'account_payment',
+        'hr_xlsx_export',
     ],
     'data': [
         'security/ir.model.access.csv',
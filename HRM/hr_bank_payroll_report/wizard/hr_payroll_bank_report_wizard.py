@@ -1,17 +1,10 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-import base64
-import io
 import logging
 from datetime import datetime
 
 _logger = logging.getLogger(__name__)
 
-try:
-    import xlsxwriter
-except ImportError:
-    _logger.warning("Thư viện xlsxwriter không được cài đặt!")
-
 
 class HrPayrollBankReportWizard(models.TransientModel):
     _name = 'hr.payroll.bank.report.wizard'
@@ -26,7 +19,7 @@ class HrPayrollBankReportWizard(models.TransientModel):
     salary_rule_code = fields.Char(string='Mã lương thực lãnh', help='Mã lương thực lãnh. Mặc định là NET',
                                    default='NET')
 
-    report_file = fields.Binary(string='Báo cáo', readonly=True)
+    report_file = fields.Binary(string='Báo cáo', readonly=True, attachment=True)
     report_filename = fields.Char(string='Tên file')
     state = fields.Selection([
         ('draft', 'Nháp'),
@@ -60,13 +53,15 @@ class HrPayrollBankReportWizard(models.TransientModel):
         if not payslips:
             raise UserError(_("Không tìm thấy phiếu lương phù hợp với điều kiện!"))
 
-        # Tạo báo cáo Excel
-        report_content = self._generate_excel_report(payslips)
+        # Tạo báo cáo Excel và lưu thẳng vào filestore
+        report_filename = f'Bao_cao_chuyen_luong_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+        Export = self.env['hr.xlsx.export']
+        with Export._open_workbook() as (workbook, output):
+            self._generate_excel_report(workbook, payslips)
+            Export._save_to_field(self, 'report_file', workbook, output, report_filename)
 
-        # Lưu file báo cáo
         self.write({
-            'report_file': base64.b64encode(report_content),
-            'report_filename': f'Bao_cao_chuyen_luong_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            'report_filename': report_filename,
             'state': 'generated'
         })
 
@@ -79,10 +74,11 @@ class HrPayrollBankReportWizard(models.TransientModel):
             'target': 'new',
         }
 
-    def _generate_excel_report(self, payslips):
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
+    def _generate_excel_report(self, workbook, payslips):
+        """Ghi các sheet chuyển lương theo ngân hàng vào ``workbook``
 
+        Các dòng được ghi theo thứ tự, dùng được với workbook constant_memory.
+        """
         # Định nghĩa các style
         header_style = workbook.add_format({
             'bold': True,
@@ -119,7 +115,7 @@ class HrPayrollBankReportWizard(models.TransientModel):
         bank_payslips = {}
         unknown_bank_payslips = []
 
-        for payslip in payslips:
+        for payslip in self.env['hr.xlsx.export']._iter_records(payslips):
             # Kiểm tra thông tin ngân hàng
             bank_account = payslip.employee_id.bank_account_id
             if not bank_account:
@@ -145,10 +141,6 @@ class HrPayrollBankReportWizard(models.TransientModel):
                                     unknown_bank_payslips, header_style, title_style,
                                     date_style, number_style, text_style)
 
-        workbook.close()
-        output.seek(0)
-        return output.read()
-
     def _create_bank_sheet(self, workbook, sheet_name, payslips, header_style,
                            title_style, date_style, number_style, text_style):
         # Tạo một sheet mới cho ngân hàng
@@ -178,7 +170,9 @@ class HrPayrollBankReportWizard(models.TransientModel):
         row = 4
         total_amount = 0
 
-        for idx, payslip in enumerate(payslips, 1):
+        # Danh sách phiếu lương thành recordset để đọc theo lô
+        payslips = self.env['hr.payslip'].union(*payslips)
+        for idx, payslip in enumerate(self.env['hr.xlsx.export']._iter_records(payslips), 1):
             employee = payslip.employee_id
             bank_account = employee.bank_account_id
 
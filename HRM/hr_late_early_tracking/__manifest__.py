@@ -20,6 +20,7 @@ Module này cho phép:
         'hr',
         'hr_attendance',
         'payroll',
+        'hr_payslip_prefetch',
     ],
     'data': [
         'security/ir.model.access.csv',
@@ -1,7 +1,26 @@
 from odoo import models, fields, api
+import heapq
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
+# Số giây mặc định giữ thống kê dashboard trong bộ nhớ đệm, đổi bằng tham số
+# hệ thống hr_late_early_tracking.dashboard_cache_ttl (0 để tắt)
+DASHBOARD_CACHE_TTL = 60
+
+# Số kết quả tối đa giữ trong bộ nhớ đệm, kết quả cũ nhất bị bỏ trước
+DASHBOARD_CACHE_MAX_ENTRIES = 256
+
+# Số nhân viên trong top đi trễ/về sớm
+DASHBOARD_TOP_LIMIT = 5
+
+# {(cơ sở dữ liệu, người dùng, từ ngày, đến ngày, công ty): (hết hạn, thống kê)}, riêng cho mỗi worker
+_dashboard_stats_cache = {}
+# Máy chủ chạy đa luồng (không có --workers) dùng chung bộ nhớ đệm giữa các luồng
+_dashboard_stats_cache_lock = threading.Lock()
+
 
 class HrLateEarlyDashboard(models.TransientModel):
     _name = 'hr.late.early.dashboard'
@@ -34,70 +53,131 @@ class HrLateEarlyDashboard(models.TransientModel):
         """Mặc định là ngày hiện tại"""
         return datetime.today()
 
+    @api.model
+    def _get_dashboard_cache_ttl(self):
+        """Số giây giữ thống kê dashboard trong bộ nhớ đệm, 0 để tắt"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'hr_late_early_tracking.dashboard_cache_ttl', DASHBOARD_CACHE_TTL))
+
+    @api.model
+    def _get_dashboard_stats(self, date_from, date_to):
+        """Thống kê đi trễ/về sớm từ ngày đến ngày, dùng chung cho các phần của dashboard
+
+        Được lấy từ bộ nhớ đệm theo (người dùng, ngày, công ty) trong thời
+        gian ``_get_dashboard_cache_ttl`` giây, để làm mới dashboard không
+        phải tính lại. Thống kê được tính theo quyền truy cập của người dùng
+        nên không dùng chung giữa các người dùng.
+        """
+        ttl = self._get_dashboard_cache_ttl()
+        if ttl <= 0:
+            return self._compute_dashboard_stats(date_from, date_to)
+
+        key = (self.env.cr.dbname, self.env.uid, date_from, date_to, tuple(self.env.companies.ids))
+        now = time.monotonic()
+        with _dashboard_stats_cache_lock:
+            cached = _dashboard_stats_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        stats = self._compute_dashboard_stats(date_from, date_to)
+        with _dashboard_stats_cache_lock:
+            # Bỏ các kết quả đã hết hạn để bộ nhớ đệm không tăng mãi
+            for expired_key in [k for k, (expiry, _stats) in _dashboard_stats_cache.items() if expiry <= now]:
+                del _dashboard_stats_cache[expired_key]
+            _dashboard_stats_cache.pop(key, None)
+            # Bỏ các kết quả thêm vào sớm nhất khi vượt quá số lượng tối đa
+            while len(_dashboard_stats_cache) >= DASHBOARD_CACHE_MAX_ENTRIES:
+                del _dashboard_stats_cache[next(iter(_dashboard_stats_cache))]
+            _dashboard_stats_cache[key] = (now + ttl, stats)
+        return stats
+
+    @api.model
+    def _compute_dashboard_stats(self, date_from, date_to):
+        """Tính thống kê bằng một truy vấn group by nhân viên trên hr.late.early.tracking
+
+        Trả về dict gồm tổng số bản ghi và số phút, top 5 nhân viên đi
+        trễ/về sớm [(employee_id, số phút)] và danh sách giá trị thống kê
+        theo phòng ban. Chỉ chứa id và số để có thể dùng lại giữa các request.
+        """
+        groups = self.env['hr.late.early.tracking']._read_group(
+            [
+                ('date', '>=', date_from),
+                ('date', '<=', date_to),
+                ('employee_id.company_id', 'in', self.env.companies.ids + [False]),
+            ],
+            ['employee_id'],
+            ['__count', 'late_minutes:sum', 'early_minutes:sum', 'penalty_amount:sum'],
+        )
+
+        # Gom theo phòng ban của nhân viên đang làm việc
+        department_totals = defaultdict(lambda: dict.fromkeys(
+            ('late_early_count', 'total_late_minutes', 'total_early_minutes', 'total_penalty_amount'), 0))
+        for employee, count, late_minutes, early_minutes, penalty_amount in groups:
+            if not employee.active or not employee.department_id:
+                continue
+            totals = department_totals[employee.department_id.id]
+            totals['late_early_count'] += count
+            totals['total_late_minutes'] += late_minutes or 0
+            totals['total_early_minutes'] += early_minutes or 0
+            totals['total_penalty_amount'] += penalty_amount or 0
+
+        departments = self.env['hr.department'].search([('id', 'in', list(department_totals))])
+        employee_counts = dict(self.env['hr.employee']._read_group(
+            [('department_id', 'in', departments.ids)], ['department_id'], ['__count']))
+        department_stats = [
+            dict(department_totals[department.id],
+                 department_id=department.id,
+                 employee_count=employee_counts.get(department, 0))
+            for department in departments
+        ]
+
+        employee_minutes = [(employee.id, late_minutes or 0, early_minutes or 0)
+                            for employee, _count, late_minutes, early_minutes, _penalty in groups]
+        return {
+            'count': sum(count for _employee, count, _late, _early, _penalty in groups),
+            'late_minutes': sum(late for _employee_id, late, _early in employee_minutes),
+            'early_minutes': sum(early for _employee_id, _late, early in employee_minutes),
+            'top_late': [(employee_id, late) for employee_id, late, _early in
+                         heapq.nlargest(DASHBOARD_TOP_LIMIT, employee_minutes, key=lambda item: item[1])],
+            'top_early': [(employee_id, early) for employee_id, _late, early in
+                          heapq.nlargest(DASHBOARD_TOP_LIMIT, employee_minutes, key=lambda item: item[2])],
+            'departments': department_stats,
+        }
+
+    def _get_period_stats(self):
+        """Thống kê của khoảng thời gian đã chọn trên dashboard"""
+        self.ensure_one()
+        first_day = self.date_from or datetime.today().replace(day=1).date()
+        last_day = self.date_to or datetime.today().date()
+        return self._get_dashboard_stats(first_day, last_day)
+
     @api.depends('date_from', 'date_to')
     def _compute_dashboard_data(self):
         """Tính toán dữ liệu cho dashboard"""
         for record in self:
-            first_day = record.date_from or datetime.today().replace(day=1)
-            last_day = record.date_to or datetime.today()
-
-            # Tính toán thống kê cho khoảng thời gian
-            current_period_records = self.env['hr.late.early.tracking'].search([
-                ('date', '>=', first_day),
-                ('date', '<=', last_day)
-            ])
-
-            record.current_month_count = len(current_period_records)
-            record.current_month_late_minutes = sum(current_period_records.mapped('late_minutes'))
-            record.current_month_early_minutes = sum(current_period_records.mapped('early_minutes'))
+            stats = record._get_period_stats()
+            record.current_month_count = stats['count']
+            record.current_month_late_minutes = stats['late_minutes']
+            record.current_month_early_minutes = stats['early_minutes']
 
     @api.depends('date_from', 'date_to')
     def _compute_top_employees(self):
         """Tính toán top 5 nhân viên đi trễ/về sớm nhiều nhất"""
         for record in self:
-            first_day = record.date_from or datetime.today().replace(day=1)
-            last_day = record.date_to or datetime.today()
-
-            # Tính toán top nhân viên đi trễ
-            self.env.cr.execute("""
-                SELECT employee_id, SUM(late_minutes) as total_late
-                FROM hr_late_early_tracking
-                WHERE date >= %s AND date <= %s AND employee_id IS NOT NULL
-                GROUP BY employee_id
-                ORDER BY total_late DESC
-                LIMIT 5
-            """, (first_day, last_day))
-            late_results = self.env.cr.dictfetchall()
-
-            # Tính toán top nhân viên về sớm
-            self.env.cr.execute("""
-                SELECT employee_id, SUM(early_minutes) as total_early
-                FROM hr_late_early_tracking
-                WHERE date >= %s AND date <= %s AND employee_id IS NOT NULL
-                GROUP BY employee_id
-                ORDER BY total_early DESC
-                LIMIT 5
-            """, (first_day, last_day))
-            early_results = self.env.cr.dictfetchall()
+            stats = record._get_period_stats()
 
             # Tạo dữ liệu thống kê
-            top_late_vals = []
-            for result in late_results:
-                if result['employee_id']:
-                    top_late_vals.append((0, 0, {
-                        'employee_id': result['employee_id'],
-                        'late_minutes': result['total_late'] or 0,
-                        'stats_type': 'late'
-                    }))
-
-            top_early_vals = []
-            for result in early_results:
-                if result['employee_id']:
-                    top_early_vals.append((0, 0, {
-                        'employee_id': result['employee_id'],
-                        'early_minutes': result['total_early'] or 0,
-                        'stats_type': 'early'
-                    }))
+            top_late_vals = [(0, 0, {
+                'employee_id': employee_id,
+                'late_minutes': late_minutes,
+                'stats_type': 'late'
+            }) for employee_id, late_minutes in stats['top_late']]
+
+            top_early_vals = [(0, 0, {
+                'employee_id': employee_id,
+                'early_minutes': early_minutes,
+                'stats_type': 'early'
+            }) for employee_id, early_minutes in stats['top_early']]
 
             record.top_late_employees_ids = [(5, 0, 0)] + top_late_vals
             record.top_early_employees_ids = [(5, 0, 0)] + top_early_vals
@@ -106,40 +186,8 @@ class HrLateEarlyDashboard(models.TransientModel):
     def _compute_department_stats(self):
         """Tính toán thống kê theo phòng ban"""
         for record in self:
-            first_day = record.date_from or datetime.today().replace(day=1)
-            last_day = record.date_to or datetime.today()
-
-            # Lấy tất cả phòng ban
-            departments = self.env['hr.department'].search([])
-
-            # Kết quả thống kê theo phòng ban
-            department_stats = []
-
-            for department in departments:
-                # Lấy nhân viên trong phòng ban
-                employees = self.env['hr.employee'].search([
-                    ('department_id', '=', department.id)
-                ])
-
-                # Lấy bản ghi đi trễ/về sớm của phòng ban
-                if employees:
-                    late_early_records = self.env['hr.late.early.tracking'].search([
-                        ('employee_id', 'in', employees.ids),
-                        ('date', '>=', first_day),
-                        ('date', '<=', last_day)
-                    ])
-
-                    if late_early_records:
-                        department_stats.append((0, 0, {
-                            'department_id': department.id,
-                            'employee_count': len(employees),
-                            'late_early_count': len(late_early_records),
-                            'total_late_minutes': sum(late_early_records.mapped('late_minutes')),
-                            'total_early_minutes': sum(late_early_records.mapped('early_minutes')),
-                            'total_penalty_amount': sum(late_early_records.mapped('penalty_amount'))
-                        }))
-
-            record.department_stats_ids = [(5, 0, 0)] + department_stats
+            stats = record._get_period_stats()
+            record.department_stats_ids = [(5, 0, 0)] + [(0, 0, dict(vals)) for vals in stats['departments']]
 
     def action_view_all_records(self):
         """Mở danh sách tất cả bản ghi"""
@@ -45,6 +45,13 @@ class HrLateEarlyTracking(models.Model):
     # Ghi chú
     note = fields.Text(string='Note')
 
+    def init(self):
+        # Dashboard và báo cáo lọc theo khoảng ngày rồi gom theo nhân viên
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS hr_late_early_tracking_date_employee_idx
+                ON hr_late_early_tracking (date, employee_id)
+        """)
+
     @api.depends('employee_id', 'date')
     def _compute_name(self):
         for record in self:
@@ -65,17 +65,16 @@ class HrPayslip(models.Model):
             date_to_utc = date_to_vn.astimezone(pytz.UTC).replace(tzinfo=None)
 
             # Lấy dữ liệu chấm công trong khoảng thời gian của phiếu lương
-            attendances = self.env['hr.attendance'].search([
-                ('employee_id', '=', payslip.employee_id.id),
-                ('check_in', '>=', date_from_utc),
-                ('check_in', '<=', date_to_utc),
-                ('check_out', '!=', False),  # Chỉ lấy những bản ghi đã check-out
-                '|',  # OR condition
-                ('late_minutes', '>', 0),  # Có đi trễ
-                ('early_minutes', '>', 0)  # Hoặc có về sớm
-            ])
+            # từ dữ liệu prefetch của cả lô phiếu lương
+            attendances = payslip._get_prefetched_attendances(
+                payslip.employee_id, date_from_utc, date_to_utc
+            ).filtered(
+                lambda attendance: attendance.check_out  # Chỉ lấy những bản ghi đã check-out
+                and (attendance.late_minutes > 0 or attendance.early_minutes > 0)  # Có đi trễ hoặc về sớm
+            )
 
             # Tạo bản ghi tracking cho từng attendance có đi trễ/về sớm
+            tracking_vals_list = []
             for attendance in attendances:
                 # Lấy ngày chấm công (chuyển từ UTC về múi giờ local để lấy ngày)
                 check_in_local = attendance.check_in
@@ -87,7 +86,7 @@ class HrPayslip(models.Model):
 
                 # Kiểm tra xem ngày có nằm trong khoảng phiếu lương không
                 if payslip.date_from <= attendance_date <= payslip.date_to:
-                    self.env['hr.late.early.tracking'].create({
+                    tracking_vals_list.append({
                         'employee_id': payslip.employee_id.id,
                         'date': attendance_date,
                         'scheduled_check_in': attendance.scheduled_check_in,
@@ -99,5 +98,6 @@ class HrPayslip(models.Model):
                         'payslip_id': payslip.id,
                         'state': 'draft',
                     })
+            self.env['hr.late.early.tracking'].create(tracking_vals_list)
 
             return True
\ No newline at end of file
@@ -10,7 +10,7 @@ This module provides detailed payroll reports for employees.
     """,
     'author': 'Your Name',
     'website': 'https://www.yourwebsite.com',
-    'depends': ['payroll', 'hr'],
+    'depends': ['payroll', 'hr', 'hr_xlsx_export'],
     'data': [
         'security/hr_payroll_report_security.xml',
         'security/ir.model.access.csv',
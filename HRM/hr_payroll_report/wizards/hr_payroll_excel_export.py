@@ -1,12 +1,31 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from collections import defaultdict
 from datetime import datetime
-import base64
-import io
-import xlsxwriter
 import calendar
 from dateutil.relativedelta import relativedelta
 
+# Nhóm cột của báo cáo tổng hợp: (khóa dữ liệu, mã salary rule, tên salary rule).
+# Một salary rule thuộc nhóm đầu tiên có mã chứa một trong các mã hoặc tên chứa
+# một trong các tên (so sánh chữ hoa).
+SUMMARY_RULE_CATEGORIES = [
+    ('basic_salary', ['BASIC', 'BASIC_SALARY', 'LUONG_CO_BAN'], ['LƯƠNG CƠ BẢN', 'LUONG CO BAN']),
+    ('salary_amount', ['GROSS', 'TONG_LUONG', 'SALARY'], ['TỔNG LƯƠNG', 'TONG LUONG']),
+    ('overtime_amount', ['OT_ALW', 'TANG_CA_TIEN', 'OVERTIME_PAY'], ['TĂNG CA', 'TANG CA']),
+    ('seniority', ['THAM_NIEN', 'SENIORITY', 'SENIOR_ALW'], ['THÂM NIÊN', 'THAM NIEN']),
+    ('total_allowances', ['PHU_CAP', 'ALLOWANCE', 'ALW_'], ['PHỤ CẤP', 'PHU CAP']),
+    ('other_plus', ['CONG_KHAC', 'OTHER_PLUS', 'BONUS'], ['CỘNG KHÁC', 'CONG KHAC', 'THƯỞNG', 'THUONG']),
+    ('late_penalty', ['LATE_PEN', 'DI_TRE', 'PENALTY', 'LATE_EAR'], ['ĐI TRỄ', 'DI TRE', 'PHẠT', 'PHAT']),
+    ('insurance', ['BAO_HIEM', 'INSURANCE', 'BHXH', 'BHYT', 'BHTN'], ['BẢO HIỂM', 'BAO HIEM']),
+    ('union_fee', ['CONG_DOAN', 'UNION', 'CD_FEE'], ['CÔNG ĐOÀN', 'CONG DOAN']),
+    ('other_minus', ['TRU_KHAC', 'OTHER_MINUS', 'DEDUCTION'], ['TRỪ KHÁC', 'TRU KHAC']),
+    ('advance', ['TAM_UNG', 'ADVANCE', 'PREPAID'], ['TẠM ỨNG', 'TAM UNG']),
+    ('net_salary', ['NET', 'THUC_LINH', 'NET_SALARY'], ['THỰC LĨNH', 'THUC LINH']),
+]
+
+# Nhóm cột khấu trừ, hiển thị số dương
+SUMMARY_ABS_CATEGORIES = {'late_penalty', 'insurance', 'union_fee', 'other_minus', 'advance'}
+
 
 class HrPayrollExcelExport(models.TransientModel):
     _name = 'hr.payroll.excel.export'
@@ -37,7 +56,7 @@ class HrPayrollExcelExport(models.TransientModel):
     show_workdays = fields.Boolean(string='Show Working Days', default=True)
 
     group_by_department = fields.Boolean(string='Group by Department', default=True)
-    excel_file = fields.Binary('Excel Report', readonly=True)
+    excel_file = fields.Binary('Excel Report', readonly=True, attachment=True)
     file_name = fields.Char('File Name', readonly=True)
     state = fields.Selection([
         ('choose', 'Choose'),
@@ -123,24 +142,21 @@ class HrPayrollExcelExport(models.TransientModel):
         if not payslips:
             raise UserError(_("No payslips found for the selected criteria."))
 
-        # Tạo file Excel
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
+        report_name = 'Detailed' if self.report_type == 'detailed' else 'Summary'
+        file_name = f'Payroll_{report_name}_Report_{self.date_from}_{self.date_to}.xlsx'
 
-        # Chọn phương thức tạo báo cáo dựa trên loại báo cáo
-        if self.report_type == 'summary':
-            self._create_summary_excel_report(workbook, payslips)
-        else:
-            self._create_excel_report(workbook, payslips)
+        # Tạo file Excel ở chế độ constant_memory và lưu thẳng vào filestore
+        Export = self.env['hr.xlsx.export']
+        with Export._open_workbook() as (workbook, output):
+            # Chọn phương thức tạo báo cáo dựa trên loại báo cáo
+            if self.report_type == 'summary':
+                self._create_summary_excel_report(workbook, payslips)
+            else:
+                self._create_excel_report(workbook, payslips)
 
-        workbook.close()
-        output.seek(0)
+            Export._save_to_field(self, 'excel_file', workbook, output, file_name)
 
-        # Lưu file Excel vào field binary
-        report_name = 'Detailed' if self.report_type == 'detailed' else 'Summary'
-        file_name = f'Payroll_{report_name}_Report_{self.date_from}_{self.date_to}.xlsx'
         self.write({
-            'excel_file': base64.b64encode(output.read()),
             'file_name': file_name,
             'state': 'done'
         })
@@ -154,6 +170,39 @@ class HrPayrollExcelExport(models.TransientModel):
             'target': 'new',
         }
 
+    def _classify_salary_rule(self, rule):
+        """Nhóm cột của báo cáo tổng hợp ứng với một salary rule, None nếu không thuộc nhóm nào"""
+        rule_code = (rule.code or '').upper()
+        rule_name = (rule.name or '').upper()
+        for category, codes, names in SUMMARY_RULE_CATEGORIES:
+            if any(code in rule_code for code in codes) or any(name in rule_name for name in names):
+                return category
+        return None
+
+    def _get_summary_category_amounts(self, payslips):
+        """Số tiền theo nhóm cột của báo cáo tổng hợp cho từng phiếu lương
+
+        Các dòng lương được cộng bằng một truy vấn group by (phiếu lương,
+        salary rule), mỗi salary rule chỉ được phân loại một lần.
+        Trả về {slip_id: {nhóm cột: số tiền}}.
+        """
+        groups = self.env['hr.payslip.line']._read_group(
+            [('slip_id', 'in', payslips.ids)],
+            ['slip_id', 'salary_rule_id'],
+            ['total:sum'],
+        )
+        categories = {}
+        amounts_by_slip = defaultdict(lambda: defaultdict(float))
+        for slip, rule, total in groups:
+            if rule not in categories:
+                categories[rule] = self._classify_salary_rule(rule)
+            category = categories[rule]
+            if not category:
+                continue
+            # Các khoản khấu trừ luôn hiển thị số dương
+            amounts_by_slip[slip.id][category] += abs(total) if category in SUMMARY_ABS_CATEGORIES else total
+        return amounts_by_slip
+
     def _create_summary_excel_report(self, workbook, payslips):
         """Tạo báo cáo tổng hợp theo format chuẩn"""
         worksheet = workbook.add_worksheet('Bảng lương tổng hợp')
@@ -267,26 +316,13 @@ class HrPayrollExcelExport(models.TransientModel):
             'font_size': 10
         })
 
-        # Tạo mapping các rule codes với các cột
-        rule_mapping = {
-            'basic_salary': ['BASIC', 'BASIC_SALARY', 'LUONG_CO_BAN'],
-            'salary_amount': ['GROSS', 'TONG_LUONG', 'SALARY'],
-            'overtime_amount': ['OT_ALW', 'TANG_CA_TIEN', 'OVERTIME_PAY'],
-            'seniority': ['THAM_NIEN', 'SENIORITY', 'SENIOR_ALW'],
-            'allowances': ['PHU_CAP', 'ALLOWANCE', 'ALW_'],
-            'other_plus': ['CONG_KHAC', 'OTHER_PLUS', 'BONUS'],
-            'late_penalty': ['LATE_PEN', 'DI_TRE', 'PENALTY', 'LATE_EAR'],
-            'insurance': ['BAO_HIEM', 'INSURANCE', 'BHXH', 'BHYT', 'BHTN'],
-            'union_fee': ['CONG_DOAN', 'UNION', 'CD_FEE'],
-            'other_minus': ['TRU_KHAC', 'OTHER_MINUS', 'DEDUCTION'],
-            'advance': ['TAM_UNG', 'ADVANCE', 'PREPAID'],
-            'net_salary': ['NET', 'THUC_LINH', 'NET_SALARY']
-        }
+        # Phân loại mỗi salary rule một lần, cộng số tiền theo (phiếu lương, nhóm cột)
+        amounts_by_slip = self._get_summary_category_amounts(payslips)
 
         # Tạo dữ liệu tổng hợp cho từng nhân viên
         employee_data = {}
 
-        for slip in payslips:
+        for slip in self.env['hr.xlsx.export']._iter_records(payslips):
             employee = slip.employee_id
             if employee.id not in employee_data:
                 employee_data[employee.id] = {
@@ -325,60 +361,9 @@ class HrPayrollExcelExport(models.TransientModel):
             if hasattr(slip, 'overtime_hours'):
                 employee_data[employee.id]['overtime_hours'] = slip.overtime_hours or 0
 
-            # Xử lý các salary rules
-            for line in slip.line_ids:
-                rule_code = line.salary_rule_id.code.upper()
-                rule_name = line.salary_rule_id.name.upper()
-                amount = line.total
-
-                # Mapping rules với các cột
-                if any(code in rule_code for code in rule_mapping['basic_salary']) or any(
-                        name in rule_name for name in ['LƯƠNG CƠ BẢN', 'LUONG CO BAN']):
-                    employee_data[employee.id]['basic_salary'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['salary_amount']) or any(
-                        name in rule_name for name in ['TỔNG LƯƠNG', 'TONG LUONG']):
-                    employee_data[employee.id]['salary_amount'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['overtime_amount']) or any(
-                        name in rule_name for name in ['TĂNG CA', 'TANG CA']):
-                    employee_data[employee.id]['overtime_amount'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['seniority']) or any(
-                        name in rule_name for name in ['THÂM NIÊN', 'THAM NIEN']):
-                    employee_data[employee.id]['seniority'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['allowances']) or any(
-                        name in rule_name for name in ['PHỤ CẤP', 'PHU CAP']):
-                    employee_data[employee.id]['total_allowances'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['other_plus']) or any(
-                        name in rule_name for name in ['CỘNG KHÁC', 'CONG KHAC', 'THƯỞNG', 'THUONG']):
-                    employee_data[employee.id]['other_plus'] += amount
-
-                elif any(code in rule_code for code in rule_mapping['late_penalty']) or any(
-                        name in rule_name for name in ['ĐI TRỄ', 'DI TRE', 'PHẠT', 'PHAT']):
-                    employee_data[employee.id]['late_penalty'] += abs(amount)  # Đảm bảo là số dương
-
-                elif any(code in rule_code for code in rule_mapping['insurance']) or any(
-                        name in rule_name for name in ['BẢO HIỂM', 'BAO HIEM']):
-                    employee_data[employee.id]['insurance'] += abs(amount)  # Đảm bảo là số dương
-
-                elif any(code in rule_code for code in rule_mapping['union_fee']) or any(
-                        name in rule_name for name in ['CÔNG ĐOÀN', 'CONG DOAN']):
-                    employee_data[employee.id]['union_fee'] += abs(amount)  # Đảm bảo là số dương
-
-                elif any(code in rule_code for code in rule_mapping['other_minus']) or any(
-                        name in rule_name for name in ['TRỪ KHÁC', 'TRU KHAC']):
-                    employee_data[employee.id]['other_minus'] += abs(amount)  # Đảm bảo là số dương
-
-                elif any(code in rule_code for code in rule_mapping['advance']) or any(
-                        name in rule_name for name in ['TẠM ỨNG', 'TAM UNG']):
-                    employee_data[employee.id]['advance'] += abs(amount)  # Đảm bảo là số dương
-
-                elif any(code in rule_code for code in rule_mapping['net_salary']) or any(
-                        name in rule_name for name in ['THỰC LĨNH', 'THUC LINH']):
-                    employee_data[employee.id]['net_salary'] += amount
+            # Cộng số tiền các salary rules đã gom theo nhóm cột
+            for category, amount in amounts_by_slip.get(slip.id, {}).items():
+                employee_data[employee.id][category] += amount
 
         # Bắt đầu viết dữ liệu vào Excel
         row = 0
@@ -756,13 +741,10 @@ class HrPayrollExcelExport(models.TransientModel):
 
         # Lấy tất cả các mã lương (salary rules) độc nhất từ tất cả phiếu lương
         all_rules = {}
-        all_rule_codes = set()
-        for slip in payslips:
-            for line in slip.line_ids:
-                all_rule_codes.add(line.salary_rule_id.id)
-
-        # Lấy thông tin và sequence của tất cả các salary rules
-        salary_rules = self.env['hr.salary.rule'].browse(list(all_rule_codes))
+        salary_rules = self.env['hr.salary.rule'].union(*(
+            rule for [rule] in self.env['hr.payslip.line']._read_group(
+                [('slip_id', 'in', payslips.ids)], ['salary_rule_id'])
+        ))
 
         # Tạo từ điển rule_id -> (code, name, sequence)
         net_rule_id = None  # Để lưu ID của quy tắc NET
@@ -803,7 +785,7 @@ class HrPayrollExcelExport(models.TransientModel):
         # Nhóm phiếu lương theo nhân viên và mã phiếu lương
         payslips_by_employee_slip = {}
 
-        for slip in payslips:
+        for slip in self.env['hr.xlsx.export']._iter_records(payslips):
             employee = slip.employee_id
             key = (employee, slip.id)  # Dùng tuple (nhân viên, mã phiếu lương) làm key
             payslips_by_employee_slip[key] = slip
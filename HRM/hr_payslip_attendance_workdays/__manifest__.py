@@ -39,6 +39,8 @@ Result: WORK100 = 1+1+1+1+0.5 = 4.5 days
     'depends': [
         'payroll',
         'hr_attendance',
+        'hr_work_schedule_cache',
+        'hr_payslip_prefetch',
     ],
     'data': [
     ],
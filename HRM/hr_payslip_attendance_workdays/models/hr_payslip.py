@@ -45,13 +45,12 @@ class HrPayslip(models.Model):
         day_from_utc = day_from_local.astimezone(timezone('UTC'))
         day_to_utc = day_to_local.astimezone(timezone('UTC'))
 
-        # Get attendance records for the period with both check-in and check-out
-        attendances = self.env['hr.attendance'].search([
-            ('employee_id', '=', contract.employee_id.id),
-            ('check_in', '>=', day_from_utc),
-            ('check_in', '<=', day_to_utc),
-            ('check_out', '!=', False)  # Only count completed attendance records
-        ])
+        # Get attendance records for the period with both check-in and check-out,
+        # from the data prefetched for the whole payslip batch
+        day_from_utc = day_from_utc.replace(tzinfo=None)
+        day_to_utc = day_to_utc.replace(tzinfo=None)
+        attendances = self._get_prefetched_attendances(contract.employee_id, day_from_utc, day_to_utc).filtered(
+            'check_out')  # Only count completed attendance records
 
         if not attendances:
             return {
@@ -75,12 +74,9 @@ class HrPayslip(models.Model):
             }
 
         # Get leave allocations for the period
-        leaves = self.env['hr.leave'].search([
-            ('employee_id', '=', contract.employee_id.id),
-            ('date_from', '<=', day_to_local),
-            ('date_to', '>=', day_from_local),
-            ('state', '=', 'validate')
-        ])
+        leaves = self._get_prefetched_leaves(
+            contract.employee_id, day_from_local.date() - timedelta(days=1), day_to_local.date() + timedelta(days=1)
+        ).filtered(lambda leave: leave.date_from <= day_to_utc and leave.date_to >= day_from_utc)
 
         # Calculate worked days considering attendance and leaves
         attendance_days = {}  # {date: worked_hours}
@@ -124,28 +120,16 @@ class HrPayslip(models.Model):
 
                 current_date += timedelta(days=1)
 
+        # Scheduled hours of every attendance day, from the shared calendar cache
+        scheduled_hours_by_day = work_calendar._get_scheduled_hours_by_day(
+            list(attendance_days), employee_tz.zone, contract.employee_id.resource_id)
+
         # Calculate final worked days
         for attendance_date, worked_hours in attendance_days.items():
-            # Get work calendar intervals for this date
-            day_start = employee_tz.localize(datetime.combine(attendance_date, datetime.min.time()))
-            day_end = employee_tz.localize(datetime.combine(attendance_date, datetime.max.time()))
-
-            # Get work intervals from calendar
-            intervals = work_calendar._work_intervals_batch(day_start, day_end, contract.employee_id.resource_id)[
-                contract.employee_id.resource_id.id]
-
-            if not intervals:
-                continue  # Skip non-working days
-
-            # Calculate total scheduled hours for this day
-            scheduled_hours = 0.0
-            work_intervals = [(start, stop) for start, stop, meta in intervals]
-
-            for start, stop in work_intervals:
-                scheduled_hours += (stop - start).total_seconds() / 3600.0
+            scheduled_hours = scheduled_hours_by_day[attendance_date]
 
             if scheduled_hours == 0:
-                continue
+                continue  # Skip non-working days
 
             # Determine if it's full day or half day based on worked hours vs scheduled hours
             worked_day_ratio = min(worked_hours / scheduled_hours, 1.0)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'HR Payslip Batch Background Compute',
+    'version': '17.0.1.0.0',
+    'category': 'Human Resources/Payroll',
+    'summary': 'Compute the payslips of a batch in parallel background shards',
+    'description': """
+HR Payslip Batch Background Compute
+===================================
+
+Computing every payslip of a large batch in one request can outlast the
+HTTP worker timeout. This module splits the payslips of a batch into
+employee shards that are computed by background workers, each shard in its
+own transaction.
+
+* Several worker crons claim shards concurrently (up to the number of cron
+  threads of the server)
+* Progress of the batch is shown on the payslip batch
+* Failed shards are retried, up to a maximum number of attempts
+* Once every shard is finished, the batch is consolidated and a summary of
+  the errors is kept
+    """,
+    'author': 'Wokwy (quochuy.software@gmail.com)',
+    'website': 'https://www.c2bgroup.net',
+    'license': 'LGPL-3',
+    'depends': [
+        'payroll',
+    ],
+    'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
+        'views/hr_payslip_run_views.xml',
+    ],
+    'installable': True,
+    'auto_install': False,
+    'application': False,
+}
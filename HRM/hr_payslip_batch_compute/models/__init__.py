@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import hr_payslip_compute_shard
+from . import hr_payslip_run
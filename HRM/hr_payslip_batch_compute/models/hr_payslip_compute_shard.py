@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# Payslips computed per shard, in one transaction
+SHARD_SIZE = 100
+
+# Attempts of a shard before it is left failed
+MAX_ATTEMPTS = 3
+
+# A shard running for longer is considered abandoned by a stopped worker
+STALE_RUNNING_MINUTES = 30
+
+# Seconds a worker cron run spends on shards before handing over to the next
+# run, capped to half of the cron real time limit so that the shard started
+# last can finish before the worker is killed
+WORKER_TIME_BUDGET = 90
+
+# Worker crons claiming shards concurrently, see data/ir_cron_data.xml
+WORKER_CRON_COUNT = 4
+
+# Payslip states that can be computed
+COMPUTABLE_STATES = ('draft', 'verify')
+
+
+class HrPayslipComputeShard(models.Model):
+    _name = 'hr.payslip.compute.shard'
+    _description = 'Payslip Batch Compute Shard'
+    _order = 'run_id, sequence, id'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Payslip Batch', required=True,
+                             ondelete='cascade', index=True)
+    sequence = fields.Integer('Sequence')
+    payslip_ids = fields.Many2many('hr.payslip', string='Payslips')
+    payslip_count = fields.Integer('Payslips Count', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+    attempts = fields.Integer('Attempts', readonly=True)
+    error_message = fields.Text('Error', readonly=True)
+    date_start = fields.Datetime('Started', readonly=True)
+    date_end = fields.Datetime('Finished', readonly=True)
+
+    @api.model
+    def _trigger_workers(self):
+        """Wake up every worker cron, each one claims its own shards"""
+        for index in range(1, WORKER_CRON_COUNT + 1):
+            cron = self.env.ref('hr_payslip_batch_compute.ir_cron_compute_payslip_shards_%d' % index,
+                                raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    @api.model
+    def _get_worker_time_budget(self):
+        """Seconds a worker cron run may spend claiming shards"""
+        limit = config['limit_time_real_cron']
+        if limit is None or limit < 0:
+            limit = config['limit_time_real']
+        if limit and limit > 0:
+            return min(WORKER_TIME_BUDGET, limit / 2)
+        return WORKER_TIME_BUDGET
+
+    @api.model
+    def _cron_compute_shards(self, time_budget=None):
+        """Compute shards one by one until none is left or the time budget is spent
+
+        Several worker crons run this concurrently, shards are claimed with
+        SKIP LOCKED so each one is computed by a single worker.
+        """
+        if time_budget is None:
+            time_budget = self._get_worker_time_budget()
+        self._fail_stale_shards()
+        deadline = time.monotonic() + time_budget
+        while time.monotonic() < deadline:
+            shard = self._claim_shard()
+            if not shard:
+                break
+            shard._compute_shard()
+        else:
+            # Out of time, continue in a fresh cron run
+            self._trigger_workers()
+        # Consolidate batches whose last shard was finished by a concurrent worker
+        self.env['hr.payslip.run'].search([('compute_state', '=', 'running')])._check_background_compute_done()
+
+    @api.model
+    def _get_stale_before(self):
+        return fields.Datetime.now() - timedelta(minutes=STALE_RUNNING_MINUTES)
+
+    @api.model
+    def _fail_stale_shards(self):
+        """Fail the shards left running by a stopped worker on their last attempt
+
+        A shard that kills its worker (memory or time limit) would otherwise
+        be claimed again forever.
+        """
+        self.env.cr.execute("""
+            SELECT id
+              FROM hr_payslip_compute_shard
+             WHERE state = 'running'
+               AND date_start < %s
+               AND attempts >= %s
+               FOR UPDATE SKIP LOCKED
+        """, (self._get_stale_before(), MAX_ATTEMPTS))
+        shards = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not shards:
+            return
+        _logger.warning("Payslip batch shards %s failed: worker stopped on the last attempt", shards.ids)
+        shards.write({
+            'state': 'failed',
+            'error_message': 'The worker computing this shard stopped before it finished '
+                             '(memory or time limit).',
+            'date_end': fields.Datetime.now(),
+        })
+        self.env.cr.commit()
+        shards.run_id._check_background_compute_done()
+        self.env.cr.commit()
+
+    @api.model
+    def _claim_shard(self):
+        """Lock the next shard to compute and commit it as running
+
+        Shards left running by a stopped worker are claimed again once they
+        are older than STALE_RUNNING_MINUTES, unless they used all their
+        attempts (see _fail_stale_shards).
+        """
+        self.env.cr.execute("""
+            SELECT id
+              FROM hr_payslip_compute_shard
+             WHERE state = 'pending'
+                OR (state = 'running' AND date_start < %s AND attempts < %s)
+             ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, (self._get_stale_before(), MAX_ATTEMPTS))
+        row = self.env.cr.fetchone()
+        if not row:
+            return self.browse()
+        shard = self.browse(row[0])
+        shard.write({
+            'state': 'running',
+            'attempts': shard.attempts + 1,
+            'date_start': fields.Datetime.now(),
+            'date_end': False,
+        })
+        self.env.cr.commit()
+        return shard
+
+    def _compute_shard(self):
+        """Compute the payslips of the shard in their own transaction
+
+        A failing shard is rolled back and put back in the queue until it has
+        used MAX_ATTEMPTS attempts, then it is left failed.
+        """
+        self.ensure_one()
+        payslips = self.payslip_ids.filtered(lambda payslip: payslip.state in COMPUTABLE_STATES)
+        try:
+            with self.env.cr.savepoint():
+                payslips.with_company(payslips.company_id[:1]).compute_sheet()
+        except Exception as e:
+            self.env.invalidate_all()
+            _logger.exception("Payslip batch %s: shard %s failed (attempt %d)",
+                              self.run_id.id, self.id, self.attempts)
+            self.write({
+                'state': 'failed' if self.attempts >= MAX_ATTEMPTS else 'pending',
+                'error_message': str(e),
+                'date_end': fields.Datetime.now(),
+            })
+        else:
+            self.write({
+                'state': 'done',
+                'error_message': False,
+                'date_end': fields.Datetime.now(),
+            })
+        self.env.cr.commit()
+        self.run_id._check_background_compute_done()
+        self.env.cr.commit()
+        # Drop the computed payslips from the cache before the next shard
+        self.env.invalidate_all()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .hr_payslip_compute_shard import COMPUTABLE_STATES, SHARD_SIZE
+
+
+class HrPayslipRun(models.Model):
+    _inherit = 'hr.payslip.run'
+
+    compute_shard_ids = fields.One2many('hr.payslip.compute.shard', 'run_id', string='Compute Shards',
+                                        readonly=True)
+    compute_state = fields.Selection([
+        ('running', 'Computing'),
+        ('done', 'Computed'),
+        ('failed', 'Computed with Errors'),
+    ], string='Background Compute', readonly=True, copy=False, index=True)
+    compute_progress = fields.Float('Compute Progress', compute='_compute_compute_progress')
+    compute_date_start = fields.Datetime('Compute Started', readonly=True, copy=False)
+    compute_date_end = fields.Datetime('Compute Finished', readonly=True, copy=False)
+    compute_message = fields.Text('Compute Summary', readonly=True, copy=False)
+
+    @api.depends('compute_shard_ids.state', 'compute_shard_ids.payslip_count')
+    def _compute_compute_progress(self):
+        for run in self:
+            total = sum(run.compute_shard_ids.mapped('payslip_count'))
+            finished = sum(run.compute_shard_ids.filtered(
+                lambda shard: shard.state in ('done', 'failed')).mapped('payslip_count'))
+            run.compute_progress = 100.0 * finished / total if total else 0.0
+
+    def action_compute_sheets_background(self):
+        """Split the payslips of the batch in shards computed by the worker crons"""
+        Shard = self.env['hr.payslip.compute.shard']
+        for run in self:
+            if run.compute_state == 'running':
+                raise UserError(_('Payslips of batch %s are already being computed.') % run.name)
+            payslips = run.slip_ids.filtered(lambda payslip: payslip.state in COMPUTABLE_STATES)
+            if not payslips:
+                raise UserError(_('There is no payslip to compute in batch %s.') % run.name)
+            # Keep the payslips of one employee together, in a stable order
+            payslips = payslips.sorted(lambda payslip: (payslip.employee_id.id, payslip.id))
+            # Payroll users may not unlink shards, the previous ones are cleaned up here
+            run.compute_shard_ids.sudo().unlink()
+            Shard.create([{
+                'run_id': run.id,
+                'sequence': sequence,
+                'payslip_ids': [fields.Command.set(list(payslip_ids))],
+                'payslip_count': len(payslip_ids),
+            } for sequence, payslip_ids in enumerate(split_every(SHARD_SIZE, payslips.ids), 1)])
+            run.write({
+                'compute_state': 'running',
+                'compute_date_start': fields.Datetime.now(),
+                'compute_date_end': False,
+                'compute_message': False,
+            })
+        Shard._trigger_workers()
+        return True
+
+    def action_retry_failed_shards(self):
+        """Queue the failed shards again with a fresh set of attempts"""
+        shards = self.compute_shard_ids.filtered(lambda shard: shard.state == 'failed')
+        if not shards:
+            raise UserError(_('There is no failed shard to retry.'))
+        shards.write({'state': 'pending', 'attempts': 0, 'error_message': False})
+        shards.run_id.write({'compute_state': 'running', 'compute_date_end': False})
+        self.env['hr.payslip.compute.shard']._trigger_workers()
+        return True
+
+    def _check_background_compute_done(self):
+        """Consolidate the batches whose shards are all finished
+
+        The batch row is locked so that two workers finishing the last shards
+        at the same time do not both consolidate it; one skipped here is
+        picked up by the next worker cron run.
+        """
+        runs = self.filtered(lambda run: run.compute_state == 'running')
+        if not runs:
+            return
+        self.env.cr.execute("""
+            SELECT run.id
+              FROM hr_payslip_run run
+             WHERE run.id IN %s
+               AND NOT EXISTS (
+                   SELECT 1
+                     FROM hr_payslip_compute_shard shard
+                    WHERE shard.run_id = run.id
+                      AND shard.state IN ('pending', 'running'))
+               FOR UPDATE OF run SKIP LOCKED
+        """, (tuple(runs.ids),))
+        finished_ids = [row[0] for row in self.env.cr.fetchall()]
+        if finished_ids:
+            self.browse(finished_ids)._consolidate_background_compute()
+
+    def _consolidate_background_compute(self):
+        """Set the final state of the batches and summarize the failed shards"""
+        for run in self:
+            shards = run.compute_shard_ids
+            failed = shards.filtered(lambda shard: shard.state == 'failed')
+            lines = [_('%(done)s of %(total)s payslips computed in %(shards)s shards.') % {
+                'done': sum((shards - failed).mapped('payslip_count')),
+                'total': sum(shards.mapped('payslip_count')),
+                'shards': len(shards),
+            }]
+            for shard in failed:
+                lines.append(_('Shard %(sequence)s (%(employees)s): %(error)s') % {
+                    'sequence': shard.sequence,
+                    'employees': ', '.join(shard.payslip_ids.employee_id.mapped('name')),
+                    'error': shard.error_message,
+                })
+            run.write({
+                'compute_state': 'failed' if failed else 'done',
+                'compute_date_end': fields.Datetime.now(),
+                'compute_message': '\n'.join(lines),
+            })
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestBackgroundCompute(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.payroll_user = new_test_user(cls.env, login='payroll_user', groups='payroll.group_payroll_user')
+        employee = cls.env['hr.employee'].create({'name': 'Test Employee'})
+        cls.run = cls.env['hr.payslip.run'].create({'name': 'Test Batch'})
+        cls.env['hr.payslip'].create({
+            'name': 'Test Payslip',
+            'employee_id': employee.id,
+            'payslip_run_id': cls.run.id,
+        })
+
+    def test_compute_twice_as_payroll_user(self):
+        """A payroll user can compute a batch again, its previous shards are replaced"""
+        run = self.run.with_user(self.payroll_user)
+
+        run.action_compute_sheets_background()
+        first_shards = run.compute_shard_ids
+        self.assertEqual(len(first_shards), 1)
+        self.assertEqual(run.compute_state, 'running')
+
+        # Finish the shards as a worker would, without committing
+        first_shards.sudo().write({'state': 'done'})
+        run._check_background_compute_done()
+        self.assertEqual(run.compute_state, 'done')
+
+        run.action_compute_sheets_background()
+        self.assertFalse(first_shards.exists())
+        self.assertEqual(len(run.compute_shard_ids), 1)
+        self.assertEqual(run.compute_state, 'running')
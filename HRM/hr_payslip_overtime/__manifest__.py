@@ -5,7 +5,7 @@
     'description': 'Module to manage overtime details in payslip',
     'category': 'Human Resources/Payroll',
     'author': 'Wokwy + support by Claude.ai',
-    'depends': ['payroll', 'hr_attendance'],
+    'depends': ['payroll', 'hr_attendance', 'hr_payslip_prefetch'],
     'data': [
         'security/ir.model.access.csv',
         'views/hr_payslip_views.xml',
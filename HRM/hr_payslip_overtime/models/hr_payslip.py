@@ -61,14 +61,15 @@ class HrPayslip(models.Model):
             date_from_utc = date_from_vn.astimezone(pytz.UTC).replace(tzinfo=None)
             date_to_utc = date_to_vn.astimezone(pytz.UTC).replace(tzinfo=None)
             # Lấy dữ liệu chấm công trong khoảng thời gian của phiếu lương
-
-            attendances = self.env['hr.attendance'].search([
-                ('employee_id', '=', payslip.employee_id.id),
-                ('check_in', '>=', date_from_utc),
-                ('check_out', '<=', date_to_utc),
-                ('check_out', '!=', False),  # Chỉ lấy những bản ghi đã check-out
-                ('overtime_hours', '>', 0)  # Chỉ lấy những bản ghi có tăng ca
-            ])
+            # từ dữ liệu prefetch của cả lô phiếu lương
+            attendances = payslip._get_prefetched_attendances(
+                payslip.employee_id, date_from_utc, date_to_utc
+            ).filtered(
+                lambda attendance: attendance.check_out  # Chỉ lấy những bản ghi đã check-out
+                and attendance.check_out <= date_to_utc
+                and attendance.overtime_hours > 0  # Chỉ lấy những bản ghi có tăng ca
+            )
+            overtime_plan_vals_list = []
 
             # Xử lý từng bản ghi attendance
             for attendance in attendances:
@@ -86,7 +87,7 @@ class HrPayslip(models.Model):
 
                 # Tạo overtime plan cho tăng ca trước giờ làm việc (early overtime)
                 if attendance.overtime_early > 0:
-                    self.env['hr.overtime.plan'].create({
+                    overtime_plan_vals_list.append({
                         'name': f'Tăng ca sớm (trước ca làm việc) ngày {attendance_date}',
                         'date_from': check_in_local.date(),
                         'date_to': check_out_local.date(),
@@ -99,7 +100,7 @@ class HrPayslip(models.Model):
                 if (attendance.overtime_regular > 0 and
                         attendance.overtime_evening <= 0 and
                         attendance.overtime_night <= 0):
-                    self.env['hr.overtime.plan'].create({
+                    overtime_plan_vals_list.append({
                         'name': f'Tăng ca thường (trước 18h) ngày {attendance_date}',
                         'date_from': check_in_local.date(),
                         'date_to': check_out_local.date(),
@@ -110,7 +111,7 @@ class HrPayslip(models.Model):
 
                 # Tạo overtime plan cho tăng ca buổi tối (18h-21h)
                 if attendance.overtime_evening > 0:
-                    self.env['hr.overtime.plan'].create({
+                    overtime_plan_vals_list.append({
                         'name': f'Tăng ca tối (18h-21h) ngày {attendance_date}',
                         'date_from': check_in_local.date(),
                         'date_to': check_out_local.date(),
@@ -121,7 +122,7 @@ class HrPayslip(models.Model):
 
                 # Tạo overtime plan cho tăng ca đêm (sau 21h)
                 if attendance.overtime_night > 0:
-                    self.env['hr.overtime.plan'].create({
+                    overtime_plan_vals_list.append({
                         'name': f'Tăng ca đêm (sau 21h) ngày {attendance_date}',
                         'date_from': check_in_local.date(),
                         'date_to': check_out_local.date(),
@@ -132,7 +133,7 @@ class HrPayslip(models.Model):
 
                 # Tạo overtime plan cho tăng ca ngày nghỉ
                 if attendance.overtime_holiday > 0:
-                    self.env['hr.overtime.plan'].create({
+                    overtime_plan_vals_list.append({
                         'name': f'Tăng ca ngày nghỉ {attendance_date}',
                         'date_from': check_in_local.date(),
                         'date_to': check_out_local.date(),
@@ -140,6 +141,7 @@ class HrPayslip(models.Model):
                         'payment_percentage': self._get_overtime_rate(attendance_date),
                         'payslip_id': payslip.id,
                     })
+            self.env['hr.overtime.plan'].create(overtime_plan_vals_list)
 
             return True
 
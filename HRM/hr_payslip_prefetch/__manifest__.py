@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'HR Payslip Batch Prefetch',
+    'version': '17.0.1.0.0',
+    'category': 'Human Resources/Payroll',
+    'summary': 'Load the payslip data of a whole batch with one query per source',
+    'description': """
+HR Payslip Batch Prefetch
+=========================
+
+Worked days, allowances, contributions, loans, overtime and late/early
+tracking all look up data of the payslip employee for the payslip period.
+Done slip by slip, a payslip batch of a few thousand employees turns into
+tens of thousands of small queries.
+
+This module adds non-stored computed fields on payslips holding the
+attendances and leaves of the period. Like any computed field, they are
+computed for every payslip of the batch at once, with one query per source,
+and the per-slip hooks read them from the cache. Other payroll modules add
+their own prefetch fields with the same helpers.
+    """,
+    'author': 'Wokwy (quochuy.software@gmail.com)',
+    'website': 'https://www.c2bgroup.net',
+    'license': 'LGPL-3',
+    'depends': [
+        'payroll',
+        'hr_attendance',
+    ],
+    'data': [
+    ],
+    'installable': True,
+    'auto_install': False,
+    'application': False,
+}
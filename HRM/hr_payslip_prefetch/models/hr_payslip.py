@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from odoo import api, fields, models
+from odoo.osv import expression
+
+# Số ngày mở rộng mỗi phía của kỳ lương, để kỳ lương theo mọi múi giờ đều
+# nằm trong dữ liệu prefetch
+PREFETCH_MARGIN_DAYS = 1
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    prefetch_attendance_ids = fields.Many2many(
+        'hr.attendance',
+        string='Prefetched Attendances',
+        compute='_compute_prefetch_attendance_ids',
+        help='Chấm công của nhân viên trong kỳ lương (mở rộng một ngày mỗi phía), '
+             'được tính cùng lúc cho tất cả phiếu lương của lô'
+    )
+    prefetch_leave_ids = fields.Many2many(
+        'hr.leave',
+        string='Prefetched Leaves',
+        compute='_compute_prefetch_leave_ids',
+        help='Nghỉ phép đã duyệt của nhân viên trong kỳ lương (mở rộng một ngày mỗi phía), '
+             'được tính cùng lúc cho tất cả phiếu lương của lô'
+    )
+
+    def _filter_prefetchable(self):
+        """Các phiếu lương đủ nhân viên và kỳ lương để prefetch"""
+        return self.filtered(lambda payslip: payslip.employee_id and payslip.date_from and payslip.date_to)
+
+    def _get_prefetch_dates(self):
+        """Khoảng ngày (từ, đến) của dữ liệu prefetch"""
+        self.ensure_one()
+        margin = timedelta(days=PREFETCH_MARGIN_DAYS)
+        return self.date_from - margin, self.date_to + margin
+
+    def _get_prefetch_window(self):
+        """Khoảng [bắt đầu, kết thúc) UTC không múi giờ của chấm công prefetch"""
+        date_from, date_to = self._get_prefetch_dates()
+        return datetime.combine(date_from, time.min), datetime.combine(date_to + timedelta(days=1), time.min)
+
+    def _search_prefetch_records(self, model_name, domain, employee_fname='employee_id'):
+        """Tìm các bản ghi ``domain`` của tất cả nhân viên trong ``self`` bằng một truy vấn
+
+        Trả về {employee_id: recordset}, rỗng với nhân viên không có bản ghi.
+        """
+        Model = self.env[model_name]
+        records = Model.search(expression.AND([domain, [(employee_fname, 'in', self.employee_id.ids)]]))
+        ids_by_employee = defaultdict(list)
+        for record in records:
+            ids_by_employee[record.mapped(employee_fname).id].append(record.id)
+        records_by_employee = defaultdict(Model.browse)
+        records_by_employee.update((employee_id, Model.browse(ids)) for employee_id, ids in ids_by_employee.items())
+        return records_by_employee
+
+    @api.depends('employee_id', 'date_from', 'date_to')
+    def _compute_prefetch_attendance_ids(self):
+        payslips = self._filter_prefetchable()
+        (self - payslips).prefetch_attendance_ids = False
+        if not payslips:
+            return
+        windows = {payslip: payslip._get_prefetch_window() for payslip in payslips}
+        attendances_by_employee = payslips._search_prefetch_records('hr.attendance', [
+            ('check_in', '>=', min(start for start, _end in windows.values())),
+            ('check_in', '<', max(end for _start, end in windows.values())),
+        ])
+        for payslip, (start, end) in windows.items():
+            payslip.prefetch_attendance_ids = attendances_by_employee[payslip.employee_id.id].filtered(
+                lambda attendance: start <= attendance.check_in < end)
+
+    @api.depends('employee_id', 'date_from', 'date_to')
+    def _compute_prefetch_leave_ids(self):
+        payslips = self._filter_prefetchable()
+        (self - payslips).prefetch_leave_ids = False
+        if not payslips:
+            return
+        periods = {payslip: payslip._get_prefetch_dates() for payslip in payslips}
+        leaves_by_employee = payslips._search_prefetch_records('hr.leave', [
+            ('state', '=', 'validate'),
+            ('request_date_from', '<=', max(date_to for _date_from, date_to in periods.values())),
+            ('request_date_to', '>=', min(date_from for date_from, _date_to in periods.values())),
+        ])
+        for payslip, (date_from, date_to) in periods.items():
+            payslip.prefetch_leave_ids = leaves_by_employee[payslip.employee_id.id].filtered(
+                lambda leave: leave.request_date_from <= date_to and leave.request_date_to >= date_from)
+
+    def _can_use_prefetch(self, employee, date_from, date_to):
+        """Dữ liệu prefetch của phiếu lương có phủ ``employee`` từ ngày đến ngày không"""
+        if len(self) != 1 or self.employee_id != employee or not self.date_from or not self.date_to:
+            return False
+        prefetch_from, prefetch_to = self._get_prefetch_dates()
+        return prefetch_from <= date_from and date_to <= prefetch_to
+
+    def _get_prefetched_attendances(self, employee, start, end):
+        """Chấm công của ``employee`` có giờ vào trong [start, end] (UTC không múi giờ)
+
+        Lấy từ dữ liệu prefetch của phiếu lương khi được, nếu không thì tìm
+        trực tiếp.
+        """
+        if self._can_use_prefetch(employee, start.date(), end.date()):
+            return self.prefetch_attendance_ids.filtered(lambda attendance: start <= attendance.check_in <= end)
+        return self.env['hr.attendance'].search([
+            ('employee_id', '=', employee.id),
+            ('check_in', '>=', start),
+            ('check_in', '<=', end),
+        ])
+
+    def _get_prefetched_leaves(self, employee, date_from, date_to):
+        """Nghỉ phép đã duyệt của ``employee`` giao với khoảng ngày [date_from, date_to]
+
+        Lấy từ dữ liệu prefetch của phiếu lương khi được, nếu không thì tìm
+        trực tiếp.
+        """
+        if self._can_use_prefetch(employee, date_from, date_to):
+            return self.prefetch_leave_ids.filtered(
+                lambda leave: leave.request_date_from <= date_to and leave.request_date_to >= date_from)
+        return self.env['hr.leave'].search([
+            ('employee_id', '=', employee.id),
+            ('state', '=', 'validate'),
+            ('request_date_from', '<=', date_to),
+            ('request_date_to', '>=', date_from),
+        ])
@@ -11,7 +11,7 @@
     'category': 'Human Resources/Payroll',
     'author': 'Wokwy + suppoert by Claude.ai',
     'website': 'https://www.c2bgroup.net',
-    'depends': ['hr', 'payroll'],
+    'depends': ['hr', 'payroll', 'hr_payslip_prefetch', 'hr_xlsx_export'],
     'data': [
         'security/ir.model.access.csv',
         'views/allowance_type_views.xml',
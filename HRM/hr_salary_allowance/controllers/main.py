@@ -1,7 +1,5 @@
 from odoo import http
 from odoo.http import request
-import io
-import xlsxwriter
 from datetime import datetime
 import logging
 
@@ -20,39 +18,34 @@ class EmployeeAllowanceReportController(http.Controller):
                 return request.not_found("Wizard không tồn tại")
 
             data = wizard._prepare_report_data()
+            filename = f"BaoCaoPhiCap_{data['date_from'].strftime('%d%m%Y')}_{data['date_to'].strftime('%d%m%Y')}.xlsx"
 
-            # Tạo file Excel
-            output = io.BytesIO()
-            workbook = xlsxwriter.Workbook(output, {
-                'in_memory': True,
+            # Tạo file Excel ở chế độ constant_memory và lưu thẳng vào filestore
+            Export = request.env['hr.xlsx.export']
+            with Export._open_workbook(options={
                 'default_date_format': 'dd/mm/yyyy',
                 'remove_timezone': True
-            })
-            worksheet = workbook.add_worksheet('BaoCaoPhiCap')
+            }) as (workbook, output):
+                worksheet = workbook.add_worksheet('BaoCaoPhiCap')
 
-            # Định dạng cells
-            formats = self._create_excel_formats(workbook)
+                # Định dạng cells
+                formats = self._create_excel_formats(workbook)
 
-            # Viết nội dung
-            self._write_excel_content(worksheet, data, formats)
+                # Thiết lập worksheet, trước khi ghi dòng vì chiều cao dòng
+                # phải có trước khi dòng được ghi ra file
+                self._setup_worksheet(worksheet, data, formats)
 
-            # Thiết lập worksheet
-            self._setup_worksheet(worksheet, data, formats)
+                # Viết nội dung
+                self._write_excel_content(worksheet, data, formats)
 
-            workbook.close()
-            output.seek(0)
-
-            # Tạo response với filename
-            filename = f"BaoCaoPhiCap_{data['date_from'].strftime('%d%m%Y')}_{data['date_to'].strftime('%d%m%Y')}.xlsx"
+                attachment = Export._save_attachment(workbook, output, {
+                    'name': filename,
+                    'res_model': wizard._name,
+                    'res_id': wizard.id,
+                })
 
-            return request.make_response(
-                output.getvalue(),
-                headers=[
-                    ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
-                    ('Content-Disposition', f'attachment; filename="{filename}"'),
-                    ('Content-Length', len(output.getvalue()))
-                ]
-            )
+            # Tải file từ filestore
+            return request.redirect(f'/web/content/{attachment.id}?download=true')
 
         except Exception as e:
             _logger.error(f"Error exporting allowance report: {e}", exc_info=True)
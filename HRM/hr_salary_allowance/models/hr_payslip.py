@@ -5,6 +5,32 @@ from .allowance_browsable import AllowanceBrowsableObject
 class HrPayslip(models.Model):
     _inherit = 'hr.payslip'
 
+    prefetch_allowance_ids = fields.Many2many(
+        'salary.allowance',
+        string='Prefetched Allowances',
+        compute='_compute_prefetch_allowance_ids',
+        help='Phụ cấp đã xác nhận của nhân viên trong kỳ lương, '
+             'được tính cùng lúc cho tất cả phiếu lương của lô'
+    )
+
+    @api.depends('employee_id', 'date_from', 'date_to')
+    def _compute_prefetch_allowance_ids(self):
+        payslips = self._filter_prefetchable()
+        (self - payslips).prefetch_allowance_ids = False
+        if not payslips:
+            return
+        allowances_by_employee = payslips._search_prefetch_records('salary.allowance', [
+            ('state', '=', 'confirmed'),
+            ('start_date', '<=', max(payslips.mapped('date_to'))),
+            '|',
+            ('end_date', '>=', min(payslips.mapped('date_from'))),
+            ('end_date', '=', False)
+        ])
+        for payslip in payslips:
+            payslip.prefetch_allowance_ids = allowances_by_employee[payslip.employee_id.id].filtered(
+                lambda allowance: allowance.start_date <= payslip.date_to
+                and (not allowance.end_date or allowance.end_date >= payslip.date_from))
+
     def _get_baselocaldict(self, contracts):
         """Mở rộng dict cơ bản để thêm đối tượng allowances"""
         # Gọi phương thức gốc để lấy localdict
@@ -28,17 +54,8 @@ class HrPayslip(models.Model):
         self.ensure_one()
         result = {}
 
-        # Tìm các phụ cấp lương trong kỳ lương
-        domain = [
-            ('employee_id', '=', self.employee_id.id),
-            ('state', '=', 'confirmed'),
-            ('start_date', '<=', self.date_to),
-            '|',
-            ('end_date', '>=', self.date_from),
-            ('end_date', '=', False)
-        ]
-
-        allowances = self.env['salary.allowance'].search(domain)
+        # Các phụ cấp lương trong kỳ lương, prefetch cho cả lô phiếu lương
+        allowances = self.prefetch_allowance_ids
 
         for allowance in allowances:
             code = allowance.allowance_type_id.code
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'HR Work Schedule Cache',
+    'version': '17.0.1.0.0',
+    'category': 'Human Resources',
+    'summary': 'Shared, memoized work intervals of resource calendars',
+    'description': """
+HR Work Schedule Cache
+======================
+
+Overtime, late/early, payslip work days and attendance reports all need the
+work intervals of a working schedule for the days they process. This module
+expands a calendar once per month and timezone, caches the result per worker
+and serves the intervals of any number of days from it. Leaves of an
+employee are read on each call and deducted from the cached intervals.
+
+The cache is cleared when the schedule fields of a working schedule, its
+working hours or a public holiday change. Validating an employee leave does
+not clear it.
+    """,
+    'author': 'Wokwy (quochuy.software@gmail.com)',
+    'website': 'https://www.c2bgroup.net',
+    'license': 'LGPL-3',
+    'depends': [
+        'resource',
+    ],
+    'data': [
+    ],
+    'external_dependencies': {
+        'python': ['pytz'],
+    },
+    'installable': True,
+    'auto_install': False,
+    'application': False,
+}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import pytz
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, models, tools
+
+# Fields of working schedules feeding the cached work intervals
+CALENDAR_SCHEDULE_FIELDS = {'attendance_ids', 'leave_ids', 'global_leave_ids', 'tz', 'two_weeks_calendar'}
+
+# Fields of working hours feeding the cached work intervals
+ATTENDANCE_SCHEDULE_FIELDS = {
+    'calendar_id', 'dayofweek', 'hour_from', 'hour_to', 'date_from', 'date_to',
+    'week_type', 'display_type', 'resource_id',
+}
+
+# Fields of public holidays feeding the cached work intervals
+LEAVE_SCHEDULE_FIELDS = {'calendar_id', 'date_from', 'date_to', 'resource_id', 'time_type'}
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    def _get_work_intervals_by_day(self, dates, day_tz='UTC', resource=None):
+        """Return {date: ((start, stop), ...)} with the work intervals of each date
+
+        Intervals are aware UTC datetimes clipped to the day, days running from
+        midnight to midnight in ``day_tz``. Public holidays are deducted, and
+        the leaves of ``resource`` too when given.
+
+        The calendar is expanded once per month and cached per (calendar,
+        month, day_tz, timezone), so asking for the days of a whole payslip
+        batch reuses one expansion per schedule and month. Leaves of the
+        resource are not cached, they are read with one query per call so
+        that validating a leave does not clear the cache.
+        """
+        self.ensure_one()
+        if not dates:
+            return {}
+        tz_name = (resource.tz if resource else False) or self.tz or 'UTC'
+        dates_by_month = defaultdict(list)
+        for day in dates:
+            dates_by_month[(day.year, day.month)].append(day)
+        intervals_by_day = {}
+        for (year, month), month_dates in dates_by_month.items():
+            month_intervals = self._get_month_work_intervals(year, month, day_tz, tz_name)
+            for day in month_dates:
+                intervals_by_day[day] = month_intervals.get(day, ())
+
+        if resource:
+            day_tz_info = pytz.timezone(day_tz or 'UTC')
+            leaves = self._leave_intervals_batch(
+                day_tz_info.localize(datetime.combine(min(dates), time.min)),
+                day_tz_info.localize(datetime.combine(max(dates) + timedelta(days=1), time.min)),
+                resources=resource,
+                domain=[('time_type', '=', 'leave'), ('resource_id', '=', resource.id)],
+            )[resource.id]
+            leaves = [(start.astimezone(pytz.UTC), stop.astimezone(pytz.UTC)) for start, stop, _meta in leaves]
+            if leaves:
+                intervals_by_day = {
+                    day: self._subtract_intervals(intervals, leaves)
+                    for day, intervals in intervals_by_day.items()
+                }
+        return intervals_by_day
+
+    @api.model
+    def _subtract_intervals(self, intervals, leaves):
+        """Return ``intervals`` minus the parts covered by ``leaves``, both lists of (start, stop)"""
+        result = []
+        for start, stop in intervals:
+            pieces = [(start, stop)]
+            for leave_start, leave_stop in leaves:
+                remaining = []
+                for piece_start, piece_stop in pieces:
+                    if leave_stop <= piece_start or leave_start >= piece_stop:
+                        remaining.append((piece_start, piece_stop))
+                        continue
+                    if piece_start < leave_start:
+                        remaining.append((piece_start, leave_start))
+                    if leave_stop < piece_stop:
+                        remaining.append((leave_stop, piece_stop))
+                pieces = remaining
+            result.extend(pieces)
+        return tuple(result)
+
+    def _get_scheduled_hours_by_day(self, dates, day_tz='UTC', resource=None):
+        """Return {date: scheduled work hours} of each date, see _get_work_intervals_by_day"""
+        return {
+            day: sum((stop - start).total_seconds() / 3600.0 for start, stop in intervals)
+            for day, intervals in self._get_work_intervals_by_day(dates, day_tz, resource).items()
+        }
+
+    @tools.ormcache('self.id', 'year', 'month', 'day_tz', 'tz_name')
+    def _get_month_work_intervals(self, year, month, day_tz, tz_name):
+        """Expand the calendar over one month and split its work intervals per day
+
+        Working hours are read in ``tz_name``, only public holidays are
+        deducted. The result is shared between callers, do not modify it.
+        """
+        tz = pytz.timezone(day_tz or 'UTC')
+        first_day = date(year, month, 1)
+        month_start = tz.localize(datetime.combine(first_day, time.min))
+        month_end = tz.localize(datetime.combine(first_day + relativedelta(months=1), time.min))
+        intervals = self._work_intervals_batch(month_start, month_end, tz=pytz.timezone(tz_name))[False]
+
+        intervals_by_day = defaultdict(list)
+        for start, stop, _meta in intervals:
+            start = start.astimezone(pytz.UTC)
+            stop = stop.astimezone(pytz.UTC)
+            day = start.astimezone(tz).date()
+            while True:
+                day_start = tz.localize(datetime.combine(day, time.min)).astimezone(pytz.UTC)
+                day_end = tz.localize(datetime.combine(day + timedelta(days=1), time.min)).astimezone(pytz.UTC)
+                if day_start >= stop:
+                    break
+                if day_end > start:
+                    intervals_by_day[day].append((max(start, day_start), min(stop, day_end)))
+                day += timedelta(days=1)
+        return {day: tuple(day_intervals) for day, day_intervals in intervals_by_day.items()}
+
+    def write(self, vals):
+        res = super().write(vals)
+        if CALENDAR_SCHEDULE_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+
+class ResourceCalendarAttendance(models.Model):
+    _inherit = 'resource.calendar.attendance'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        attendances = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return attendances
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ATTENDANCE_SCHEDULE_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    # Only public holidays (leaves without resource) are cached, leaves of
+    # employees are read on every call
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leaves = super().create(vals_list)
+        if any(not leave.resource_id for leave in leaves):
+            self.env.registry.clear_cache()
+        return leaves
+
+    def write(self, vals):
+        was_public = any(not leave.resource_id for leave in self)
+        res = super().write(vals)
+        if LEAVE_SCHEDULE_FIELDS.intersection(vals) and (
+                was_public or any(not leave.resource_id for leave in self)):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        public = any(not leave.resource_id for leave in self)
+        res = super().unlink()
+        if public:
+            self.env.registry.clear_cache()
+        return res
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'HR Streaming XLSX Export',
+    'version': '17.0.1.0.0',
+    'category': 'Human Resources',
+    'summary': 'Shared constant-memory Excel export engine writing to filestore attachments',
+    'description': """
+HR Streaming XLSX Export
+========================
+
+Payroll, bank transfer, loan and allowance exports used to build the whole
+workbook in a BytesIO and then base64-encode it into a binary field, holding
+about three copies of the file in memory at once.
+
+This module provides the shared export engine used by those reports:
+
+* Workbooks are written by xlsxwriter in constant_memory mode to a
+  temporary file, rows are flushed to disk as they are written
+* Records are read in chunks, the ORM cache being released after each chunk
+* The temporary file is copied to the filestore by chunks and attached to
+  an ir.attachment (or to an attachment binary field), downloads are then
+  streamed from the filestore by /web/content
+    """,
+    'author': 'Wokwy (quochuy.software@gmail.com)',
+    'website': 'https://www.c2bgroup.net',
+    'license': 'LGPL-3',
+    'depends': [
+        'base',
+    ],
+    'data': [
+    ],
+    'installable': True,
+    'auto_install': False,
+    'application': False,
+    'external_dependencies': {
+        'python': ['xlsxwriter'],
+    },
+}
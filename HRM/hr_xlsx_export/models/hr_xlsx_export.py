@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from odoo import api, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import xlsxwriter
+except ImportError:
+    _logger.warning("Thư viện xlsxwriter không được cài đặt!")
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Số bản ghi đọc mỗi lô khi duyệt dữ liệu xuất báo cáo
+EXPORT_CHUNK_SIZE = 1000
+
+# Kích thước mỗi lần đọc file tạm khi tính checksum và chép vào filestore
+FILE_CHUNK_SIZE = 1024 * 1024
+
+
+class HrXlsxExport(models.AbstractModel):
+    _name = 'hr.xlsx.export'
+    _description = 'Streaming XLSX Export'
+
+    @api.model
+    @contextmanager
+    def _open_workbook(self, constant_memory=True, options=None):
+        """Mở một workbook xlsxwriter ghi ra file tạm, trả về (workbook, file tạm)
+
+        Ở chế độ constant_memory mỗi dòng được ghi ra đĩa khi chuyển sang
+        dòng sau, nên các dòng phải được ghi theo thứ tự và không thể gộp ô
+        trên nhiều dòng. File tạm bị xóa khi thoát khối ``with``.
+        """
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, dict(options or {}, constant_memory=constant_memory))
+            try:
+                yield workbook, output
+            finally:
+                if not workbook.fileclosed:
+                    workbook.close()
+
+    @api.model
+    def _iter_records(self, records, chunk_size=EXPORT_CHUNK_SIZE):
+        """Duyệt ``records`` theo lô ``chunk_size`` bản ghi
+
+        Mỗi lô được prefetch riêng và bộ nhớ đệm của ORM được giải phóng sau
+        mỗi lô, nên bộ nhớ dùng không tăng theo số bản ghi.
+        """
+        for ids in split_every(chunk_size, records.ids):
+            yield from records.browse(ids)
+            self.env.invalidate_all()
+
+    @api.model
+    def _save_attachment(self, workbook, output, vals):
+        """Đóng workbook và lưu file tạm vào một ir.attachment tạo với ``vals``
+
+        File được chép vào filestore theo từng đoạn, không đọc toàn bộ vào bộ
+        nhớ. Khi attachment không lưu trên filestore (ir_attachment.location
+        là db), nội dung file được truyền qua 'raw'.
+        """
+        if not workbook.fileclosed:
+            workbook.close()
+        Attachment = self.env['ir.attachment']
+        vals = dict(vals, type='binary', mimetype=XLSX_MIMETYPE)
+        output.seek(0)
+        if Attachment._storage() != 'file':
+            return Attachment.create(dict(vals, raw=output.read()))
+
+        sha = hashlib.sha1()
+        file_size = 0
+        for chunk in iter(lambda: output.read(FILE_CHUNK_SIZE), b''):
+            sha.update(chunk)
+            file_size += len(chunk)
+        checksum = sha.hexdigest()
+
+        fname = checksum[:2] + '/' + checksum
+        full_path = Attachment._full_path(fname)
+        if not os.path.isfile(full_path):
+            # Chưa có file cùng checksum, _get_path chỉ tạo thư mục chứa
+            fname, full_path = Attachment._get_path(b'', checksum)
+        if not os.path.isfile(full_path):
+            output.seek(0)
+            with open(full_path, 'wb') as fp:
+                shutil.copyfileobj(output, fp, FILE_CHUNK_SIZE)
+            # Để dọn file nếu giao dịch bị hủy
+            Attachment._mark_for_gc(fname)
+
+        attachment = Attachment.create(vals)
+        # create() bỏ qua store_fname, checksum và file_size, ghi trực tiếp
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, checksum = %s, file_size = %s
+             WHERE id = %s
+        """, (fname, checksum, file_size, attachment.id))
+        attachment.invalidate_recordset()
+        return attachment
+
+    @api.model
+    def _save_to_field(self, record, fname, workbook, output, filename):
+        """Lưu workbook vào trường Binary ``fname`` (attachment=True) của ``record``
+
+        Tải về qua trường này được đọc thẳng từ filestore.
+        """
+        record.ensure_one()
+        # Xóa attachment cũ của trường
+        record.write({fname: False})
+        attachment = self._save_attachment(workbook, output, {
+            'name': filename,
+            'res_model': record._name,
+            'res_id': record.id,
+            'res_field': fname,
+        })
+        record.invalidate_recordset([fname])
+        return attachment
+
+    @api.model
+    def _action_download(self, attachment):
+        """Action tải file của attachment"""
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
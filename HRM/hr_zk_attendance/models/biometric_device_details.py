@@ -21,6 +21,8 @@
 ################################################################################
 import datetime
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pytz
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError, ValidationError
@@ -32,6 +34,27 @@ except ImportError:
     _logger.error("Please Install pyzk library.")
 
 
+def _fetch_device_data(device_ip, port, timeout, device_time=None):
+    """Connect to a device and return its (users, attendance) lists.
+
+    Runs in the worker threads of the download cron, so it must not use the
+    environment or the database cursor.
+    """
+    zk = ZK(device_ip, port=port, timeout=timeout, password=0,
+            force_udp=False, ommit_ping=False)
+    conn = zk.connect()
+    try:
+        if device_time:
+            conn.set_time(device_time)
+        conn.disable_device()  # Device Cannot be used during this time.
+        try:
+            return conn.get_users(), conn.get_attendance()
+        finally:
+            conn.enable_device()
+    finally:
+        conn.disconnect()
+
+
 class BiometricDeviceDetails(models.Model):
     """Model for configuring and connect the biometric device with odoo"""
     _name = 'biometric.device.details'
@@ -48,6 +71,12 @@ class BiometricDeviceDetails(models.Model):
                                  default=lambda
                                      self: self.env.user.company_id.id,
                                  help='Current Company')
+    last_punch_time = fields.Datetime(string='Last Downloaded Punch',
+                                      readonly=True, copy=False,
+                                      help='Punching time of the latest record'
+                                           ' downloaded from the device, older'
+                                           ' records are skipped on the next'
+                                           ' download')
 
     def device_connect(self, zk):
         """Function for connecting the device with Odoo"""
@@ -149,108 +178,200 @@ class BiometricDeviceDetails(models.Model):
     @api.model
     def cron_download(self):
         machines = self.env['biometric.device.details'].search([])
-        for machine in machines:
-            machine.action_download_attendance()
+        machines._download_attendance_parallel()
+
+    def _get_device_time(self):
+        """Current time in the user's timezone, to be set on the devices"""
+        user_tz = self.env.context.get('tz') or self.env.user.tz or 'UTC'
+        user_timezone_time = pytz.utc.localize(fields.Datetime.now())
+        return user_timezone_time.astimezone(pytz.timezone(user_tz))
+
+    def _download_attendance_parallel(self):
+        """Download attendance from all devices concurrently.
+
+        Devices are polled by a thread pool, so the run takes as long as the
+        slowest device instead of the sum of all of them. Fetched punches are
+        written by the cron's own thread, one device at a time, as soon as
+        each download completes. The per-device socket timeout and the
+        number of concurrent downloads are read from the
+        hr_zk_attendance.download_timeout and
+        hr_zk_attendance.download_workers system parameters.
+        """
+        if not self:
+            return
+        params = self.env['ir.config_parameter'].sudo()
+        timeout = int(params.get_param('hr_zk_attendance.download_timeout', 15))
+        max_workers = int(params.get_param('hr_zk_attendance.download_workers', 8))
+        device_time = self._get_device_time()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self))),
+                                thread_name_prefix='zk_download') as executor:
+            futures = {
+                executor.submit(_fetch_device_data, info.device_ip,
+                                info.port_number, timeout, device_time): info
+                for info in self
+            }
+            for future in as_completed(futures):
+                info = futures[future]
+                try:
+                    users, attendance = future.result()
+                except Exception as error:
+                    _logger.warning("Unable to download attendance from %s "
+                                    "(%s:%s): %s", info.name, info.device_ip,
+                                    info.port_number, error)
+                    continue
+                if not attendance:
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        count = info._process_attendance(users, attendance)
+                    _logger.info("Stored %s new punches from %s", count,
+                                 info.name)
+                except Exception as error:
+                    _logger.error("Unable to store attendance from %s: %s",
+                                  info.name, error)
 
     def action_download_attendance(self):
         """Function to download attendance records from the device"""
         _logger.info("++++++++++++Cron Executed++++++++++++++++++++++")
-        zk_attendance = self.env['zk.machine.attendance']
-        hr_attendance = self.env['hr.attendance']
         for info in self:
-            machine_ip = info.device_ip
-            zk_port = info.port_number
             try:
                 # Connecting with the device with the ip and port provided
-                zk = ZK(machine_ip, port=zk_port, timeout=15,
-                        password=0,
-                        force_udp=False, ommit_ping=False)
+                user, attendance = _fetch_device_data(
+                    info.device_ip, info.port_number, 15,
+                    info._get_device_time())
             except NameError:
                 raise UserError(
                     _("Pyzk module not Found. Please install it"
                       "with 'pip3 install pyzk'."))
-            conn = self.device_connect(zk)
-            self.action_set_timezone()
-            if conn:
-                conn.disable_device()  # Device Cannot be used during this time.
-                user = conn.get_users()
-                attendance = conn.get_attendance()
-                if attendance:
-                    for each in attendance:
-                        atten_time = each.timestamp
-                        local_tz = pytz.timezone(
-                            self.env.user.partner_id.tz or 'GMT')
-                        local_dt = local_tz.localize(atten_time, is_dst=None)
-                        utc_dt = local_dt.astimezone(pytz.utc)
-                        utc_dt = utc_dt.strftime("%Y-%m-%d %H:%M:%S")
-                        atten_time = datetime.datetime.strptime(
-                            utc_dt, "%Y-%m-%d %H:%M:%S")
-                        atten_time = fields.Datetime.to_string(atten_time)
-                        for uid in user:
-                            if uid.user_id == each.user_id:
-                                get_user_id = self.env['hr.employee'].search(
-                                    [('device_id_num', '=', each.user_id)])
-                                if get_user_id:
-                                    duplicate_atten_ids = zk_attendance.search(
-                                        [('device_id_num', '=', each.user_id),
-                                         ('punching_time', '=', atten_time)])
-                                    if not duplicate_atten_ids:
-                                        zk_attendance.create({
-                                            'employee_id': get_user_id.id,
-                                            'device_id_num': each.user_id,
-                                            'attendance_type': str(each.status),
-                                            'punch_type': str(each.punch),
-                                            'punching_time': atten_time,
-                                            'address_id': info.address_id.id
-                                        })
-                                        att_var = hr_attendance.search([(
-                                            'employee_id', '=', get_user_id.id),
-                                            ('check_out', '=', False)])
-                                        if each.punch == 0:  # check-in
-                                            if not att_var:
-                                                hr_attendance.create({
-                                                    'employee_id':
-                                                        get_user_id.id,
-                                                    'check_in': atten_time
-                                                })
-                                        if each.punch == 1:  # check-out
-                                            if len(att_var) == 1:
-                                                att_var.write({
-                                                    'check_out': atten_time
-                                                })
-                                            else:
-                                                att_var1 = hr_attendance.search(
-                                                    [('employee_id', '=',
-                                                      get_user_id.id)])
-                                                if att_var1:
-                                                    att_var1[-1].write({
-                                                        'check_out': atten_time
-                                                    })
-                                else:
-                                    employee = self.env['hr.employee'].create({
-                                        'device_id_num': each.user_id,
-                                        'name': uid.name
-                                    })
-                                    zk_attendance.create({
-                                        'employee_id': employee.id,
-                                        'device_id_num': each.user_id,
-                                        'attendance_type': str(each.status),
-                                        'punch_type': str(each.punch),
-                                        'punching_time': atten_time,
-                                        'address_id': info.address_id.id
-                                    })
-                                    hr_attendance.create({
-                                        'employee_id': employee.id,
-                                        'check_in': atten_time
-                                    })
-                    conn.disconnect
-                    return True
-                else:
-                    raise UserError(_('Unable to get the attendance log, please'
-                                      'try again later.'))
-            else:
+            except Exception:
                 raise UserError(_('Unable to connect, please check the'
                                   'parameters and network connections.'))
+            if attendance:
+                info._process_attendance(user, attendance)
+            else:
+                raise UserError(_('Unable to get the attendance log, please'
+                                  'try again later.'))
+        return True
+
+    def _process_attendance(self, users, attendance):
+        """Store the punches downloaded from the device
+
+        Punches older than the last downloaded one are skipped. Device users,
+        employees, already stored punches and open attendances are all
+        indexed up front with one query each, then new punches are created
+        in batches.
+
+        :param users: users returned by the device
+        :param attendance: attendance records returned by the device
+        :return: number of new punches stored
+        """
+        self.ensure_one()
+        zk_attendance = self.env['zk.machine.attendance']
+        hr_attendance = self.env['hr.attendance']
+        local_tz = pytz.timezone(self.env.user.partner_id.tz or 'GMT')
+        users_by_id = {uid.user_id: uid for uid in users}
+
+        punches = []
+        for each in attendance:
+            if each.user_id not in users_by_id:
+                continue
+            local_dt = local_tz.localize(each.timestamp, is_dst=None)
+            atten_time = local_dt.astimezone(pytz.utc).replace(
+                tzinfo=None, microsecond=0)
+            if self.last_punch_time and atten_time < self.last_punch_time:
+                continue
+            punches.append((atten_time, each))
+        if not punches:
+            return 0
+        punches.sort(key=lambda punch: punch[0])
+
+        # Employees by device ID, creating the ones the device knows about
+        device_ids = list({each.user_id for atten_time, each in punches})
+        employee_by_device = {}
+        for employee in self.env['hr.employee'].search(
+                [('device_id_num', 'in', device_ids)]):
+            employee_by_device.setdefault(employee.device_id_num, employee)
+        missing_ids = [device_id for device_id in device_ids
+                       if device_id not in employee_by_device]
+        new_employees = self.env['hr.employee'].create([{
+            'device_id_num': device_id,
+            'name': users_by_id[device_id].name
+        } for device_id in missing_ids])
+        employee_by_device.update(zip(missing_ids, new_employees))
+        employee_ids = [employee.id for employee in
+                        employee_by_device.values()]
+
+        # Punches already stored in the downloaded range
+        stored = {(rec['device_id_num'], rec['punching_time'])
+                  for rec in zk_attendance.search_read([
+                      ('device_id_num', 'in', device_ids),
+                      ('punching_time', '>=', punches[0][0]),
+                      ('punching_time', '<=', punches[-1][0])],
+                      ['device_id_num', 'punching_time'])}
+
+        # Open and latest attendance of every employee involved
+        open_by_employee = defaultdict(list)
+        for att in hr_attendance.search([('employee_id', 'in', employee_ids),
+                                         ('check_out', '=', False)]):
+            open_by_employee[att.employee_id.id].append(att)
+        hr_attendance.flush_model(['employee_id', 'check_in'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (employee_id) employee_id, id
+              FROM hr_attendance
+             WHERE employee_id = ANY(%s)
+          ORDER BY employee_id, check_in DESC
+        """, (employee_ids,))
+        latest_by_employee = {employee_id: hr_attendance.browse(att_id)
+                              for employee_id, att_id in self.env.cr.fetchall()}
+
+        # Replay punches in time order against the in-memory state. New
+        # attendances are dicts until they are created in one batch.
+        zk_vals = []
+        attendance_vals = []
+        check_outs = {}
+        first_punch_pending = {employee.id for employee in new_employees}
+        for atten_time, each in punches:
+            if (each.user_id, atten_time) in stored:
+                continue
+            stored.add((each.user_id, atten_time))
+            employee_id = employee_by_device[each.user_id].id
+            zk_vals.append({
+                'employee_id': employee_id,
+                'device_id_num': each.user_id,
+                'attendance_type': str(each.status),
+                'punch_type': str(each.punch),
+                'punching_time': atten_time,
+                'address_id': self.address_id.id
+            })
+            open_atts = open_by_employee[employee_id]
+            if employee_id in first_punch_pending or (
+                    each.punch == 0 and not open_atts):  # check-in
+                first_punch_pending.discard(employee_id)
+                vals = {'employee_id': employee_id, 'check_in': atten_time}
+                attendance_vals.append(vals)
+                open_atts.append(vals)
+                latest_by_employee[employee_id] = vals
+            elif each.punch == 1:  # check-out
+                if len(open_atts) == 1:
+                    target = open_atts.pop()
+                else:
+                    target = latest_by_employee.get(employee_id)
+                if isinstance(target, dict):
+                    target['check_out'] = atten_time
+                elif target:
+                    check_outs[target] = atten_time
+
+        zk_attendance.create(zk_vals)
+        # Close the existing attendances first: hr.attendance refuses a new
+        # check-in while the employee still has an open attendance
+        atts_by_check_out = defaultdict(lambda: hr_attendance)
+        for att, check_out in check_outs.items():
+            atts_by_check_out[check_out] |= att
+        for check_out, atts in atts_by_check_out.items():
+            atts.write({'check_out': check_out})
+        hr_attendance.create(attendance_vals)
+        self.last_punch_time = punches[-1][0]
+        return len(zk_vals)
 
     def action_restart_device(self):
         """For restarting the device"""
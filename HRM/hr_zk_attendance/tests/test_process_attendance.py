@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from types import SimpleNamespace
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestProcessAttendance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Punch times are read in the user timezone, keep them in UTC
+        cls.env.user.partner_id.tz = 'UTC'
+        cls.device = cls.env['biometric.device.details'].create({
+            'name': 'Test Device',
+            'device_ip': '127.0.0.1',
+            'port_number': 4370,
+        })
+        cls.employee = cls.env['hr.employee'].create({
+            'name': 'Test Employee',
+            'device_id_num': '42',
+        })
+        cls.users = [SimpleNamespace(user_id='42', name='Test Employee')]
+
+    def _punch(self, timestamp, punch):
+        return SimpleNamespace(user_id='42', timestamp=timestamp, status=1, punch=punch)
+
+    def test_check_out_then_check_in_again(self):
+        """The check-out of an open attendance and a new check-in in the same download"""
+        open_attendance = self.env['hr.attendance'].create({
+            'employee_id': self.employee.id,
+            'check_in': datetime(2024, 5, 6, 8, 0),
+        })
+
+        count = self.device._process_attendance(self.users, [
+            self._punch(datetime(2024, 5, 6, 17, 0), 1),
+            self._punch(datetime(2024, 5, 7, 8, 0), 0),
+        ])
+
+        self.assertEqual(count, 2)
+        self.assertEqual(open_attendance.check_out, datetime(2024, 5, 6, 17, 0))
+        attendances = self.env['hr.attendance'].search(
+            [('employee_id', '=', self.employee.id)], order='check_in')
+        self.assertEqual(len(attendances), 2)
+        self.assertEqual(attendances[1].check_in, datetime(2024, 5, 7, 8, 0))
+        self.assertFalse(attendances[1].check_out)
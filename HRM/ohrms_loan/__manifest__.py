@@ -11,7 +11,7 @@
     'maintainer': 'Cybrosys Techno Solutions',
     'live_test_url': 'https://youtu.be/lAT5cqVZTZI',
     'website': "https://cybrosys.com, https://www.openhrms.com",
-    'depends': ['hr', 'account', 'payroll'],
+    'depends': ['hr', 'account', 'payroll', 'hr_payslip_prefetch', 'hr_xlsx_export'],
     'data': [
         'security/hr_loan_security.xml',
         'security/ir.model.access.csv',
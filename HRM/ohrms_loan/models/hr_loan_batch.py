@@ -227,12 +227,18 @@ class HrLoanBatch(models.Model):
 
     def _export_batch_excel(self):
         """Xuất Excel cho đợt theo format mẫu"""
-        import xlsxwriter
-        import base64
-        from io import BytesIO
+        filename = f"Danh_sach_ung_luong_{self.name.replace(' ', '_')}_{fields.Date.today().strftime('%Y%m%d')}.xlsx"
+        Export = self.env['hr.xlsx.export']
+        # Tiêu đề gộp ô trên hai dòng nên không dùng được constant_memory,
+        # file vẫn được ghi ra file tạm và lưu thẳng vào filestore
+        with Export._open_workbook(constant_memory=False) as (workbook, output):
+            self._write_batch_excel(workbook)
+            attachment = Export._save_attachment(workbook, output, {'name': filename})
+
+        return Export._action_download(attachment)
 
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    def _write_batch_excel(self, workbook):
+        """Ghi danh sách ứng lương của đợt vào ``workbook``"""
         worksheet = workbook.add_worksheet('Danh sach ung luong')
 
         # Define formats
@@ -334,7 +340,7 @@ class HrLoanBatch(models.Model):
         row = 7  # 0-indexed, so row 8 in Excel
         approved_loans = self.loan_ids.filtered(lambda l: l.state in ['approve', 'waiting_approval_1'])
 
-        for index, loan in enumerate(approved_loans, 1):
+        for index, loan in enumerate(self.env['hr.xlsx.export']._iter_records(approved_loans), 1):
             worksheet.write(row, 0, index, cell_format)
             worksheet.write(row, 1, loan.employee_id.employee_code or '', cell_format)
             worksheet.write(row, 2, loan.employee_id.name or '', cell_format_name)
@@ -365,23 +371,4 @@ class HrLoanBatch(models.Model):
         # Signature section
         worksheet.merge_range(f'A{row + 1}:B{row + 1}', 'Người nhận tiền', signature_format)
         worksheet.merge_range(f'C{row + 1}:D{row + 1}', 'Thủ quỹ', signature_format)
-        worksheet.merge_range(f'E{row + 1}:G{row + 1}', 'Giám đốc', signature_format)
-
-        workbook.close()
-        output.seek(0)
-
-        # Create attachment
-        filename = f"Danh_sach_ung_luong_{self.name.replace(' ', '_')}_{fields.Date.today().strftime('%Y%m%d')}.xlsx"
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'type': 'binary',
-            'datas': base64.b64encode(output.read()),
-            'store_fname': filename,
-            'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        })
-
-        return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content/{attachment.id}?download=true',
-            'target': 'new',
-        }
\ No newline at end of file
+        worksheet.merge_range(f'E{row + 1}:G{row + 1}', 'Giám đốc', signature_format)
\ No newline at end of file
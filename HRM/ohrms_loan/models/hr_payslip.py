@@ -20,7 +20,7 @@
 #    If not, see <http://www.gnu.org/licenses/>.
 #
 #############################################################################
-from odoo import models
+from odoo import api, fields, models
 
 
 class HrPayslip(models.Model):
@@ -28,6 +28,31 @@ class HrPayslip(models.Model):
     additional functionality related to employee loans."""
     _inherit = 'hr.payslip'
 
+    prefetch_loan_line_ids = fields.Many2many(
+        'hr.loan.line', string='Prefetched Loan Installments',
+        compute='_compute_prefetch_loan_line_ids',
+        help='Unpaid installments of approved loans in the payslip period, '
+             'computed at once for every payslip of the batch')
+
+    @api.depends('employee_id', 'date_from', 'date_to')
+    def _compute_prefetch_loan_line_ids(self):
+        """Load the unpaid installments of every payslip employee
+        with one query."""
+        payslips = self._filter_prefetchable()
+        (self - payslips).prefetch_loan_line_ids = False
+        if not payslips:
+            return
+        periods = {payslip: payslip._get_prefetch_dates() for payslip in payslips}
+        loan_lines_by_employee = payslips._search_prefetch_records('hr.loan.line', [
+            ('loan_id.state', '=', 'approve'),
+            ('date', '>=', min(date_from for date_from, _date_to in periods.values())),
+            ('date', '<=', max(date_to for _date_from, date_to in periods.values())),
+            ('paid', '=', False),
+        ], employee_fname='loan_id.employee_id')
+        for payslip, (date_from, date_to) in periods.items():
+            payslip.prefetch_loan_line_ids = loan_lines_by_employee[payslip.employee_id.id].filtered(
+                lambda loan_line: date_from <= loan_line.date <= date_to)
+
     def get_inputs(self, contract_ids, date_from, date_to):
         """Compute additional inputs for the employee payslip,
         considering active loans."""
@@ -36,14 +61,21 @@ class HrPayslip(models.Model):
         employee_id = self.env['hr.contract'].browse(
             contract_ids[0].id).employee_id if contract_ids else self.employee_id
 
-        # Tìm tất cả loan_lines thỏa mãn điều kiện
-        loan_lines = self.env['hr.loan.line'].search([
-            ('loan_id.employee_id', '=', employee_id.id),
-            ('loan_id.state', '=', 'approve'),
-            ('date', '>=', date_from),
-            ('date', '<=', date_to),
-            ('paid', '=', False)
-        ])
+        # Tìm tất cả loan_lines thỏa mãn điều kiện, từ dữ liệu prefetch
+        # của cả lô phiếu lương khi được
+        date_from = fields.Date.to_date(date_from)
+        date_to = fields.Date.to_date(date_to)
+        if self._can_use_prefetch(employee_id, date_from, date_to):
+            loan_lines = self.prefetch_loan_line_ids.filtered(
+                lambda loan_line: date_from <= loan_line.date <= date_to)
+        else:
+            loan_lines = self.env['hr.loan.line'].search([
+                ('loan_id.employee_id', '=', employee_id.id),
+                ('loan_id.state', '=', 'approve'),
+                ('date', '>=', date_from),
+                ('date', '<=', date_to),
+                ('paid', '=', False)
+            ])
 
         if loan_lines:
             # Tính tổng amount
@@ -11,7 +11,7 @@
     ''',
     'author': 'Wokwy + suppoert by Claude.ai',
     'website': 'https://www.c2bgroup.net',
-    'depends': ['hr', 'payroll'],
+    'depends': ['hr', 'payroll', 'hr_payslip_prefetch'],
     'data': [
         'security/ir.model.access.csv',
         'views/salary_contribution_views.xml',
@@ -5,6 +5,32 @@ from .contribution_browsable import ContributionBrowsableObject
 class HrPayslip(models.Model):
     _inherit = 'hr.payslip'
 
+    prefetch_contribution_ids = fields.Many2many(
+        'salary.contribution',
+        string='Prefetched Contributions',
+        compute='_compute_prefetch_contribution_ids',
+        help='Đóng góp đã xác nhận của nhân viên trong kỳ lương, '
+             'được tính cùng lúc cho tất cả phiếu lương của lô'
+    )
+
+    @api.depends('employee_id', 'date_from', 'date_to')
+    def _compute_prefetch_contribution_ids(self):
+        payslips = self._filter_prefetchable()
+        (self - payslips).prefetch_contribution_ids = False
+        if not payslips:
+            return
+        contributions_by_employee = payslips._search_prefetch_records('salary.contribution', [
+            ('state', '=', 'confirmed'),
+            ('start_date', '<=', max(payslips.mapped('date_to'))),
+            '|',
+            ('end_date', '>=', min(payslips.mapped('date_from'))),
+            ('end_date', '=', False)
+        ])
+        for payslip in payslips:
+            payslip.prefetch_contribution_ids = contributions_by_employee[payslip.employee_id.id].filtered(
+                lambda contribution: contribution.start_date <= payslip.date_to
+                and (not contribution.end_date or contribution.end_date >= payslip.date_from))
+
     def _get_baselocaldict(self, contracts):
         """Mở rộng dict cơ bản để thêm đối tượng contributions"""
         # Gọi phương thức gốc để lấy localdict
@@ -28,17 +54,8 @@ class HrPayslip(models.Model):
         self.ensure_one()
         result = {}
 
-        # Tìm các đóng góp lương trong kỳ lương
-        domain = [
-            ('employee_id', '=', self.employee_id.id),
-            ('state', '=', 'confirmed'),
-            ('start_date', '<=', self.date_to),
-            '|',
-            ('end_date', '>=', self.date_from),
-            ('end_date', '=', False)
-        ]
-
-        contributions = self.env['salary.contribution'].search(domain)
+        # Các đóng góp lương trong kỳ lương, prefetch cho cả lô phiếu lương
+        contributions = self.prefetch_contribution_ids
 
         for contribution in contributions:
             code = contribution.contribution_type_id.code
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'ZKTeco ADMS Integration',
-    'version': '1.0',
+    'version': '17.0.1.1',
     'category': 'Human Resources/Attendance',
     'summary': 'Integration with ZKTeco devices using iCloud-ADMS protocol',
     'description': """
@@ -17,15 +17,17 @@ Features:
 """,
     'author': 'Wokwy (quochuy.software@gmail.com) support by Claude.ai',
     'website': 'https://www.c2bgroup.net',
-    'depends': ['base_setup', 'hr_attendance'],
+    'depends': ['base_setup', 'hr_attendance', 'hr_work_schedule_cache'],
     'external_dependencies': {
         'python': ['pyzk'],
     },
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/zkteco_device_view.xml',
         'views/hr_employee_view.xml',
         'views/zkteco_attendance_log_view.xml',
+        'views/zkteco_reprocess_job_view.xml',
         'views/menu_views.xml',
     ],
     'demo': [],
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Throughput benchmark for the ADMS endpoints with a simulated device fleet
+
+Plays a fleet of ZKTeco terminals against a running Odoo server: every
+simulated device pushes ATTLOG/OPERLOG payloads to /iclock/cdata and polls
+/iclock/getrequest in between, like real terminals do. The script is not
+loaded by Odoo, run it from a shell:
+
+    python3 adms_fleet_bench.py --url http://localhost:8069 \\
+        --devices 50 --pushes 20 --punches 200 \\
+        --dsn "dbname=mydb user=odoo"
+
+The ADMS routes use auth='none', so the server must resolve the database on
+its own (single database, -d or --db-filter).
+
+Reported figures:
+
+- p50/p95/max latency per endpoint and punches/sec acknowledged by the server
+- with --dsn, committed transactions, executed statements (when the
+  pg_stat_statements extension is installed) and queries per punch, read
+  from PostgreSQL statistics before and after the run
+- with --dsn and the queue ingest mode, the time the queue cron needs to
+  drain the payloads and the resulting end-to-end punches/sec
+
+Device user IDs are drawn from --user-offset .. --user-offset + --users - 1,
+map them to employees' Device User ID to exercise the attendance path
+rather than the unknown employee path.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+
+class EndpointStats:
+    """Thread-safe latency collector of one endpoint"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        if not self.latencies:
+            return f"{self.name:<12} no requests"
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return (f"{self.name:<12} requests={len(latencies):<7} errors={self.errors:<5} "
+                f"p50={statistics.median(latencies) * 1000:8.1f}ms "
+                f"p95={p95 * 1000:8.1f}ms max={latencies[-1] * 1000:8.1f}ms")
+
+
+def build_payload(fmt, serial_index, push_index, args, rng):
+    """Return the body of one push with ``args.punches`` punches"""
+    base = args.start + timedelta(minutes=push_index * args.punches)
+    lines = []
+    for punch_index in range(args.punches):
+        user_id = args.user_offset + rng.randrange(args.users)
+        timestamp = (base + timedelta(seconds=punch_index * 7 + serial_index)).strftime('%Y-%m-%d %H:%M:%S')
+        if fmt == 'operlog':
+            lines.append(f"{push_index} {user_id} {timestamp} {punch_index % 2}")
+        else:
+            lines.append(f"{user_id}\t{timestamp}\t{push_index}\t1\t{punch_index % 2}\t0\t0\t0\t0\t0")
+    body = '\n'.join(lines)
+    return f"OPERLOG:{body}" if fmt == 'operlog' else body
+
+
+def request(url, stats, data=None):
+    start = time.perf_counter()
+    ok = True
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=120) as response:
+            ok = not response.read().startswith(b'ERROR')
+    except (urllib.error.URLError, OSError):
+        ok = False
+    stats.add(time.perf_counter() - start, ok)
+    return ok
+
+
+def run_device(serial_index, args, cdata_stats, poll_stats, acked):
+    """Simulate one terminal: poll, push, repeat"""
+    serial = f"{args.serial_prefix}{serial_index:04d}"
+    rng = random.Random(serial_index)
+    query = urllib.parse.urlencode({'SN': serial, 'table': 'ATTLOG'})
+    for push_index in range(args.pushes):
+        request(f"{args.url}/iclock/getrequest?{urllib.parse.urlencode({'SN': serial})}", poll_stats)
+        payload = build_payload(args.format, serial_index, push_index, args, rng)
+        if request(f"{args.url}/iclock/cdata?{query}", cdata_stats, payload.encode('utf-8')):
+            with acked['lock']:
+                acked['punches'] += args.punches
+        if args.poll_interval:
+            time.sleep(args.poll_interval)
+
+
+class DatabaseProbe:
+    """Reads PostgreSQL statistics around the run"""
+
+    def __init__(self, dsn):
+        import psycopg2
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+
+    def _fetch(self, query, params=None):
+        with self.conn.cursor() as cr:
+            cr.execute(query, params)
+            return cr.fetchone()
+
+    def snapshot(self):
+        # Statistics are only refreshed between transactions of this session
+        self._fetch("SELECT pg_stat_clear_snapshot()")
+        commits, = self._fetch(
+            "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()")
+        try:
+            statements, = self._fetch("SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements")
+        except Exception:
+            statements = None
+        return {'commits': commits, 'statements': statements}
+
+    def queued_logs(self):
+        return self._fetch("SELECT COUNT(*) FROM zkteco_attendance_log WHERE status = 'queued'")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8069', help='Odoo base URL')
+    parser.add_argument('--devices', type=int, default=20, help='Simulated terminals')
+    parser.add_argument('--pushes', type=int, default=10, help='ATTLOG pushes per terminal')
+    parser.add_argument('--punches', type=int, default=100, help='Punches per push')
+    parser.add_argument('--users', type=int, default=500, help='Distinct device user IDs')
+    parser.add_argument('--user-offset', type=int, default=1, help='First device user ID')
+    parser.add_argument('--format', choices=('attlog', 'operlog'), default='attlog')
+    parser.add_argument('--poll-interval', type=float, default=0.0, help='Pause between pushes, seconds')
+    parser.add_argument('--concurrency', type=int, help='Terminals talking at once, defaults to --devices')
+    parser.add_argument('--serial-prefix', default='BENCH')
+    parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d %H:%M'),
+                        default=datetime.now().replace(second=0, microsecond=0) - timedelta(days=1),
+                        help='Local time of the first punch, YYYY-MM-DD HH:MM')
+    parser.add_argument('--dsn', help='PostgreSQL DSN of the Odoo database, enables query/commit figures')
+    parser.add_argument('--drain-timeout', type=float, default=600.0,
+                        help='Seconds to wait for the queue cron to drain the payloads')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    probe = DatabaseProbe(args.dsn) if args.dsn else None
+    before = probe.snapshot() if probe else None
+
+    cdata_stats = EndpointStats('cdata')
+    poll_stats = EndpointStats('getrequest')
+    acked = {'punches': 0, 'lock': threading.Lock()}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency or args.devices) as executor:
+        futures = [
+            executor.submit(run_device, serial_index, args, cdata_stats, poll_stats, acked)
+            for serial_index in range(args.devices)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    print(f"Fleet: {args.devices} devices x {args.pushes} pushes x {args.punches} punches ({args.format})")
+    print(cdata_stats.summary())
+    print(poll_stats.summary())
+    print(f"Acknowledged {acked['punches']} punches in {elapsed:.1f}s: "
+          f"{acked['punches'] / elapsed:.0f} punches/sec")
+
+    if not probe:
+        return
+    drain_elapsed = None
+    if probe.queued_logs():
+        deadline = time.perf_counter() + args.drain_timeout
+        while probe.queued_logs() and time.perf_counter() < deadline:
+            time.sleep(0.5)
+        drain_elapsed = time.perf_counter() - started
+    after = probe.snapshot()
+
+    commits = after['commits'] - before['commits']
+    print(f"Commits: {commits} ({commits / max(acked['punches'], 1):.3f} per punch)")
+    if before['statements'] is not None and after['statements'] is not None:
+        statements = after['statements'] - before['statements']
+        print(f"Statements: {statements} ({statements / max(acked['punches'], 1):.2f} queries per punch)")
+    else:
+        print("Statements: install pg_stat_statements to report queries per punch")
+    if drain_elapsed is not None:
+        remaining = probe.queued_logs()
+        print(f"Queue drained in {drain_elapsed:.1f}s: {acked['punches'] / drain_elapsed:.0f} punches/sec end to end"
+              + (f" ({remaining} payloads still queued)" if remaining else ""))
+
+
+if __name__ == '__main__':
+    main()
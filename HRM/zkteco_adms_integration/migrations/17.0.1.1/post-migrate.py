@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Move the legacy raw_data texts into compressed zkteco.raw.payload records"""
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# (table, payload reference column)
+TABLES = (
+    ('zkteco_attendance_log', 'payload_id'),
+    ('hr_attendance', 'zkteco_payload_id'),
+)
+
+BATCH_SIZE = 1000
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Payload = env['zkteco.raw.payload']
+    for table, column in TABLES:
+        cr.execute("""
+            SELECT 1
+              FROM information_schema.columns
+             WHERE table_name = %s AND column_name = 'raw_data_legacy'
+        """, (table,))
+        if not cr.fetchone():
+            continue
+        cr.execute(f'UPDATE "{table}" SET raw_data_legacy = NULL WHERE raw_data_legacy = %s', ('',))
+        moved = 0
+        while True:
+            cr.execute(f"""
+                SELECT id, device_serial, raw_data_legacy
+                  FROM "{table}"
+                 WHERE raw_data_legacy IS NOT NULL
+                 ORDER BY id
+                 LIMIT %s
+            """, (BATCH_SIZE,))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            payloads = Payload.create([{
+                'device_serial': device_serial,
+                'data_compressed': Payload._compress(text),
+                'data_size': len(text.encode('utf-8')),
+            } for _id, device_serial, text in rows])
+            cr.execute(f"""
+                UPDATE "{table}" target
+                   SET {column} = moved.payload_id,
+                       raw_data_legacy = NULL
+                  FROM unnest(%s::int[], %s::int[]) AS moved(id, payload_id)
+                 WHERE target.id = moved.id
+            """, ([row[0] for row in rows], payloads.ids))
+            moved += len(rows)
+        cr.execute(f'ALTER TABLE "{table}" DROP COLUMN raw_data_legacy')
+        _logger.info("Moved %d raw_data values of %s to compressed payloads", moved, table)
+    env.invalidate_all()
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Keep the raw_data text columns aside, they are moved to zkteco.raw.payload"""
+
+TABLES = ('zkteco_attendance_log', 'hr_attendance')
+
+
+def migrate(cr, version):
+    for table in TABLES:
+        cr.execute("""
+            SELECT 1
+              FROM information_schema.columns
+             WHERE table_name = %s AND column_name = 'raw_data'
+        """, (table,))
+        if cr.fetchone():
+            cr.execute(f'ALTER TABLE "{table}" RENAME COLUMN raw_data TO raw_data_legacy')
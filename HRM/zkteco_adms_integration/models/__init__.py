@@ -1,4 +1,8 @@
 from . import zkteco_device
 from . import hr_employee
 from . import hr_attendance
-from . import zkteco_attendance_log
\ No newline at end of file
+from . import resource_calendar
+from . import zkteco_attendance_log
+from . import zkteco_attendance_punch
+from . import zkteco_raw_payload
+from . import zkteco_reprocess_job
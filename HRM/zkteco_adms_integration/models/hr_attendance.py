@@ -9,4 +9,26 @@ class HrAttendance(models.Model):
     device_serial = fields.Char('Device Serial')
     device_id = fields.Many2one('zkteco.device', 'Device')
     attendance_timestamp = fields.Datetime('Original Timestamp')
-    raw_data = fields.Text('Raw Data')
\ No newline at end of file
+    zkteco_payload_id = fields.Many2one('zkteco.raw.payload', 'Raw Payload', ondelete='set null', copy=False)
+    raw_data = fields.Text('Raw Data', compute='_compute_raw_data', inverse='_inverse_raw_data')
+    zkteco_shift_date = fields.Date('Shift Date', readonly=True, copy=False,
+                                    help='Local date of the device shift this attendance aggregates')
+    zkteco_punch_ids = fields.One2many('zkteco.attendance.punch', 'attendance_id', 'Device Punches')
+
+    @api.depends('zkteco_payload_id')
+    def _compute_raw_data(self):
+        for attendance in self:
+            attendance.raw_data = attendance.zkteco_payload_id.data or ''
+
+    def _inverse_raw_data(self):
+        for attendance in self:
+            attendance.zkteco_payload_id = self.env['zkteco.raw.payload']._store(
+                attendance.device_serial, attendance.raw_data)
+
+    def init(self):
+        # One device-derived attendance per employee and shift, target of the punch upsert
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS hr_attendance_zkteco_shift_uniq
+                ON hr_attendance (employee_id, zkteco_shift_date)
+             WHERE zkteco_shift_date IS NOT NULL
+        """)
@@ -1,4 +1,7 @@
-from odoo import api, fields, models, _
+from odoo import api, fields, models, tools, _
+
+# Fields feeding the cached device user map
+DEVICE_USER_MAP_FIELDS = {'attendance_device_id', 'resource_calendar_id', 'tz', 'active'}
 
 
 class HrEmployee(models.Model):
@@ -32,3 +35,46 @@ class HrEmployee(models.Model):
             else:
                 employee.total_attendances = 0
                 employee.this_month_attendances = 0
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        if any(vals.get('attendance_device_id') for vals in vals_list):
+            self.env.registry.clear_cache()
+            if not self.env.context.get('zkteco_skip_resolve'):
+                self.env['zkteco.unknown.attendance'].sudo()._resolve_for_employees(employees)
+        return employees
+
+    def write(self, vals):
+        res = super().write(vals)
+        if DEVICE_USER_MAP_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        if vals.get('attendance_device_id') and not self.env.context.get('zkteco_skip_resolve'):
+            self.env['zkteco.unknown.attendance'].sudo()._resolve_for_employees(self)
+        return res
+
+    def unlink(self):
+        has_device_users = any(self.mapped('attendance_device_id'))
+        res = super().unlink()
+        if has_device_users:
+            self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_device_user_map(self):
+        """Return {device user ID: (employee id, tz, night shift flag, calendar id)}
+
+        Computed once per worker and dropped whenever an employee mapping or a
+        working schedule changes. The returned dict is shared, do not modify it.
+        """
+        employees = self.sudo().search([('attendance_device_id', '!=', False)])
+        device_user_map = {}
+        for employee in employees:
+            device_user_map.setdefault(employee.attendance_device_id, (
+                employee.id,
+                employee.tz,
+                employee.resource_calendar_id.zkteco_crosses_midnight,
+                employee.resource_calendar_id.id,
+            ))
+        return device_user_map
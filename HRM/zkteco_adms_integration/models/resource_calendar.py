@@ -0,0 +1,26 @@
+from odoo import api, fields, models
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    zkteco_shift_start = fields.Float('Shift Start', compute='_compute_zkteco_shift_window', store=True,
+                                      help='Hour at which the working day of this schedule starts')
+    zkteco_shift_end = fields.Float('Shift End', compute='_compute_zkteco_shift_window', store=True,
+                                    help='Hour at which the working day of this schedule ends')
+    zkteco_crosses_midnight = fields.Boolean('Night Shift', compute='_compute_zkteco_shift_window', store=True,
+                                             index=True, help='Working hours span midnight (18:00-06:00 pattern)')
+
+    @api.depends('attendance_ids.hour_from', 'attendance_ids.hour_to')
+    def _compute_zkteco_shift_window(self):
+        for calendar in self:
+            attendances = calendar.attendance_ids
+            evening_starts = [att.hour_from for att in attendances if att.hour_from >= 18.0]
+            morning_ends = [att.hour_to for att in attendances if att.hour_to <= 6.0 or att.hour_to >= 24.0]
+            calendar.zkteco_crosses_midnight = bool(evening_starts and morning_ends)
+            if calendar.zkteco_crosses_midnight:
+                calendar.zkteco_shift_start = min(evening_starts)
+                calendar.zkteco_shift_end = max(morning_ends) % 24.0
+            else:
+                calendar.zkteco_shift_start = min(attendances.mapped('hour_from'), default=0.0)
+                calendar.zkteco_shift_end = max(attendances.mapped('hour_to'), default=0.0)
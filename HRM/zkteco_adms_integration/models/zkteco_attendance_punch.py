@@ -0,0 +1,187 @@
+from odoo import api, fields, models
+from datetime import datetime, time, timedelta
+import logging
+
+from ..utils.timestamps import local_to_utc
+from .zkteco_device import NIGHT_SHIFT_CLOSE, REGULAR_SHIFT_CLOSE
+
+_logger = logging.getLogger(__name__)
+
+
+class ZktecoAttendancePunch(models.Model):
+    _name = 'zkteco.attendance.punch'
+    _description = 'ZKTeco Attendance Punch'
+    _order = 'punch_time desc'
+
+    employee_id = fields.Many2one('hr.employee', 'Employee', required=True, ondelete='cascade')
+    device_id = fields.Many2one('zkteco.device', 'Device', required=True, ondelete='cascade')
+    punch_time = fields.Datetime('Punch Time', required=True)
+    shift_date = fields.Date('Shift Date', required=True,
+                             help='Local date the shift of this punch began on')
+    status = fields.Char('Status')
+    attendance_id = fields.Many2one('hr.attendance', 'Attendance', ondelete='set null', index=True)
+
+    _sql_constraints = [
+        ('punch_unique', 'unique(employee_id, punch_time, device_id)',
+         'A device punch can only be recorded once.'),
+    ]
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS zkteco_attendance_punch_employee_shift_idx
+                ON zkteco_attendance_punch (employee_id, shift_date)
+        """)
+
+    @api.model
+    def _merge_punches(self, punch_rows, device, tz_name):
+        """Record punches and derive their attendances with set-based statements
+
+        Punches are inserted with ON CONFLICT DO NOTHING on the unique key
+        (employee, punch time, device), so replayed or concurrently pushed
+        punches are recorded once. Only the (employee, shift date) pairs that
+        received new punches are then upserted into hr.attendance from the
+        aggregate of all their punches, keyed on the unique
+        (employee_id, zkteco_shift_date) index.
+
+        :param punch_rows: list of (employee_id, utc punch time, shift date, night shift flag, status)
+        :param device: zkteco.device the punches come from
+        :param tz_name: timezone the device clock runs in
+        :return: number of punches not recorded before
+        """
+        if not punch_rows:
+            return 0
+        cr = self.env.cr
+        self.env['hr.attendance'].flush_model()
+        self.flush_model()
+
+        placeholders = ', '.join(
+            ["(%s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC', %s)"] * len(punch_rows))
+        params = []
+        for employee_id, punch_time, shift_date, is_night_shift, status in punch_rows:
+            params += [employee_id, device.id, punch_time, shift_date, status, self.env.uid, self.env.uid]
+        cr.execute(f"""
+            INSERT INTO zkteco_attendance_punch (employee_id, device_id, punch_time, shift_date, status,
+                                                 create_date, create_uid, write_date, write_uid)
+            VALUES {placeholders}
+            ON CONFLICT (employee_id, punch_time, device_id) DO NOTHING
+            RETURNING employee_id, shift_date
+        """, params)
+        new_punches = cr.fetchall()
+        if not new_punches:
+            return 0
+
+        night_keys = {(row[0], row[2]) for row in punch_rows if row[3]}
+        keys = set(new_punches)
+        self._claim_legacy_attendances(keys, night_keys, tz_name)
+
+        employee_ids = [key[0] for key in keys]
+        shift_dates = [key[1] for key in keys]
+        cr.execute("""
+            INSERT INTO hr_attendance (employee_id, zkteco_shift_date, check_in, check_out, device_id, device_serial,
+                                       create_date, create_uid, write_date, write_uid)
+            SELECT punch.employee_id, punch.shift_date,
+                   MIN(punch.punch_time), NULLIF(MAX(punch.punch_time), MIN(punch.punch_time)),
+                   %(device_id)s, %(device_serial)s,
+                   NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s
+              FROM zkteco_attendance_punch punch
+              JOIN unnest(%(employee_ids)s::int[], %(shift_dates)s::date[]) AS keys (employee_id, shift_date)
+                ON keys.employee_id = punch.employee_id AND keys.shift_date = punch.shift_date
+          GROUP BY punch.employee_id, punch.shift_date
+            ON CONFLICT (employee_id, zkteco_shift_date) WHERE zkteco_shift_date IS NOT NULL
+            DO UPDATE SET
+                check_in = LEAST(hr_attendance.check_in, EXCLUDED.check_in),
+                check_out = NULLIF(
+                    GREATEST(hr_attendance.check_in, hr_attendance.check_out, EXCLUDED.check_in, EXCLUDED.check_out),
+                    LEAST(hr_attendance.check_in, EXCLUDED.check_in)),
+                write_date = EXCLUDED.write_date,
+                write_uid = EXCLUDED.write_uid
+            RETURNING id
+        """, {
+            'device_id': device.id,
+            'device_serial': device.device_serial,
+            'uid': self.env.uid,
+            'employee_ids': employee_ids,
+            'shift_dates': shift_dates,
+        })
+        attendance_ids = [row[0] for row in cr.fetchall()]
+
+        cr.execute("""
+            UPDATE zkteco_attendance_punch punch
+               SET attendance_id = att.id
+              FROM hr_attendance att
+              JOIN unnest(%s::int[], %s::date[]) AS keys (employee_id, shift_date)
+                ON keys.employee_id = att.employee_id AND keys.shift_date = att.zkteco_shift_date
+             WHERE punch.employee_id = att.employee_id
+               AND punch.shift_date = att.zkteco_shift_date
+               AND punch.attendance_id IS DISTINCT FROM att.id
+        """, (employee_ids, shift_dates))
+
+        # Let the ORM recompute stored fields depending on the written columns
+        attendances = self.env['hr.attendance'].browse(attendance_ids)
+        attendances.invalidate_recordset()
+        self.invalidate_model(['attendance_id'])
+        attendances.modified(['check_in', 'check_out'])
+        attendances.flush_recordset()
+
+        _logger.info("Device %s: recorded %d new punches into %d attendances",
+                     device.device_serial, len(new_punches), len(attendance_ids))
+        return len(new_punches)
+
+    @api.model
+    def _claim_legacy_attendances(self, keys, night_keys, tz_name):
+        """Attach attendances without a shift date to the shifts receiving punches
+
+        Attendances entered manually or created before punches were recorded
+        carry no zkteco_shift_date. The latest one starting inside the shift
+        window is stamped with the shift date, so the upsert merges into it
+        instead of creating a second attendance for the same shift.
+        """
+        windows = {}
+        for employee_id, shift_date in keys:
+            close_time = NIGHT_SHIFT_CLOSE if (employee_id, shift_date) in night_keys else REGULAR_SHIFT_CLOSE
+            windows[(employee_id, shift_date)] = (
+                local_to_utc(datetime.combine(shift_date, time.min), tz_name),
+                local_to_utc(datetime.combine(shift_date + timedelta(days=1), close_time), tz_name),
+            )
+
+        self.env.cr.execute("""
+            SELECT id, employee_id, check_in
+              FROM hr_attendance
+             WHERE zkteco_shift_date IS NULL
+               AND employee_id = ANY(%s)
+               AND check_in >= %s
+               AND check_in <= %s
+          ORDER BY check_in DESC
+        """, (
+            list({employee_id for employee_id, shift_date in keys}),
+            min(start for start, end in windows.values()),
+            max(end for start, end in windows.values()),
+        ))
+        candidates = {}
+        for row in self.env.cr.fetchall():
+            candidates.setdefault(row[1], []).append(row)
+
+        claimed = {}
+        for (employee_id, shift_date), (start, end) in windows.items():
+            match = next((
+                row for row in candidates.get(employee_id, [])
+                if row[0] not in claimed and start <= row[2] <= end
+            ), None)
+            if match:
+                claimed[match[0]] = shift_date
+
+        if claimed:
+            # Skip shifts another worker has attached an attendance to meanwhile
+            self.env.cr.execute("""
+                UPDATE hr_attendance att
+                   SET zkteco_shift_date = claim.shift_date
+                  FROM unnest(%s::int[], %s::date[]) AS claim (id, shift_date)
+                 WHERE att.id = claim.id
+                   AND att.zkteco_shift_date IS NULL
+                   AND NOT EXISTS (
+                       SELECT 1
+                         FROM hr_attendance other
+                        WHERE other.employee_id = att.employee_id
+                          AND other.zkteco_shift_date = claim.shift_date
+                   )
+            """, (list(claimed), list(claimed.values())))
@@ -1,10 +1,35 @@
 from odoo import models, fields, api
-from datetime import datetime, timedelta
+from odoo.tools import split_every
+from datetime import datetime, time, timedelta
 import logging
 import pytz
 
+from ..utils import heartbeat
+from ..utils.timestamps import NOON, TimestampParser, local_to_utc, utc_to_local
+
 _logger = logging.getLogger(__name__)
 
+# Local time on the day after the shift date until which punches still belong
+# to that shift: regular shifts close at 02:00, night shifts at 12:00.
+REGULAR_SHIFT_CLOSE = time(2, 0)
+NIGHT_SHIFT_CLOSE = NOON
+
+# Punches merged per upsert statement
+INGEST_CHUNK_SIZE = 5000
+
+# Commands delivered per poll, bounded by the body size devices accept
+COMMAND_BATCH_SIZE = 100
+COMMAND_BATCH_BYTES = 16 * 1024
+
+
+def _get_shift_date(local_timestamp, is_night_shift):
+    """Return the local date of the shift a punch belongs to"""
+    shift_date = local_timestamp.date()
+    if is_night_shift and local_timestamp.time() <= NIGHT_SHIFT_CLOSE:
+        # Early morning punch closes the night shift of the previous day
+        shift_date -= timedelta(days=1)
+    return shift_date
+
 
 class ZktecoDevice(models.Model):
     _name = 'zkteco.device'
@@ -63,25 +88,93 @@ class ZktecoDevice(models.Model):
             'connection_status': 'disconnected'
         })
 
-    def get_pending_commands(self):
-        """Get pending commands for the device"""
-        commands = self.env['zkteco.device.command'].search([
-            ('device_id', '=', self.id),
-            ('status', '=', 'pending'),
-            ('scheduled_time', '<=', fields.Datetime.now())
-        ], order='priority desc, create_date asc', limit=1)
-
-        if commands:
-            command = commands[0]
-            # Mark as sent
-            command.write({
-                'status': 'sent',
-                'sent_time': fields.Datetime.now()
-            })
-            _logger.info("Sending command to device %s: %s", self.device_serial, command.command)
-            return command.command
+    def _record_heartbeat(self):
+        """Buffer that the device polled now, flushing the buffer when due
 
-        return ''
+        Heartbeats are written back in bulk by :meth:`_flush_heartbeats` once
+        per ``zkteco_adms_integration.heartbeat_interval`` seconds instead of
+        on every poll.
+        """
+        self.ensure_one()
+        interval = int(self.env['ir.config_parameter'].sudo().get_param(
+            'zkteco_adms_integration.heartbeat_interval', heartbeat.DEFAULT_FLUSH_INTERVAL))
+        buffer = heartbeat.get_buffer(self.env.cr.dbname)
+        if buffer.touch(self.device_serial, fields.Datetime.now(), interval):
+            self._flush_heartbeats(buffer.drain())
+
+    @api.model
+    def _flush_heartbeats(self, seen):
+        """Write the buffered last-seen times ``{serial: datetime}`` in one UPDATE
+
+        Rows locked by a concurrent flush are skipped, that flush carries a
+        heartbeat just as recent.
+        """
+        if not seen:
+            return 0
+        values = ', '.join(['(%s, %s::timestamp)'] * len(seen))
+        params = [value for item in sorted(seen.items()) for value in item]
+        self.env.cr.execute(f"""
+            WITH seen(device_serial, seen_at) AS (VALUES {values}),
+            locked AS (
+                SELECT device.id, seen.seen_at
+                  FROM zkteco_device device
+                  JOIN seen ON seen.device_serial = device.device_serial
+                 WHERE device.is_active
+                 ORDER BY device.id
+                   FOR UPDATE OF device SKIP LOCKED
+            )
+            UPDATE zkteco_device device
+               SET last_activity = GREATEST(device.last_activity, locked.seen_at),
+                   connection_status = 'connected'
+              FROM locked
+             WHERE device.id = locked.id
+        """, params)
+        updated = self.env.cr.rowcount
+        self.invalidate_model(['last_activity', 'connection_status'])
+        _logger.debug("Flushed heartbeats of %d devices", updated)
+        return updated
+
+    def get_pending_commands(self, batch_size=COMMAND_BATCH_SIZE, max_bytes=COMMAND_BATCH_BYTES):
+        """Get a batch of pending commands for the device and mark them as sent
+
+        Commands are returned one per line in the ADMS ``C:<id>:<command>``
+        form, highest priority first, up to ``batch_size`` commands and
+        ``max_bytes`` bytes. The device acknowledges them by id on
+        /iclock/devicecmd. Commands claimed by a concurrent poll are skipped.
+        """
+        self.ensure_one()
+        now = fields.Datetime.now()
+        self.env['zkteco.device.command'].flush_model()
+        self.env.cr.execute("""
+            SELECT id, command
+              FROM zkteco_device_command
+             WHERE device_id = %s
+               AND status = 'pending'
+               AND scheduled_time <= %s
+             ORDER BY priority DESC, create_date ASC, id ASC
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (self.id, now, batch_size))
+
+        command_ids, lines, size = [], [], 0
+        for command_id, command in self.env.cr.fetchall():
+            line = f"C:{command_id}:{command}"
+            line_size = len(line.encode('utf-8')) + 1
+            if lines and size + line_size > max_bytes:
+                break
+            command_ids.append(command_id)
+            lines.append(line)
+            size += line_size
+
+        if not command_ids:
+            return ''
+
+        self.env['zkteco.device.command'].browse(command_ids).write({
+            'status': 'sent',
+            'sent_time': now,
+        })
+        _logger.info("Sending %d commands to device %s", len(command_ids), self.device_serial)
+        return '\n'.join(lines)
 
     def send_command(self, command, priority=5):
         """Send command to device"""
@@ -106,6 +199,103 @@ class ZktecoDevice(models.Model):
         current_time = fields.Datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.send_command(f'SET TIME {current_time}', priority=3)
 
+    def _ingest_attendance_records(self, punches, tz_name='Asia/Ho_Chi_Minh', chunk_size=INGEST_CHUNK_SIZE):
+        """Merge device punches into hr.attendance
+
+        Punches are consumed in chunks so a large backlog upload keeps a bounded
+        memory footprint. For each chunk, device user IDs are resolved from the
+        cache and the punches are recorded and merged into their attendances
+        with set-based statements, see zkteco.attendance.punch._merge_punches.
+        The caller is responsible for committing.
+
+        Each attendance keeps the earliest punch of its shift as check-in and the
+        latest one as check-out.
+
+        :param punches: iterable of Punch tuples, see utils.payload.iter_punches
+        :param tz_name: timezone the device clock runs in
+        :return: number of punches not recorded before
+        """
+        self.ensure_one()
+        timestamp_parser = TimestampParser()
+        return sum(
+            self._ingest_punch_chunk(chunk, tz_name, timestamp_parser)
+            for chunk in split_every(chunk_size, punches)
+        )
+
+    def _ingest_punch_chunk(self, records, tz_name, timestamp_parser):
+        """Merge one chunk of punches, see _ingest_attendance_records"""
+        punches = []
+        seen = set()
+        for record in records:
+            user_id = record.user_id
+            timestamp_str = record.timestamp
+            if not user_id or not timestamp_str:
+                _logger.warning("Incomplete attendance record: %s", record.raw)
+                continue
+            local_timestamp = timestamp_parser.parse(timestamp_str)
+            if local_timestamp is None:
+                _logger.error("Unable to parse timestamp %s", timestamp_str)
+                continue
+            # (serial, user_id, timestamp) identifies a punch, devices resend them on retries
+            if (user_id, local_timestamp) in seen:
+                continue
+            seen.add((user_id, local_timestamp))
+            punches.append((user_id, local_timestamp, record))
+
+        if not punches:
+            return 0
+
+        # Resolve device user IDs from the per-worker cache
+        device_user_map = self.env['hr.employee']._get_device_user_map()
+
+        punch_rows = []
+        unknown_vals = []
+        for user_id, local_timestamp, record in punches:
+            resolved = device_user_map.get(user_id)
+            if not resolved:
+                _logger.warning("Employee not found for device user ID: %s", user_id)
+                unknown_vals.append({
+                    'device_serial': self.device_serial,
+                    'device_user_id': user_id,
+                    'timestamp': local_to_utc(local_timestamp, tz_name),
+                    'status': record.status or '1',
+                    'processed': False,
+                    'notes': f"Unknown employee with device user ID: {user_id}",
+                })
+                continue
+            employee_id, employee_tz, is_night_shift, calendar_id = resolved
+            punch_rows.append((employee_id, local_to_utc(local_timestamp, tz_name),
+                               _get_shift_date(local_timestamp, is_night_shift),
+                               is_night_shift, record.status or '1'))
+
+        if unknown_vals:
+            self._create_unknown_attendances(unknown_vals)
+
+        return self.env['zkteco.attendance.punch']._merge_punches(punch_rows, self, tz_name)
+
+    def _create_unknown_attendances(self, vals_list):
+        """Create unknown attendance rows, skipping punches already recorded"""
+        self.env['zkteco.unknown.attendance'].flush_model(['device_serial', 'device_user_id', 'timestamp'])
+        self.env.cr.execute("""
+            SELECT device_user_id, timestamp
+              FROM zkteco_unknown_attendance
+             WHERE device_serial = %s
+               AND device_user_id = ANY(%s)
+               AND timestamp >= %s
+               AND timestamp <= %s
+        """, (
+            self.device_serial,
+            list({vals['device_user_id'] for vals in vals_list}),
+            min(vals['timestamp'] for vals in vals_list),
+            max(vals['timestamp'] for vals in vals_list),
+        ))
+        existing_keys = set(self.env.cr.fetchall())
+        vals_list = [
+            vals for vals in vals_list
+            if (vals['device_user_id'], vals['timestamp']) not in existing_keys
+        ]
+        return self.env['zkteco.unknown.attendance'].create(vals_list)
+
     def process_attendance_data(self, serial_number, records):
         """Process attendance data (legacy method for compatibility)"""
         _logger.info("Processing %d attendance records for device %s", len(records), serial_number)
@@ -126,6 +316,78 @@ class ZktecoUnknownAttendance(models.Model):
     notes = fields.Text('Notes')
     employee_id = fields.Many2one('hr.employee', 'Assigned Employee')
 
+    def init(self):
+        # Pending punches are looked up by device user ID when an employee gets one
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS zkteco_unknown_attendance_pending_user_idx
+                ON zkteco_unknown_attendance (device_user_id)
+             WHERE processed IS NOT TRUE
+        """)
+
+    @api.model
+    def _resolve_for_employees(self, employees, tz_name='Asia/Ho_Chi_Minh'):
+        """Merge the pending unknown punches of the employees' device user IDs
+
+        The punches are merged into attendances with the bulk punch merger,
+        one merge per device, then marked processed in a single statement.
+        Punches of devices that no longer exist are left pending.
+
+        :param tz_name: timezone the device clocks run in
+        :return: number of unknown punches resolved
+        """
+        user_ids = list(set(employees.filtered('attendance_device_id').mapped('attendance_device_id')))
+        if not user_ids:
+            return 0
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT unknown.id, unknown.device_user_id, unknown.timestamp, unknown.status, device.id
+              FROM zkteco_unknown_attendance unknown
+              JOIN LATERAL (
+                    SELECT id
+                      FROM zkteco_device
+                     WHERE device_serial = unknown.device_serial
+                     ORDER BY is_active DESC, id
+                     LIMIT 1
+              ) device ON TRUE
+             WHERE unknown.device_user_id = ANY(%s)
+               AND unknown.processed IS NOT TRUE
+        """, (user_ids,))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0
+
+        device_user_map = self.env['hr.employee']._get_device_user_map()
+        punch_rows_by_device = {}
+        resolved_ids, resolved_employee_ids = [], []
+        for unknown_id, user_id, utc_timestamp, status, device_id in rows:
+            resolved = device_user_map.get(user_id)
+            if not resolved:
+                continue
+            employee_id, employee_tz, is_night_shift, calendar_id = resolved
+            shift_date = _get_shift_date(utc_to_local(utc_timestamp, tz_name), is_night_shift)
+            punch_rows_by_device.setdefault(device_id, []).append(
+                (employee_id, utc_timestamp, shift_date, is_night_shift, status or '1'))
+            resolved_ids.append(unknown_id)
+            resolved_employee_ids.append(employee_id)
+
+        for device_id, punch_rows in punch_rows_by_device.items():
+            self.env['zkteco.attendance.punch']._merge_punches(
+                punch_rows, self.env['zkteco.device'].browse(device_id), tz_name)
+
+        if resolved_ids:
+            self.env.cr.execute("""
+                UPDATE zkteco_unknown_attendance unknown
+                   SET processed = TRUE,
+                       employee_id = resolved.employee_id,
+                       write_date = NOW() AT TIME ZONE 'UTC',
+                       write_uid = %s
+                  FROM unnest(%s::int[], %s::int[]) AS resolved(id, employee_id)
+                 WHERE unknown.id = resolved.id
+            """, (self.env.uid, resolved_ids, resolved_employee_ids))
+            self.invalidate_model(['processed', 'employee_id', 'write_date', 'write_uid'])
+            _logger.info("Resolved %d unknown punches for device user IDs %s", len(resolved_ids), user_ids)
+        return len(resolved_ids)
+
     def action_assign_employee(self):
         """Open wizard to assign employee to unknown attendance"""
         return {
@@ -160,62 +422,26 @@ class ZktecoAssignEmployeeWizard(models.TransientModel):
 
     def _convert_timestamp_to_utc(self, timestamp_obj):
         """Convert timestamp from device timezone to UTC for Odoo storage"""
+        user_tz = self.env.context.get('tz') or self.env.user.tz or 'Asia/Ho_Chi_Minh'
         try:
-            # Get user's timezone (device timezone)
-            user_tz = self.env.context.get('tz') or self.env.user.tz or 'Asia/Ho_Chi_Minh'
-
-            if pytz:
-                try:
-                    # Use pytz for accurate timezone conversion
-                    user_timezone = pytz.timezone(user_tz)
-                    if timestamp_obj.tzinfo is None:
-                        # Localize naive datetime to user's timezone
-                        local_timestamp = user_timezone.localize(timestamp_obj)
-                    else:
-                        # Convert to user's timezone first
-                        local_timestamp = timestamp_obj.astimezone(user_timezone)
-
-                    # Convert to UTC for Odoo storage
-                    utc_timestamp = local_timestamp.astimezone(pytz.UTC).replace(tzinfo=None)
-                    return utc_timestamp
-                except Exception as e:
-                    _logger.warning("Error using pytz for timezone conversion: %s", e)
-
-            # Fallback: Manual timezone offset for Vietnam (UTC+7)
-            if user_tz in ['Asia/Ho_Chi_Minh', 'Asia/Saigon'] or user_tz.startswith('GMT+7'):
-                # Device time is UTC+7, convert to UTC by subtracting 7 hours
-                utc_timestamp = timestamp_obj - timedelta(hours=7)
-            elif user_tz.startswith('GMT+'):
-                # Extract offset and convert
-                try:
-                    offset = int(user_tz.replace('GMT+', ''))
-                    utc_timestamp = timestamp_obj - timedelta(hours=offset)
-                except:
-                    utc_timestamp = timestamp_obj  # Use as-is if can't parse
-            elif user_tz.startswith('GMT-'):
-                # Extract offset and convert
-                try:
-                    offset = int(user_tz.replace('GMT-', ''))
-                    utc_timestamp = timestamp_obj + timedelta(hours=offset)
-                except:
-                    utc_timestamp = timestamp_obj  # Use as-is if can't parse
-            else:
-                # Default: assume device time is UTC+7 (Vietnam)
-                utc_timestamp = timestamp_obj - timedelta(hours=7)
-
-            return utc_timestamp
-
-        except Exception as e:
-            _logger.error("Error converting timestamp %s to UTC: %s", timestamp_obj, e)
-            return timestamp_obj
+            return local_to_utc(timestamp_obj, user_tz)
+        except pytz.UnknownTimeZoneError:
+            _logger.warning("Unknown timezone %s, assuming UTC+7", user_tz)
+            return timestamp_obj - timedelta(hours=7)
 
     def action_assign(self):
         """Assign employee and create attendance record with improved logic"""
         unknown_attendance = self.unknown_attendance_id
 
-        # Update employee device ID if requested
+        # Update employee device ID if requested, which merges every pending
+        # punch of that device user, this one included, unless no attendance
+        # should be created
         if self.update_employee_device_id:
-            self.employee_id.attendance_device_id = self.device_user_id
+            self.employee_id.with_context(
+                zkteco_skip_resolve=not self.create_attendance_record,
+            ).attendance_device_id = self.device_user_id
+            if unknown_attendance.processed:
+                return {'type': 'ir.actions.act_window_close'}
 
         # Create attendance record if requested
         if self.create_attendance_record:
@@ -226,19 +452,12 @@ class ZktecoAssignEmployeeWizard(models.TransientModel):
                 # Convert UTC timestamp back to local timezone to get correct local date
                 user_tz = self.env.context.get('tz') or self.env.user.tz or 'Asia/Ho_Chi_Minh'
 
-                if pytz:
-                    try:
-                        # Convert UTC to local time to get correct date
-                        utc_tz = pytz.UTC
-                        user_timezone = pytz.timezone(user_tz)
-                        utc_aware = utc_tz.localize(utc_timestamp_from_db)
-                        local_timestamp = utc_aware.astimezone(user_timezone).replace(tzinfo=None)
-                    except Exception as e:
-                        _logger.warning("Error using pytz for timezone conversion: %s", e)
-                        # Fallback: add 7 hours for Vietnam timezone
-                        local_timestamp = utc_timestamp_from_db + timedelta(hours=7)
-                else:
-                    # Fallback: add 7 hours for Vietnam timezone (UTC+7)
+                try:
+                    # Convert UTC to local time to get correct date
+                    local_timestamp = utc_to_local(utc_timestamp_from_db, user_tz)
+                except pytz.UnknownTimeZoneError as e:
+                    _logger.warning("Error using pytz for timezone conversion: %s", e)
+                    # Fallback: add 7 hours for Vietnam timezone
                     local_timestamp = utc_timestamp_from_db + timedelta(hours=7)
 
                 # Get local date for searching
@@ -274,7 +493,6 @@ class ZktecoAssignEmployeeWizard(models.TransientModel):
                         'employee_id': self.employee_id.id,
                         'check_in': utc_timestamp,
                         'device_serial': unknown_attendance.device_serial,
-                        'raw_data': f"Manual assignment from unknown attendance ID: {unknown_attendance.id} - Local time: {local_timestamp}",
                     }
                     self.env['hr.attendance'].create(attendance_data)
                     _logger.info("Created new attendance record for employee %s with check-in at %s (local: %s)",
@@ -308,11 +526,6 @@ class ZktecoAssignEmployeeWizard(models.TransientModel):
                                             utc_timestamp, local_timestamp, final_check_in, self.employee_id.name)
 
                     if updated:
-                        # Update raw_data to include manual assignment information
-                        current_raw_data = existing_attendance.raw_data or ''
-                        update_data[
-                            'raw_data'] = current_raw_data + f"\nManual assignment: {'; '.join(update_message)} - from unknown attendance ID: {unknown_attendance.id}"
-
                         existing_attendance.write(update_data)
                         _logger.info("Updated attendance record for employee %s: %s",
                                      self.employee_id.name, '; '.join(update_message))
@@ -360,6 +573,12 @@ class ZktecoDeviceCommand(models.Model):
     retry_count = fields.Integer('Retry Count', default=0)
     max_retries = fields.Integer('Max Retries', default=3)
 
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS zkteco_device_command_pending_idx
+                ON zkteco_device_command (device_id, status, scheduled_time)
+        """)
+
     def action_retry(self):
         """Retry sending the command"""
         if self.retry_count < self.max_retries:
@@ -378,6 +597,30 @@ class ZktecoDeviceCommand(models.Model):
             'confirmed_time': fields.Datetime.now()
         })
 
+    @api.model
+    def _apply_acknowledgements(self, device, results):
+        """Record the results a device returned for delivered commands
+
+        ``results`` maps command ids to the ``Return`` code reported by the
+        device: zero or positive codes confirm the command, negative codes
+        fail it. Each outcome is written with a single statement.
+        """
+        sent = self.search([
+            ('id', 'in', list(results)),
+            ('device_id', '=', device.id),
+            ('status', '=', 'sent'),
+        ])
+        confirmed = sent.filtered(lambda command: results[command.id] >= 0)
+        failed = sent - confirmed
+        now = fields.Datetime.now()
+        if confirmed:
+            confirmed.write({'status': 'confirmed', 'confirmed_time': now})
+        if failed:
+            failed.write({'status': 'failed', 'confirmed_time': now})
+        _logger.info("Device %s acknowledged %d commands (%d failed)",
+                     device.device_serial, len(sent), len(failed))
+        return len(sent)
+
     @api.model
     def cleanup_expired_commands(self):
         """Clean up expired commands (older than 1 hour and still pending)"""
@@ -0,0 +1,97 @@
+from odoo import api, fields, models
+from datetime import timedelta
+import base64
+import logging
+import zlib
+
+_logger = logging.getLogger(__name__)
+
+# Days raw payloads are kept before the purge cron deletes them
+DEFAULT_RETENTION_DAYS = 30
+
+# Payloads deleted per purge transaction
+PURGE_BATCH_SIZE = 5000
+
+
+class ZktecoRawPayload(models.Model):
+    _name = 'zkteco.raw.payload'
+    _description = 'ZKTeco Raw Payload'
+    _order = 'id desc'
+
+    device_serial = fields.Char('Device Serial')
+    data_compressed = fields.Binary('Compressed Data', attachment=False, prefetch=False)
+    data_size = fields.Integer('Size (bytes)', help='Size of the uncompressed payload')
+    data = fields.Text('Data', compute='_compute_data')
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS zkteco_raw_payload_create_date_idx
+                ON zkteco_raw_payload (create_date)
+        """)
+
+    @api.depends('data_compressed')
+    def _compute_data(self):
+        for payload, compressed in zip(self, self.with_context(bin_size=False).mapped('data_compressed')):
+            payload.data = self._decompress(compressed)
+
+    @api.model
+    def _compress(self, text):
+        return base64.b64encode(zlib.compress((text or '').encode('utf-8')))
+
+    @api.model
+    def _decompress(self, compressed):
+        if not compressed:
+            return ''
+        return zlib.decompress(base64.b64decode(compressed)).decode('utf-8')
+
+    @api.model
+    def _store(self, device_serial, text):
+        """Store ``text`` compressed and return the payload, empty text stores nothing"""
+        if not text:
+            return self.browse()
+        return self.create({
+            'device_serial': device_serial,
+            'data_compressed': self._compress(text),
+            'data_size': len(text.encode('utf-8')),
+        })
+
+    @api.model
+    def _cron_purge_payloads(self):
+        """Delete payloads older than the retention period in small batches
+
+        ``zkteco_adms_integration.payload_retention_days`` sets the period,
+        0 keeps payloads forever. Each batch is committed on its own so
+        autovacuum can reclaim the space while the purge runs, and payloads
+        of logs still waiting in the queue are kept. References from logs and
+        attendances are cleared by the foreign keys.
+        """
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'zkteco_adms_integration.payload_retention_days', DEFAULT_RETENTION_DAYS))
+        if retention_days <= 0:
+            return 0
+        cutoff = fields.Datetime.now() - timedelta(days=retention_days)
+        purged = 0
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM zkteco_raw_payload
+                 WHERE id IN (
+                    SELECT payload.id
+                      FROM zkteco_raw_payload payload
+                     WHERE payload.create_date < %s
+                       AND NOT EXISTS (
+                            SELECT 1
+                              FROM zkteco_attendance_log log
+                             WHERE log.payload_id = payload.id
+                               AND log.status IN ('queued', 'processing')
+                       )
+                     LIMIT %s
+                 )
+            """, (cutoff, PURGE_BATCH_SIZE))
+            deleted = self.env.cr.rowcount
+            if not deleted:
+                break
+            purged += deleted
+            self.env.cr.commit()
+        self.invalidate_model()
+        _logger.info("Purged %d raw payloads older than %s", purged, cutoff)
+        return purged
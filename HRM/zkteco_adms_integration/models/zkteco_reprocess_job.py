@@ -0,0 +1,146 @@
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+import logging
+import time
+
+from ..utils.cron import get_time_budget
+
+_logger = logging.getLogger(__name__)
+
+# Logs replayed per transaction
+REPROCESS_CHUNK_SIZE = 200
+
+# Seconds a cron run spends on jobs before handing over to the next run, capped
+# to half of the cron real time limit (see utils.cron)
+REPROCESS_TIME_BUDGET = 90
+
+# Error lines kept on a job
+MAX_ERROR_LINES = 50
+
+
+class ZktecoReprocessJob(models.Model):
+    _name = 'zkteco.reprocess.job'
+    _description = 'ZKTeco Attendance Reprocess Job'
+    _order = 'id desc'
+
+    name = fields.Char('Name', required=True, default=lambda self: _('Reprocess %s') % fields.Date.today())
+    date_from = fields.Datetime('From', required=True)
+    date_to = fields.Datetime('To', required=True)
+    device_ids = fields.Many2many('zkteco.device', string='Devices',
+                                  help='Leave empty to reprocess the logs of every device')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('done', 'Done'),
+        ('cancelled', 'Cancelled'),
+    ], string='Status', default='draft', index=True)
+    total_logs = fields.Integer('Total Logs', readonly=True)
+    processed_logs = fields.Integer('Processed Logs', readonly=True)
+    merged_punches = fields.Integer('Merged Punches', readonly=True)
+    error_count = fields.Integer('Error Count', readonly=True)
+    error_message = fields.Text('Errors', readonly=True)
+    progress = fields.Float('Progress', compute='_compute_progress')
+    last_log_id = fields.Integer('Last Log', readonly=True, help='Cursor the job resumes from')
+    start_time = fields.Datetime('Started', readonly=True)
+    end_time = fields.Datetime('Finished', readonly=True)
+
+    @api.depends('total_logs', 'processed_logs')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = job.total_logs and 100.0 * job.processed_logs / job.total_logs
+
+    def _get_log_domain(self):
+        self.ensure_one()
+        domain = [
+            ('create_date', '>=', self.date_from),
+            ('create_date', '<=', self.date_to),
+            ('payload_id', '!=', False),
+            ('status', 'not in', ('queued', 'processing')),
+        ]
+        if self.device_ids:
+            domain.append(('device_serial', 'in', self.device_ids.mapped('device_serial')))
+        return domain
+
+    def action_start(self):
+        """Queue the jobs, the reprocess cron runs them in the background"""
+        for job in self:
+            if job.date_from > job.date_to:
+                raise UserError(_("The start of the period must be before its end."))
+            job.write({
+                'state': 'queued',
+                'total_logs': self.env['zkteco.attendance.log'].search_count(job._get_log_domain()),
+                'processed_logs': 0,
+                'merged_punches': 0,
+                'error_count': 0,
+                'error_message': False,
+                'last_log_id': 0,
+                'start_time': fields.Datetime.now(),
+                'end_time': False,
+            })
+        self._trigger_reprocess()
+
+    def action_cancel(self):
+        self.filtered(lambda job: job.state == 'queued').write({
+            'state': 'cancelled',
+            'end_time': fields.Datetime.now(),
+        })
+
+    def action_reset_to_draft(self):
+        self.write({'state': 'draft'})
+
+    @api.model
+    def _trigger_reprocess(self):
+        cron = self.env.ref('zkteco_adms_integration.ir_cron_run_reprocess_jobs', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _cron_run_jobs(self, chunk_size=REPROCESS_CHUNK_SIZE, time_budget=None):
+        """Advance queued jobs chunk by chunk, committing after each chunk
+
+        Jobs resume from ``last_log_id``, so a run stopped by its time budget,
+        a cancellation or a server restart picks up where it left off.
+        """
+        if time_budget is None:
+            time_budget = get_time_budget(REPROCESS_TIME_BUDGET)
+        deadline = time.monotonic() + time_budget
+        for job in self.search([('state', '=', 'queued')], order='id'):
+            while time.monotonic() < deadline:
+                job.invalidate_recordset()
+                if job.state != 'queued' or job._run_chunk(chunk_size):
+                    break
+            else:
+                # Out of time, continue in a fresh cron run
+                self._trigger_reprocess()
+                return
+
+    def _run_chunk(self, chunk_size):
+        """Reprocess the next chunk of logs and return whether the job is finished"""
+        self.ensure_one()
+        logs = self.env['zkteco.attendance.log'].search(
+            self._get_log_domain() + [('id', '>', self.last_log_id)], order='id', limit=chunk_size)
+        if not logs:
+            self.write({'state': 'done', 'end_time': fields.Datetime.now()})
+            self.env.cr.commit()
+            _logger.info("Reprocess job %s done: %d logs, %d punches merged, %d errors",
+                         self.id, self.processed_logs, self.merged_punches, self.error_count)
+            return True
+
+        _reprocessed_count, merged_count, errors = logs._reprocess_logs()
+        values = {
+            'last_log_id': logs[-1].id,
+            'processed_logs': self.processed_logs + len(logs),
+            'merged_punches': self.merged_punches + merged_count,
+        }
+        if errors:
+            error_lines = (self.error_message or '').splitlines() + errors
+            values.update({
+                'error_count': self.error_count + len(errors),
+                'error_message': '\n'.join(error_lines[-MAX_ERROR_LINES:]),
+            })
+        self.write(values)
+        self.env.cr.commit()
+        # Drop decompressed payloads and merged records before the next chunk
+        self.env.invalidate_all()
+        _logger.info("Reprocess job %s: %d/%d logs", self.id, self.processed_logs, self.total_logs)
+        return False
@@ -0,0 +1,2 @@
+from . import timestamps
+from . import heartbeat
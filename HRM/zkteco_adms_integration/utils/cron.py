@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Time budget of the crons draining the device queues
+
+A cron run stops taking work once its budget is spent and triggers itself
+again, rather than being killed by the server in the middle of a batch.
+"""
+from odoo.tools import config
+
+
+def get_time_budget(budget):
+    """Return ``budget`` seconds, capped to half of the cron real time limit
+
+    The other half is left for the batch started last to finish before the
+    server kills the worker.
+    """
+    limit = config['limit_time_real_cron']
+    if limit is None or limit < 0:
+        limit = config['limit_time_real']
+    if limit and limit > 0:
+        return min(budget, limit / 2)
+    return budget
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""In-memory buffer of device heartbeats
+
+Terminals poll the server every few seconds. Rather than updating the device
+row on every poll, the time a serial was last seen is kept in memory and
+written back for all devices at once when the flush interval has elapsed.
+Each server worker keeps its own buffer, one per database.
+"""
+import threading
+import time
+
+# Seconds between two flushes of a buffer
+DEFAULT_FLUSH_INTERVAL = 60
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+class HeartbeatBuffer:
+    """Last time each device serial was seen, pending a flush"""
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def touch(self, serial, seen_at, interval=DEFAULT_FLUSH_INTERVAL):
+        """Record a poll of ``serial`` and return whether a flush is due"""
+        with self._lock:
+            self._seen[serial] = seen_at
+            return time.monotonic() - self._last_flush >= interval
+
+    def drain(self):
+        """Return the pending heartbeats as a dict and empty the buffer"""
+        with self._lock:
+            seen, self._seen = self._seen, {}
+            self._last_flush = time.monotonic()
+            return seen
+
+
+def get_buffer(dbname):
+    """Return the heartbeat buffer of database ``dbname``"""
+    buffer = _buffers.get(dbname)
+    if buffer is None:
+        with _buffers_lock:
+            buffer = _buffers.setdefault(dbname, HeartbeatBuffer())
+    return buffer
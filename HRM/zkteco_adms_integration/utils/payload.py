@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Streaming parser for ZKTeco ADMS attendance payloads
+
+Payloads are walked line by line and punches are yielded as they are
+parsed, so a large backlog upload is never materialized as a list of dicts.
+The line layout is sniffed on the first record line and only sniffed again
+when a line does not match it.
+"""
+import collections
+import logging
+import re
+
+from .timestamps import parse_timestamp
+
+_logger = logging.getLogger(__name__)
+
+Punch = collections.namedtuple('Punch', [
+    'user_id', 'timestamp', 'status', 'record_id', 'verify_type', 'work_code', 'raw',
+])
+
+SPACE_PATTERN = re.compile(r'(\d+)\s+(\d+)\s+(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})\s+(\d+)')
+COMMA_PATTERN = re.compile(r'(\d+),(\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}),(\d+)')
+
+# Status codes sent by devices: 0 = Check Out, 1 = Check In, 4 = Break Out, 5 = Break In
+STATUS_CODES = frozenset(('0', '1', '4', '5'))
+
+
+def iter_lines(payload):
+    """Yield the lines of a payload without splitting it into a list
+
+    ``payload`` is either a string or an iterable of str/bytes lines, such as
+    a request stream.
+    """
+    if isinstance(payload, str):
+        start = 0
+        while True:
+            end = payload.find('\n', start)
+            if end == -1:
+                yield payload[start:]
+                return
+            yield payload[start:end]
+            start = end + 1
+    for line in payload:
+        yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+# OPERLOG/ATTLOG line parsers
+
+def _parse_key_value_line(line):
+    """user_id=1\\ttime=2025-05-02 08:30:00\\tstatus=0"""
+    values = {}
+    for part in line.split('\t'):
+        key, sep, value = part.partition('=')
+        if sep:
+            values[key] = value
+    user_id = values.get('user_id')
+    timestamp = values.get('time') or values.get('timestamp')
+    if not user_id or not timestamp:
+        return None
+    return Punch(user_id, timestamp, values.get('status', '1'), None, None, None, line)
+
+
+def _parse_operlog_space_line(line):
+    """1 101 2024-01-15 09:30:00 1 1 1 0"""
+    parts = line.split()
+    if len(parts) < 4:
+        return None
+    return Punch(parts[1], f"{parts[2]} {parts[3]}", parts[4] if len(parts) > 4 else '1',
+                 parts[0], None, None, line)
+
+
+# Direct format line parsers
+
+def _parse_tab_line(line):
+    """123456\\t2025-06-13 16:42:31\\t255\\t15\\t0\\t0\\t0\\t0\\t0\\t0
+
+    Structure: [user_id] [timestamp] [record_id] [status/verify_type] [work_code] [reserved...]
+    """
+    parts = line.split('\t')
+    if len(parts) < 4:
+        return None
+    user_id = parts[0].strip()
+    timestamp = parts[1].strip()
+    record_id = parts[2].strip()
+    status_or_verify = parts[3].strip()
+    work_code = parts[4].strip() if len(parts) > 4 else '0'
+    if parse_timestamp(timestamp) is None:
+        return None
+    if work_code in ('0', '1'):
+        status = work_code
+    elif status_or_verify in STATUS_CODES:
+        status = status_or_verify
+    else:
+        # Default to check-in if we can't determine
+        status = '1'
+    return Punch(user_id, timestamp, status, record_id, status_or_verify, work_code, line)
+
+
+def _parse_space_line(line):
+    """1 101 2024-01-15 09:30:00 1 1 1 0"""
+    match = SPACE_PATTERN.search(line)
+    if not match:
+        return None
+    return Punch(match.group(2), f"{match.group(3)} {match.group(4)}", match.group(5),
+                 match.group(1), None, None, line)
+
+
+def _parse_comma_line(line):
+    """user_id,timestamp,status"""
+    match = COMMA_PATTERN.search(line)
+    if not match:
+        return None
+    return Punch(match.group(1), match.group(2), match.group(3), None, None, None, line)
+
+
+def _sniff_operlog(line):
+    return _parse_key_value_line if '\t' in line else _parse_operlog_space_line
+
+
+def _sniff_direct(line):
+    if '\t' in line:
+        return _parse_tab_line
+    if SPACE_PATTERN.search(line):
+        return _parse_space_line
+    return _parse_comma_line
+
+
+def iter_punches(payload):
+    """Yield a Punch for every attendance line of a device payload
+
+    ``OPERLOG:``/``ATTLOG:`` prefixed payloads use the operation log layouts,
+    anything else is parsed as the direct upload format.
+    """
+    lines = iter_lines(payload)
+    sniff = None
+    line_parser = None
+    for line in lines:
+        if sniff is None:
+            if line.startswith('OPERLOG:') or line.startswith('ATTLOG:'):
+                sniff = _sniff_operlog
+                line = line.split(':', 1)[1]
+            else:
+                sniff = _sniff_direct
+        line = line.strip()
+        if not line:
+            continue
+        punch = line_parser(line) if line_parser else None
+        if punch is None:
+            candidate = sniff(line)
+            if candidate is not line_parser:
+                line_parser = candidate
+                punch = line_parser(line)
+        if punch is not None:
+            yield punch
+        else:
+            _logger.debug("Skipping unparsable attendance line: %s", line)
+
+
+def iter_command_results(payload):
+    """Yield (command_id, return_code) for every line of a devicecmd reply
+
+    Devices report executed commands as ``ID=12&Return=0&CMD=DATA`` lines.
+    """
+    for line in iter_lines(payload):
+        values = {}
+        for part in line.strip().split('&'):
+            key, sep, value = part.partition('=')
+            if sep:
+                values[key] = value
+        try:
+            yield int(values['ID']), int(values.get('Return', 0))
+        except (KeyError, ValueError):
+            if line.strip():
+                _logger.debug("Skipping unparsable command result: %s", line)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Parsing and timezone conversion of ZKTeco device timestamps
+
+Shared by the ADMS controller and the models replaying device payloads.
+Devices always send the same layout, so the layout is detected on the first
+value and every following value goes through a fixed-position parser
+instead of trying each strptime format in turn.
+"""
+import functools
+from datetime import datetime, time, timedelta
+
+import pytz
+
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S')
+
+MIDNIGHT = time(0, 0)
+NOON = time(12, 0)
+
+
+def _parse_year_first(value):
+    """YYYY-MM-DD HH:MM:SS, YYYY/MM/DD HH:MM:SS and YYYY-MM-DDTHH:MM:SS"""
+    if len(value) != 19 or value[13] != ':' or value[16] != ':':
+        raise ValueError(value)
+    return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]))
+
+
+def _parse_day_first(value):
+    """DD/MM/YYYY HH:MM:SS"""
+    if len(value) != 19 or value[13] != ':' or value[16] != ':':
+        raise ValueError(value)
+    return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]))
+
+
+def _parse_any_format(value):
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unable to parse timestamp: {value}")
+
+
+def detect_parser(value):
+    """Return the parser function matching the layout of ``value``"""
+    if len(value) == 19:
+        if value[4] == value[7] and value[4] in '-/' and value[10] in ' T':
+            return _parse_year_first
+        if value[2] == value[5] == '/' and value[10] == ' ':
+            return _parse_day_first
+    return _parse_any_format
+
+
+def parse_timestamp(value):
+    """Parse a device timestamp into a naive datetime, None when invalid"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return detect_parser(value)(value)
+    except ValueError:
+        return None
+
+
+class TimestampParser:
+    """Timestamp parser bound to the layout of the first value it sees
+
+    Meant to live for one device request: the layout is detected once and
+    detection only runs again if a value does not match it.
+    """
+
+    def __init__(self):
+        self._parser = None
+
+    def parse(self, value):
+        if not isinstance(value, str):
+            return value
+        if self._parser is not None:
+            try:
+                return self._parser(value)
+            except ValueError:
+                pass
+        self._parser = detect_parser(value)
+        try:
+            return self._parser(value)
+        except ValueError:
+            return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(tz_name):
+    return pytz.timezone(tz_name)
+
+
+@functools.lru_cache(maxsize=4096)
+def _utc_offset(tz_name, local_hour):
+    # Offsets only change on hour boundaries, so they are cached per local hour
+    return get_timezone(tz_name).localize(local_hour).utcoffset()
+
+
+def local_to_utc(local_dt, tz_name):
+    """Convert a naive local datetime of ``tz_name`` to a naive UTC datetime"""
+    if local_dt.tzinfo is not None:
+        return local_dt.astimezone(pytz.UTC).replace(tzinfo=None)
+    return local_dt - _utc_offset(tz_name, local_dt.replace(minute=0, second=0, microsecond=0))
+
+
+def utc_to_local(utc_dt, tz_name):
+    """Convert a naive UTC datetime to a naive local datetime of ``tz_name``"""
+    return pytz.UTC.localize(utc_dt).astimezone(get_timezone(tz_name)).replace(tzinfo=None)